@@ -1,12 +1,19 @@
+import os
+
 import streamlit as st
 import pandas as pd
 
 from ui import inject_css, hero, stepper, metric_pair
 from mfm.synthetic import make_synthetic_bundle
-from mfm.ai_assist import suggest_dataset_type, suggest_column_mapping, suggest_process_type
-from mfm.model import build_flow_model, compute_balances, build_sankey_inputs
-from mfm.viz import render_sankey, render_energy, render_circularity
-from mfm.report import build_pdf_report
+from mfm.ai_assist import suggest_process_type
+from mfm.model import build_flow_model, build_sankey_inputs
+from mfm.cache import cached_compute_balances, cached_compute_timeseries
+from mfm.profiling import profile_json
+from mfm.schema import resolve_bundle
+from mfm.infer import SAMPLE_ROWS, infer_schema
+from mfm.layouts import LayoutStore, classify
+from mfm.ingest import read_head, stream_dataset
+from mfm.network import parse_routes, format_routes
 
 st.set_page_config(page_title="Inshira • Material Flow Mapping", layout="wide")
 inject_css()
@@ -30,9 +37,27 @@ if "scope" not in st.session_state:
     }
 if "process_blocks" not in st.session_state: st.session_state.process_blocks = []
 if "bundle" not in st.session_state: st.session_state.bundle = None
+if "resolved" not in st.session_state: st.session_state.resolved = None
+if "ingested" not in st.session_state: st.session_state.ingested = {}
+if "upload_paths" not in st.session_state: st.session_state.upload_paths = {}
+if "inferred" not in st.session_state: st.session_state.inferred = {}
+if "layouts_pending" not in st.session_state: st.session_state.layouts_pending = []
+if "product_master" not in st.session_state: st.session_state.product_master = None
+
+layouts = LayoutStore()
 
 def goto(n: int): st.session_state.step = n
 
+def clear_product_master():
+    st.session_state.product_master = None
+    st.session_state.product_master_key = None
+
+def confirm_data():
+    # types and mappings the user moved on with are remembered for the next upload of the same layout
+    for columns, dataset_type, mapping in st.session_state.layouts_pending:
+        layouts.remember(columns, dataset_type, mapping)
+    goto(4)
+
 # ---------- sidebar ----------
 with st.sidebar:
     st.markdown("### Workspace")
@@ -94,6 +119,26 @@ if st.session_state.step == 1:
             step=0.1,
             help="This prevents nonsense outputs (e.g., >100% efficiency) when production data is in pcs."
         )
+        master_file = st.file_uploader(
+            "Product master (optional) — product code, unit mass, material",
+            type=["csv", "xlsx"],
+            help="Per-product unit masses; products not listed use the mass per unit above."
+        )
+        if master_file is not None:
+            from mfm.products import resolve_master
+
+            key = (master_file.name, master_file.size)
+            if st.session_state.get("product_master_key") != key:
+                try:
+                    raw = pd.read_excel(master_file) if master_file.name.lower().endswith(".xlsx") else pd.read_csv(master_file)
+                    st.session_state.product_master = resolve_master(raw)
+                    st.session_state.product_master_key = key
+                except ValueError as e:
+                    st.error(f"Product master not loaded: {e}")
+        if st.session_state.product_master is not None:
+            st.caption(f"Product master: {len(st.session_state.product_master):,} products.")
+            if master_file is None:
+                st.button("Remove product master", on_click=clear_product_master)
 
         with st.expander("Carbon settings (MVP factors)", expanded=False):
             scope["ef_electricity_kgco2e_per_kwh"] = st.number_input("Electricity factor (kgCO₂e/kWh)", 0.0, value=float(scope["ef_electricity_kgco2e_per_kwh"]), step=0.01)
@@ -130,7 +175,7 @@ elif st.session_state.step == 2:
 
     with left:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.markdown("**Build your process map**  \n<span class='small'>Add blocks in order. MVP keeps it linear for clarity.</span>", unsafe_allow_html=True)
+        st.markdown("**Build your process map**  \n<span class='small'>Add blocks in order. Optional routing adds splits, merges and rework loops.</span>", unsafe_allow_html=True)
 
         library = st.multiselect("Block library", DEFAULT_LIBRARY, default=[
             "Material Intake","Cutting","Forming","Welding / Joining","Surface Treatment","Assembly","Packaging & Dispatch"
@@ -184,6 +229,15 @@ elif st.session_state.step == 2:
             blk["primary_material"] = st.text_input("Primary material", value=blk.get("primary_material",""), key=f"mat_{idx}")
             blk["throughput_unit"] = st.selectbox("Throughput unit", ["kg","pcs","m2"], index=["kg","pcs","m2"].index(blk.get("throughput_unit","kg")), key=f"unit_{idx}")
             blk["yield_pct"] = st.slider("Estimated yield (%)", 60, 100, int(blk.get("yield_pct",92)), 1, key=f"y_{idx}")
+            routing = st.text_input(
+                "Routing (optional)", value=format_routes(blk.get("routes")), key=f"route_{idx}",
+                help="Where this block's good output goes, e.g. 'Welding / Joining: 0.9; Inspection: 0.1'. "
+                     "Unrouted output leaves via the end gate. Leave all blocks empty for a linear flow."
+            )
+            try:
+                blk["routes"] = parse_routes(routing)
+            except ValueError:
+                st.warning("Routing format: 'Block label: fraction; Other block: fraction'.")
 
             st.markdown("**Bottleneck inputs (MVP)**")
             blk["capacity_units_per_hr"] = st.number_input("Capacity (units/hr)", min_value=0.0, value=float(blk.get("capacity_units_per_hr", 60.0)), step=5.0, key=f"cap_{idx}")
@@ -206,6 +260,8 @@ elif st.session_state.step == 3:
     if demo_mode:
         bundle = make_synthetic_bundle()
         st.session_state.bundle = bundle
+        st.session_state.resolved = resolve_bundle(bundle)
+        st.session_state.layouts_pending = []
         t1,t2,t3,t4 = st.tabs(["Production","Materials","Energy","Waste"])
         t1.dataframe(bundle["production_output"], use_container_width=True)
         t2.dataframe(bundle["material_purchases"], use_container_width=True)
@@ -213,28 +269,66 @@ elif st.session_state.step == 3:
         t4.dataframe(bundle["waste_summary"], use_container_width=True)
     else:
         uploads = st.file_uploader("Upload files", type=["csv","xlsx"], accept_multiple_files=True)
-        parsed = []
-        for f in uploads or []:
-            df = pd.read_csv(f) if f.name.lower().endswith(".csv") else pd.read_excel(f)
-            parsed.append((f.name, df))
-
-        if parsed:
-            bundle = {}
-            for name, df in parsed:
-                dtype = suggest_dataset_type(name, df)
+
+        if uploads:
+            # Each upload is parsed once into a content-addressed Arrow file; reruns memory-map it,
+            # read a head sample and reuse the grouped totals streamed from it.
+            bundle, mappings, ingested, upload_paths, inferred_all, pending = {}, {}, {}, {}, {}, []
+            for f in uploads:
+                name = f.name
+                file_key = (getattr(f, "file_id", name), f.size)
+                path = st.session_state.upload_paths.get(file_key)
+                if path is None or not os.path.exists(path):
+                    with st.spinner(f"Converting {name}…"):
+                        from mfm.store import cache_upload  # pyarrow, only once files are uploaded
+
+                        path = cache_upload(f, name)
+                upload_paths[file_key] = path
+                head = read_head(path, path, nrows=SAMPLE_ROWS)
+                inferred = st.session_state.inferred.get(path) or classify(head, name, store=layouts)
+                inferred_all[path] = inferred
+                dtype = inferred["dataset_type"]
                 st.subheader(name)
-                st.caption(f"AI suggests: {dtype}")
+                if inferred["source"] == "stored":
+                    st.caption(f"Known layout: {dtype} (confirmed before, seen {inferred['uses']}×); saved mapping applied.")
+                else:
+                    st.caption(f"AI suggests: {dtype} ({inferred['confidence']:.0%}) · alternatives: " +
+                               ", ".join(f"{t} {c:.0%}" for t, c in inferred["ranking"][1:3]))
                 dtype_confirm = st.selectbox(
                     f"Confirm type for {name}",
                     ["production_output","material_purchases","energy_site","waste_summary"],
                     index=["production_output","material_purchases","energy_site","waste_summary"].index(dtype)
                 )
-                mapping = suggest_column_mapping(dtype_confirm, df)
-                st.caption("AI column mapping suggestion:")
-                st.json(mapping)
-                bundle[dtype_confirm] = df
-                st.dataframe(df.head(15), use_container_width=True)
+                if dtype_confirm not in inferred["mappings"]:
+                    inferred = dict(infer_schema(head, name), source="inferred")
+                    inferred_all[path] = inferred
+                mapping = inferred["mappings"][dtype_confirm]
+                pending.append((list(head.columns), dtype_confirm, mapping))
+                st.caption("AI column mapping suggestion (best candidates with scores):")
+                st.json({field: {"column": col, "candidates": inferred["candidates"][dtype_confirm][field]}
+                         for field, col in mapping.items()})
+
+                key = (path, dtype_confirm)
+                agg = st.session_state.ingested.get(key)
+                if agg is None:
+                    bar = st.progress(0.0, text=f"Reading {name}…")
+                    agg = stream_dataset(path, path, dtype_confirm, mapping,
+                                         progress=lambda n, frac: bar.progress(frac or 0.0, text=f"{n:,} rows read"))
+                    bar.empty()
+                ingested[key] = agg
+                bundle[dtype_confirm] = agg
+                mappings[dtype_confirm] = mapping
+                st.dataframe(head.head(15), use_container_width=True)
+                st.caption(f"Ingested into {len(agg):,} aggregated rows.")
+            st.session_state.ingested = ingested
+            st.session_state.upload_paths = upload_paths
+            st.session_state.inferred = inferred_all
+            st.session_state.layouts_pending = pending
+            ls = layouts.stats()
+            st.caption(f"Saved layouts: {ls['entries']} · layout hit rate {ls['hit_rate']:.0%} "
+                       f"({ls['hits']} of {ls['hits'] + ls['misses']} uploads)")
             st.session_state.bundle = bundle
+            st.session_state.resolved = resolve_bundle(bundle, mappings)
         else:
             st.info("Upload at least one file to continue.")
 
@@ -243,13 +337,16 @@ elif st.session_state.step == 3:
     with nav1:
         st.button("← Back", use_container_width=True, on_click=goto, args=(2,))
     with nav2:
-        st.button("Continue →", type="primary", use_container_width=True, disabled=st.session_state.bundle is None, on_click=goto, args=(4,))
+        st.button("Continue →", type="primary", use_container_width=True, disabled=st.session_state.bundle is None, on_click=confirm_data)
     st.markdown("</div>", unsafe_allow_html=True)
 
 # ---------- STEP 4: insights ----------
 else:
+    # plotting and report libraries load only once the insights page is reached
+    from mfm.viz import render_sankey, render_energy, render_circularity
+
     scope = st.session_state.scope
-    if not st.session_state.bundle or not st.session_state.process_blocks:
+    if not st.session_state.resolved or not st.session_state.process_blocks:
         st.error("Missing process map or data. Go back to previous steps.")
         st.stop()
 
@@ -267,14 +364,16 @@ else:
         boundary_start=scope["boundary_start"],
         boundary_end=scope["boundary_end"],
         process_blocks=st.session_state.process_blocks,
-        data_bundle=st.session_state.bundle,
+        data_bundle=st.session_state.resolved,
         time_period=scope["time_period"],
         scenarios=scenarios,
         unit_mass_kg_per_unit=scope.get("unit_mass_kg_per_unit", 7.0),
         carbon_factors=carbon_factors,
+        product_master=st.session_state.product_master,
     )
-    results = compute_balances(model)
-    sankey = build_sankey_inputs(results)
+    results = cached_compute_balances(model, profile=st.session_state.get("profile_balances", False))
+    block_types = {b["user_label"]: b.get("type") for b in st.session_state.process_blocks}
+    sankey = build_sankey_inputs(results, lod={"types": block_types, "expand": st.session_state.get("sankey_expand", [])})
 
     top = st.columns([2.1, 1], gap="large")
     with top[0]:
@@ -282,6 +381,10 @@ else:
         st.markdown("**Material flow map**")
         fig = render_sankey(sankey, title=f"{scope['site_name']} — {scope['boundary_start']} → {scope['boundary_end']}")
         st.plotly_chart(fig, use_container_width=True)
+        if sankey["groups"] or sankey["merged"] or st.session_state.get("sankey_expand"):
+            st.caption(f"Simplified view: {len(sankey['values'])} of {sankey['links_in']} flows shown; "
+                       "similar steps are grouped and small losses merged into 'Other'.")
+            st.multiselect("Expand grouped steps", sorted({t or "other" for t in block_types.values()}), key="sankey_expand")
         st.markdown("</div>", unsafe_allow_html=True)
 
     with top[1]:
@@ -303,14 +406,21 @@ else:
             st.write("• No flags yet — try changing scenarios.")
 
         st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-        pdf = build_pdf_report(scope["site_name"], scope["boundary_start"], scope["boundary_end"], results, sankey_fig=fig)
-        st.download_button("⬇️ Download report (PDF)", data=pdf, file_name="inshira_material_flow_report.pdf",
-                           mime="application/pdf", use_container_width=True)
+        # Report export (ReportLab, vector flow map) only runs on request; cached per results fingerprint.
+        if st.button("Prepare report (PDF)", use_container_width=True):
+            st.session_state.report_fp = results["fingerprint"]
+        if st.session_state.get("report_fp") == results["fingerprint"]:
+            with st.spinner("Rendering report…"):
+                from mfm.report import cached_pdf_report
+
+                pdf = cached_pdf_report(scope["site_name"], scope["boundary_start"], scope["boundary_end"], results, sankey=sankey)
+            st.download_button("⬇️ Download report (PDF)", data=pdf, file_name="inshira_material_flow_report.pdf",
+                               mime="application/pdf", use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
     st.write("")
-    t_energy, t_circ, t_carbon, t_bottle, t_trans = st.tabs(
-        ["Energy", "Circular economy", "Carbon", "Bottlenecks", "Assumptions & transparency"]
+    t_energy, t_circ, t_carbon, t_bottle, t_trend, t_trans = st.tabs(
+        ["Energy", "Circular economy", "Carbon", "Bottlenecks", "Trends", "Assumptions & transparency"]
     )
 
     with t_energy:
@@ -353,6 +463,49 @@ else:
             if util is not None:
                 st.caption(f"Utilisation: {util*100:.1f}%")
             st.dataframe(bdf, use_container_width=True)
+            with st.expander("Simulate the line (queues, breakdowns, WIP)", expanded=False):
+                st.caption("Discrete-event simulation of the blocks in order: random processing times, "
+                           "breakdowns sized from downtime % (1 h mean repair) and 10-unit buffers.")
+                s1, s2 = st.columns(2)
+                sim_default = min(max(float(bdf["Available hours"].max() or 160.0), 1.0), 10000.0)
+                sim_hours = s1.number_input("Horizon (hours)", 1.0, 10000.0, sim_default, 8.0)
+                reps = s2.number_input("Replications", 1, 20, 4, 1)
+                if st.button("Run simulation"):
+                    from mfm.simulate import simulate_bottlenecks
+
+                    try:
+                        sim = simulate_bottlenecks(model["blocks"], float(bdf["Required (units/period)"].iloc[0]),
+                                                   hours=sim_hours, replications=int(reps))
+                    except ValueError as e:
+                        st.error(f"Simulation not run: {e}")
+                    else:
+                        line = sim["line"]
+                        st.metric("Simulated line throughput (units/hr)", f"{line['throughput_units_per_hr']:,.1f}")
+                        st.caption(f"Units out over {line['hours']:,.0f} h: {line['units_out']:,.0f}"
+                                   + (f" (95% CI ± {line['throughput_ci95']:.2f} units/hr)" if reps > 1 else ""))
+                        st.dataframe(sim["blocks"], use_container_width=True)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    with t_trend:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.markdown("**Trends by period**")
+        gran = st.radio("Granularity", ["Week", "Month", "Quarter"], index=1, horizontal=True)
+        trend = cached_compute_timeseries(model, gran)
+        ts = trend["timeseries"]
+        if ts.empty:
+            st.write("Add dated production records to see trends.")
+        else:
+            chart = ts.set_axis(ts.index.to_timestamp())
+            c1, c2 = st.columns(2)
+            with c1:
+                st.caption("Material efficiency (%)")
+                st.line_chart(chart["material_eff_pct"])
+            with c2:
+                st.caption("Energy intensity (kWh/kg product)")
+                st.line_chart(chart["energy_intensity_kwh_per_kg"])
+            st.dataframe(ts.set_axis(ts.index.astype(str)), use_container_width=True)
+        for a in trend["assumptions"]:
+            st.caption(f"• {a}")
         st.markdown("</div>", unsafe_allow_html=True)
 
     with t_trans:
@@ -360,8 +513,41 @@ else:
         st.markdown("**Assumptions & data gaps**")
         for a in results.get("assumptions", []):
             st.write(f"• {a}")
+        if results.get("unknown_products") is not None and len(results["unknown_products"]):
+            st.markdown("**Products not in the product master**")
+            st.dataframe(results["unknown_products"], use_container_width=True)
         st.markdown("**Computed flows**")
         st.dataframe(results["flows_table"], use_container_width=True)
+        with st.expander("Computation profile", expanded=False):
+            st.toggle("Profile the balance computation (time + memory per stage)", key="profile_balances")
+            prof = results.get("profile")
+            if prof:
+                st.caption(f"Total {prof['total_seconds'] * 1000:,.1f} ms · recomputed: "
+                           f"{', '.join(results.get('recomputed') or []) or 'nothing (all sections reused)'}")
+                st.dataframe(pd.DataFrame(prof["spans"]), use_container_width=True)
+                st.download_button("Download profile (JSON)", data=profile_json(results),
+                                   file_name="mfm_profile.json", mime="application/json")
+        with st.expander("Uncertainty (Monte Carlo)", expanded=False):
+            st.caption("Relative spread (± %) on key inputs, sampled independently; shows 5th/50th/95th percentiles.")
+            u1, u2, u3, u4 = st.columns(4)
+            spread = {
+                "yield_pct": u1.number_input("Yield ± pts", 0.0, 50.0, 2.0, 0.5),
+                "unit_mass_kg_per_unit": u2.number_input("Unit mass ± %", 0.0, 100.0, 5.0, 1.0),
+                "carbon": u3.number_input("Carbon factors ± %", 0.0, 100.0, 15.0, 1.0),
+                "downtime_pct": u4.number_input("Downtime ± pts", 0.0, 50.0, 5.0, 0.5),
+            }
+            if st.button("Run 100k samples"):
+                unc = {
+                    "yield_pct": {"dist": "normal", "sd": spread["yield_pct"]},
+                    "downtime_pct": {"dist": "normal", "sd": spread["downtime_pct"]},
+                    "unit_mass_kg_per_unit": {"dist": "triangular", "rel": spread["unit_mass_kg_per_unit"] / 100},
+                }
+                unc.update({k: {"dist": "triangular", "rel": spread["carbon"] / 100} for k in carbon_factors})
+                from mfm.uncertainty import run_monte_carlo
+
+                mc = run_monte_carlo(model, unc, n=100_000)
+                st.dataframe(mc["bands"], use_container_width=True)
+                st.dataframe(mc["bottlenecks"], use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
     st.write("")
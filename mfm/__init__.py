@@ -1,4 +1,17 @@
 """
 mfm: Material Flow Mapping MVP package
+
+Submodules are imported on first attribute access (``mfm.report``), so importing the package
+does not pull in ReportLab, Plotly or SciPy until a step actually needs them.
 """
-__all__ = ["synthetic", "ai_assist", "model", "viz", "report"]
+import importlib
+
+__all__ = ["synthetic", "ai_assist", "model", "viz", "report", "cache", "schema", "ingest", "store", "network", "uncertainty", "simulate", "lod", "pdf_sankey", "profiling", "nodes", "infer", "layouts", "units", "products"]
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,35 +1,12 @@
-def suggest_dataset_type(filename, df):
-    name = filename.lower()
-    cols = " ".join([c.lower() for c in df.columns])
+from .infer import SAMPLE_ROWS, infer_schema
 
-    if "kwh" in cols or "electric" in cols or "gas" in cols or "energy" in name:
-        return "energy_site"
-    if "waste" in name or "disposal" in cols or "route" in cols:
-        return "waste_summary"
-    if "purchase" in name or ("material" in cols and ("kg" in cols or "weight" in cols)):
-        return "material_purchases"
-    return "production_output"
+def suggest_dataset_type(filename, df):
+    """Most likely dataset type, inferred from the header and a head sample of `df` (see mfm.infer)."""
+    return infer_schema(df.head(SAMPLE_ROWS), filename)["dataset_type"]
 
 def suggest_column_mapping(dataset_type, df):
-    cols = [c for c in df.columns]
-    low = {c.lower(): c for c in cols}
-
-    def pick(*keys):
-        for k in keys:
-            for lc, orig in low.items():
-                if k in lc:
-                    return orig
-        return None
-
-    if dataset_type == "production_output":
-        return {"date": pick("date"), "qty": pick("qty", "quantity", "produced"), "unit": pick("unit"), "product": pick("product")}
-    if dataset_type == "material_purchases":
-        return {"period": pick("month", "period"), "material": pick("material"), "mass_kg": pick("kg", "weight")}
-    if dataset_type == "energy_site":
-        return {"period": pick("month", "period"), "electricity_kwh": pick("electric", "kwh"), "gas_kwh": pick("gas")}
-    if dataset_type == "waste_summary":
-        return {"waste_type": pick("waste"), "mass_kg": pick("kg", "quantity"), "route": pick("route", "disposal")}
-    return {}
+    """Best column per field of `dataset_type` ({} for unknown types); unmatched fields are None."""
+    return infer_schema(df.head(SAMPLE_ROWS))["mappings"].get(dataset_type, {})
 
 def suggest_process_type(label):
     s = label.lower()
@@ -0,0 +1,250 @@
+"""
+Headless multi-site evaluation.
+
+    python -m mfm.batch SITES_DIR --out OUT_DIR [--workers N] [--reports]
+
+SITES_DIR holds one sub-directory per site with a `site.json` definition and the site's data
+files (CSV/XLSX/Parquet). Files named after a dataset type (e.g. `waste_summary.csv`) are used as
+that type; other files are classified from a head sample (mfm.infer), except a
+`product_master.csv`/`.xlsx`, which is read as the product master (mfm.products). `site.json` keys:
+
+    site_name, boundary_start, boundary_end, time_period, unit_mass_kg_per_unit,
+    process_blocks (list of block dicts), carbon_factors (dict), scenarios (dict, optional),
+    product_master (optional: {code: unit mass kg} or a file name in the site directory)
+
+Writes OUT_DIR/kpis.csv (one row per site, including status, error and timing) and
+OUT_DIR/flows/<site>.csv, plus OUT_DIR/reports/<site>.pdf with --reports. Sites fail
+independently; the exit code is 1 if any site failed.
+
+render_reports renders PDFs for many already-computed (site, results) jobs on a pool of
+warmed-up workers (see report_pool), writing each report straight to disk.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+import pandas as pd
+
+from .ai_assist import suggest_process_type
+from .infer import infer_file
+from .ingest import stream_dataset
+from .model import KPI_FIELDS, build_flow_model, build_sankey_inputs, compute_balances, kpi_summary
+from .schema import resolve_bundle
+
+DATASET_TYPES = ["production_output", "material_purchases", "energy_site", "waste_summary"]
+DATA_EXTS = (".csv", ".xlsx", ".xlsm", ".parquet")
+PRODUCT_MASTER = "product_master"
+
+def load_bundle(data_dir):
+    """
+    Stream every CSV/XLSX/Parquet file in `data_dir` into a resolved bundle (dataset type from file
+    name or content). Several files of one type (e.g. monthly exports) are combined; they must map
+    to the same columns. Raises ValueError when the directory holds no dataset files.
+    """
+    bundle, mappings, sources = {}, {}, {}
+    for fname in sorted(os.listdir(data_dir)):
+        if not fname.lower().endswith(DATA_EXTS):
+            continue
+        path = os.path.join(data_dir, fname)
+        stem = os.path.splitext(fname)[0].lower()
+        if stem == PRODUCT_MASTER:
+            continue
+        inferred = infer_file(path, fname)
+        dtype = stem if stem in DATASET_TYPES else inferred["dataset_type"]
+        mapping = inferred["mappings"][dtype]
+        agg = stream_dataset(path, fname, dtype, mapping)
+        if dtype not in bundle:
+            bundle[dtype], mappings[dtype], sources[dtype] = agg, mapping, fname
+        elif mapping != mappings[dtype]:
+            raise ValueError(f"{sources[dtype]} and {fname} both hold {dtype} but map different columns "
+                             f"({mappings[dtype]} vs {mapping}); rename the headers to match or remove one.")
+        else:
+            bundle[dtype] = pd.concat([bundle[dtype], agg], ignore_index=True)
+    if not bundle:
+        raise ValueError(f"No dataset files ({', '.join(DATA_EXTS)}) in {data_dir}")
+    return resolve_bundle(bundle, mappings)
+
+def model_from_spec(spec, bundle, default_name="Site"):
+    """build_flow_model from a site.json-style dict (see module docstring) and a data bundle."""
+    blocks = []
+    for b in spec.get("process_blocks", []):
+        b = dict(b)
+        b.setdefault("user_label", b.get("name", "Process"))
+        b.setdefault("type", suggest_process_type(b["user_label"]))
+        blocks.append(b)
+    if not blocks:
+        raise ValueError("site.json defines no process_blocks")
+
+    return build_flow_model(
+        site_name=spec.get("site_name", default_name),
+        boundary_start=spec.get("boundary_start", "Goods In"),
+        boundary_end=spec.get("boundary_end", "Dispatch"),
+        process_blocks=blocks,
+        data_bundle=bundle,
+        time_period=spec.get("time_period", "Quarter"),
+        scenarios=spec.get("scenarios", {}),
+        unit_mass_kg_per_unit=spec.get("unit_mass_kg_per_unit", 7.0),
+        carbon_factors=spec.get("carbon_factors"),
+        product_master=spec.get("product_master"),
+    )
+
+def _product_master_file(site_dir):
+    for fname in sorted(os.listdir(site_dir)):
+        stem, ext = os.path.splitext(fname)
+        if stem.lower() == PRODUCT_MASTER and ext.lower() in DATA_EXTS:
+            return os.path.join(site_dir, fname)
+    return None
+
+def load_site(site_dir):
+    """Read a site directory into a model dict (see module docstring for the layout)."""
+    with open(os.path.join(site_dir, "site.json")) as f:
+        spec = json.load(f)
+    master = spec.get("product_master")
+    if isinstance(master, str):
+        spec["product_master"] = os.path.join(site_dir, master)
+    elif master is None:
+        spec["product_master"] = _product_master_file(site_dir)
+    return model_from_spec(spec, load_bundle(site_dir), default_name=os.path.basename(site_dir))
+
+def run_site(site_dir, report_dir=None):
+    """Evaluate one site (and write its PDF into `report_dir`, if given); never raises, errors are returned in the record."""
+    t0 = time.perf_counter()
+    rec = {"site": os.path.basename(os.path.normpath(site_dir)), "status": "ok", "error": None}
+    flows = None
+    try:
+        model = load_site(site_dir)
+        rec["load_s"] = time.perf_counter() - t0
+        results = compute_balances(model)
+        rec["site_name"] = model["site_name"]
+        rec.update(kpi_summary(results))
+        flows = results["flows_table"]
+        if report_dir is not None:
+            from .report import write_pdf_report
+
+            write_pdf_report(os.path.join(report_dir, f"{_safe_name(rec['site'])}.pdf"), model["site_name"],
+                             model["boundary_start"], model["boundary_end"], results,
+                             sankey=build_sankey_inputs(results, lod={}))
+    except Exception as e:
+        rec["status"] = "error"
+        rec["error"] = f"{type(e).__name__}: {e}"
+    rec["seconds"] = time.perf_counter() - t0
+    return rec, flows
+
+def _safe_name(s):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", s).strip("_") or "site"
+
+def run_batch(sites_dir, out_dir, workers=None, log=sys.stderr, reports=False):
+    """Evaluate every site directory under `sites_dir` across a process pool; returns the KPI table."""
+    site_dirs = sorted(
+        os.path.join(sites_dir, d) for d in os.listdir(sites_dir)
+        if os.path.isfile(os.path.join(sites_dir, d, "site.json"))
+    )
+    os.makedirs(os.path.join(out_dir, "flows"), exist_ok=True)
+    report_dir = os.path.join(out_dir, "reports") if reports else None
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+
+    t0 = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_renderer if reports else None) as pool:
+        futures = {pool.submit(run_site, d, report_dir): d for d in site_dirs}
+        for fut in as_completed(futures):
+            site = os.path.basename(futures[fut])
+            try:
+                rec, flows = fut.result()
+            except Exception as e:  # worker process died
+                rec, flows = {"site": site, "status": "error", "error": f"{type(e).__name__}: {e}"}, None
+            if flows is not None:
+                flows.to_csv(os.path.join(out_dir, "flows", f"{_safe_name(site)}.csv"), index=False)
+            records.append(rec)
+            if log is not None:
+                msg = f"{rec.get('seconds', float('nan')):.2f}s" if rec["status"] == "ok" else rec["error"]
+                print(f"[{rec['status']}] {site}  {msg}", file=log)
+
+    cols = ["site", "site_name", "status", "error", "load_s", "seconds"] + KPI_FIELDS + ["top_bottleneck", "top_utilisation"]
+    kpis = pd.DataFrame(records).reindex(columns=cols).sort_values("site", ignore_index=True)
+    kpis.to_csv(os.path.join(out_dir, "kpis.csv"), index=False)
+
+    if log is not None:
+        ok = int((kpis["status"] == "ok").sum())
+        elapsed = time.perf_counter() - t0
+        print(f"{ok}/{len(kpis)} sites ok in {elapsed:.1f}s" +
+              (f" ({ok / elapsed * 60:.0f} reports/min)" if reports and elapsed > 0 else ""), file=log)
+    return kpis
+
+def _warm_renderer():
+    # ReportLab is imported here, in the workers, rather than wherever mfm.batch is imported
+    from .report import warm_renderer
+
+    warm_renderer()
+
+def report_pool(workers=None):
+    """A process pool whose workers load the PDF renderer once; reuse it across render_reports calls."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_warm_renderer)
+
+def _render_job(job, out_dir):
+    t0 = time.perf_counter()
+    site = job.get("site") or job["site_name"]
+    rec = {"site": site, "status": "ok", "error": None, "path": None, "bytes": None}
+    try:
+        from .report import write_pdf_report
+
+        sankey = job.get("sankey") or build_sankey_inputs(job["results"], lod={})
+        path = write_pdf_report(os.path.join(out_dir, f"{_safe_name(site)}.pdf"), job["site_name"],
+                                job.get("boundary_start", ""), job.get("boundary_end", ""), job["results"], sankey=sankey)
+        rec["path"], rec["bytes"] = path, os.path.getsize(path)
+    except Exception as e:
+        rec["status"] = "error"
+        rec["error"] = f"{type(e).__name__}: {e}"
+    rec["seconds"] = time.perf_counter() - t0
+    return rec
+
+def render_reports(jobs, out_dir, workers=None, pool=None, log=sys.stderr):
+    """
+    Render a PDF per job into `out_dir`. A job is a dict with site_name, boundary_start, boundary_end,
+    results (from compute_balances) and optionally site (file name) and sankey (payload). `jobs` may
+    be a generator: at most two jobs per worker are in flight, so results are never all held at once.
+    Returns {"reports": per-report table, "seconds", "reports_per_min"}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    own = pool is None
+    pool = report_pool(workers) if own else pool
+    limit = 2 * (workers or os.cpu_count() or 1)
+    t0 = time.perf_counter()
+    records, pending = [], set()
+    try:
+        for job in jobs:
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                records.extend(f.result() for f in done)
+            pending.add(pool.submit(_render_job, job, out_dir))
+        records.extend(f.result() for f in as_completed(pending))
+    finally:
+        if own:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - t0
+    table = pd.DataFrame(records, columns=["site", "status", "error", "path", "bytes", "seconds"])
+    ok = int((table["status"] == "ok").sum())
+    rate = ok / elapsed * 60.0 if elapsed > 0 else float("nan")
+    if log is not None:
+        print(f"{ok}/{len(table)} reports in {elapsed:.1f}s ({rate:.0f} reports/min)", file=log)
+    return {"reports": table, "seconds": elapsed, "reports_per_min": rate}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m mfm.batch", description="Evaluate material flow models for many sites.")
+    ap.add_argument("sites_dir", help="directory with one sub-directory (site.json + data files) per site")
+    ap.add_argument("--out", required=True, help="output directory for kpis.csv and flows/")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--reports", action="store_true", help="also write a PDF report per site to OUT_DIR/reports/")
+    args = ap.parse_args(argv)
+
+    kpis = run_batch(args.sites_dir, args.out, workers=args.workers, reports=args.reports)
+    return 0 if (kpis["status"] == "ok").all() else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
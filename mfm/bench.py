@@ -0,0 +1,201 @@
+"""
+Benchmarks of the main pipeline stages on synthetic bundles of increasing size.
+
+    python -m mfm.bench [--sizes 1000,10000,100000] [--out bench.json] [--baseline old.json]
+    python -m mfm.bench --imports
+
+For each size (production rows; blocks grow with it) every stage is timed (best of --repeat runs)
+and then run once under tracemalloc for its peak memory. Results are written as JSON; with
+--baseline, stages slower (or hungrier) than the baseline by more than --threshold are flagged
+and the exit code is 1.
+
+--imports instead times cold imports, each in a fresh interpreter that has already loaded pandas:
+the app's top-level imports (Streamlit included) and each mfm module, with the heavy optional
+libraries (ReportLab, Plotly, openpyxl, pyarrow, SciPy) each one drags in.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from .ai_assist import suggest_process_type
+from .infer import SAMPLE_ROWS, infer_schema
+from .model import build_flow_model, build_sankey_inputs, compute_balances, compute_bottlenecks
+from .report import build_pdf_report
+from .synthetic import generate_bundle
+from .viz import render_sankey
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+STAGES = ["classify", "compute_balances", "compute_bottlenecks", "build_sankey_inputs", "render_sankey", "build_pdf_report"]
+HEAVY_MODULES = ["reportlab", "plotly", "openpyxl", "pyarrow", "scipy"]
+IMPORT_TARGETS = ["app", "mfm", "mfm.model", "mfm.ingest", "mfm.batch", "mfm.service", "mfm.viz", "mfm.report",
+                  "mfm.store", "mfm.uncertainty"]
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORT_PROBE = """
+import json, sys, time
+import pandas
+t0 = time.perf_counter()
+exec(sys.argv[1])
+print(json.dumps({"seconds": time.perf_counter() - t0, "heavy": [m for m in json.loads(sys.argv[2]) if m in sys.modules]}))
+"""
+_STEPS = ["Cutting", "Laser", "Forming", "Welding", "Oven", "Painting", "Assembly", "Inspection", "Packing", "Storage"]
+
+def make_case(size, seed=0):
+    """Model, blocks and precomputed inputs for one benchmark size."""
+    days = 90
+    n_products = max(1, math.ceil(size / days))
+    end = (pd.Timestamp("2025-01-01") + pd.Timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    bundle = generate_bundle(seed=seed, n_products=n_products, units_per_day=n_products * 20.0,
+                             start="2025-01-01", end=end)
+    n_blocks = int(np.clip(size // 1_000, 5, 2_000))
+    blocks = [{"user_label": f"{_STEPS[i % len(_STEPS)]} {i + 1}", "type": suggest_process_type(_STEPS[i % len(_STEPS)]),
+               "yield_pct": 99.0, "capacity_units_per_hr": 60.0, "available_hours": 480.0, "downtime_pct": 8}
+              for i in range(n_blocks)]
+    model = build_flow_model("Benchmark", "Goods In", "Dispatch", blocks, bundle, "Quarter", {}, 7.0, {})
+    return {"bundle": bundle, "blocks": blocks, "model": model, "rows": sum(len(df) for df in bundle.values())}
+
+def _stages(case):
+    """Stage name -> zero-argument callable; later stages reuse earlier outputs computed once here."""
+    bundle, blocks, model = case["bundle"], case["blocks"], case["model"]
+    results = compute_balances(model)
+    units = float(bundle["production_output"]["Qty Produced"].sum())
+    sankey = build_sankey_inputs(results, lod={})
+
+    def classify():
+        for name, df in bundle.items():
+            infer_schema(df.head(SAMPLE_ROWS), f"{name}.csv")
+
+    return {
+        "classify": classify,
+        "compute_balances": lambda: compute_balances(model),
+        "compute_bottlenecks": lambda: compute_bottlenecks(blocks, units),
+        "build_sankey_inputs": lambda: build_sankey_inputs(results, lod={}),
+        "render_sankey": lambda: render_sankey(sankey),
+        "build_pdf_report": lambda: build_pdf_report("Benchmark", "Goods In", "Dispatch", results, sankey=sankey),
+    }
+
+def _measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def run_benchmarks(sizes=DEFAULT_SIZES, stages=STAGES, repeat=3, seed=0, log=sys.stderr):
+    """Returns {"meta": environment, "results": [{stage, size, rows, seconds, peak_mb, rows_per_sec}, ...]}."""
+    records = []
+    for size in sizes:
+        case = make_case(size, seed=seed)
+        fns = _stages(case)
+        for stage in stages:
+            seconds, peak = _measure(fns[stage], repeat)
+            rec = {"stage": stage, "size": int(size), "rows": case["rows"], "seconds": seconds,
+                   "peak_mb": peak / 2 ** 20, "rows_per_sec": case["rows"] / seconds if seconds > 0 else None}
+            records.append(rec)
+            if log is not None:
+                print(f"{stage:<22}{size:>10,}  {seconds * 1e3:10.1f} ms  {rec['peak_mb']:8.1f} MB  "
+                      f"{rec['rows_per_sec'] or 0:14,.0f} rows/s", file=log)
+    meta = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "repeat": repeat,
+    }
+    return {"meta": meta, "results": records}
+
+def _import_statement(target):
+    if target != "app":
+        return f"import {target}"
+    # the app itself is a Streamlit script; time its module-level imports without running it
+    with open(os.path.join(_ROOT, "app.py")) as f:
+        return "\n".join(ln for ln in f if ln.startswith(("import ", "from ")))
+
+def measure_imports(targets=IMPORT_TARGETS, repeat=3, log=sys.stderr):
+    """Cold import time (best of `repeat` fresh interpreters) and heavy modules loaded, per target."""
+    records = []
+    for target in targets:
+        stmt = _import_statement(target)
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, stmt, json.dumps(HEAVY_MODULES)],
+                                 capture_output=True, text=True, cwd=_ROOT, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        rec = {"target": target, "seconds": min(r["seconds"] for r in runs), "heavy": runs[0]["heavy"]}
+        records.append(rec)
+        if log is not None:
+            print(f"{target:<18}{rec['seconds'] * 1e3:8.1f} ms  {', '.join(rec['heavy']) or '-'}", file=log)
+    return records
+
+def compare(current, baseline, threshold=0.25, min_seconds=0.005):
+    """
+    Per (stage, size) ratios against a baseline run. A stage regresses when it is more than
+    `threshold` slower or uses more than `threshold` more peak memory; timings under
+    `min_seconds` in both runs are too noisy to flag.
+    """
+    cur = pd.DataFrame(current["results"]).set_index(["stage", "size"])
+    base = pd.DataFrame(baseline["results"]).set_index(["stage", "size"])
+    df = cur[["seconds", "peak_mb"]].join(base[["seconds", "peak_mb"]], rsuffix="_base", how="inner")
+    df["time_ratio"] = df["seconds"] / df["seconds_base"]
+    df["mem_ratio"] = df["peak_mb"] / df["peak_mb_base"].where(df["peak_mb_base"] > 0)
+    slow = (df["time_ratio"] > 1 + threshold) & (df[["seconds", "seconds_base"]].max(axis=1) >= min_seconds)
+    df["regression"] = slow | (df["mem_ratio"] > 1 + threshold)
+    return df.reset_index()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m mfm.bench", description="Benchmark the mfm pipeline stages.")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated production row counts")
+    ap.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: " + ", ".join(STAGES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="bench.json", help="where to write the results (JSON)")
+    ap.add_argument("--baseline", help="earlier results file to compare against")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown / memory growth (0.25 = 25%%)")
+    ap.add_argument("--imports", action="store_true", help="time cold imports instead of the pipeline stages")
+    args = ap.parse_args(argv)
+
+    if args.imports:
+        measure_imports(repeat=args.repeat)
+        return 0
+
+    sizes = [int(float(s)) for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        ap.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    current = run_benchmarks(sizes, stages, repeat=args.repeat, seed=args.seed)
+    with open(args.out, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        cmp = compare(current, baseline, threshold=args.threshold)
+        cols = ["stage", "size", "seconds_base", "seconds", "time_ratio", "mem_ratio", "regression"]
+        print(cmp[cols].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        if cmp["regression"].any():
+            print(f"{int(cmp['regression'].sum())} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
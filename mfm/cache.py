@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# local on-disk caches (uploaded datasets, confirmed layouts) live here
+CACHE_DIR = os.environ.get("MFM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "inshira-mfm"))
+
+def _hash_frame(h, df: pd.DataFrame):
+    h.update(b"df")
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(json.dumps([str(t) for t in df.dtypes]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+
+def _update_json(h, obj):
+    # plain JSON values (e.g. process blocks) hash in one dumps call instead of value by value;
+    # anything else (frames, arrays, NumPy scalars) makes dumps raise and takes the slow path
+    try:
+        s = json.dumps(obj, sort_keys=True, allow_nan=True)
+    except (TypeError, ValueError):
+        return False
+    h.update(b"js")
+    h.update(s.encode())
+    return True
+
+def _update(h, obj):
+    if isinstance(getattr(obj, "fingerprint", None), str):
+        # pre-fingerprinted objects (e.g. schema.ResolvedBundle) hash once, at construction
+        h.update(b"fp")
+        h.update(obj.fingerprint.encode())
+    elif isinstance(obj, pd.DataFrame):
+        _hash_frame(h, obj)
+    elif isinstance(obj, pd.Series):
+        _hash_frame(h, obj.to_frame())
+    elif isinstance(obj, np.ndarray):
+        h.update(b"nd")
+        h.update(str(obj.dtype).encode())
+        h.update(str(obj.shape).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (dict, list, tuple)) and _update_json(h, obj):
+        pass
+    elif isinstance(obj, dict):
+        h.update(b"{")
+        for k in sorted(obj, key=str):
+            h.update(str(k).encode())
+            h.update(b":")
+            _update(h, obj[k])
+        h.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[")
+        for v in obj:
+            _update(h, v)
+            h.update(b",")
+        h.update(b"]")
+    else:
+        h.update(json.dumps(obj, default=str).encode())
+
+def fingerprint(*objs) -> str:
+    """Stable content hash of DataFrames, arrays and plain (nested) dict/list values."""
+    h = hashlib.blake2b(digest_size=16)
+    for o in objs:
+        _update(h, o)
+    return h.hexdigest()
+
+def model_fingerprint(model: dict) -> str:
+    return fingerprint(
+        model.get("data", {}),
+        model.get("blocks", []),
+        model.get("scenarios", {}),
+        model.get("carbon_factors", {}),
+        model.get("unit_mass_kg_per_unit"),
+        model.get("product_master"),
+        model.get("boundary_start"),
+        model.get("boundary_end"),
+    )
+
+class LRUCache:
+    """Bounded, thread-safe LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = int(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+_balances_cache = LRUCache(maxsize=32)
+_node_cache = LRUCache(maxsize=256)
+
+def cached_compute_balances(model: dict, cache: LRUCache = None, profile: bool = False, nodes: LRUCache = None) -> dict:
+    """
+    compute_balances memoized on the content fingerprint of the model inputs (profiled runs cached
+    apart). On a miss, result nodes whose own inputs are unchanged are reused from `nodes`.
+    """
+    from .model import compute_balances
+
+    cache = _balances_cache if cache is None else cache
+    nodes = _node_cache if nodes is None else nodes
+    key = model_fingerprint(model)
+    ckey = f"{key}:profile" if profile else key
+    results = cache.get(ckey)
+    if results is None:
+        results = compute_balances(model, profile=profile, nodes=nodes)
+        results["fingerprint"] = key
+        cache.put(ckey, results)
+    return results
+
+def balances_cache_stats() -> dict:
+    return dict(_balances_cache.stats(), nodes=_node_cache.stats())
+
+_timeseries_cache = LRUCache(maxsize=32)
+
+def cached_compute_timeseries(model: dict, freq: str = "M", cache: LRUCache = None) -> dict:
+    """compute_timeseries memoized on the model fingerprint and frequency."""
+    from .model import compute_timeseries
+
+    cache = _timeseries_cache if cache is None else cache
+    key = (model_fingerprint(model), freq)
+    out = cache.get(key)
+    if out is None:
+        out = compute_timeseries(model, freq)
+        cache.put(key, out)
+    return out
@@ -0,0 +1,282 @@
+"""
+Sample-based inference of dataset type and column mapping.
+
+Only a bounded head sample of a file is read (see ingest.read_head). Every column is profiled once:
+numeric share, non-negative share, min/max, date parse rate, unit-label share and cardinality. Then each
+(dataset type, field, column) triple is scored on header tokens and on how well the column's values
+fit the field (a mass should be numeric and non-negative, a period should parse as dates, a route
+should be a small set of labels). Fields take distinct columns, best score first. Dataset types are
+ranked by their mean field score, with a bonus for filename hints, and the ranking is turned into
+confidences.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from .units import COUNT_UNITS, FACTORS, label
+
+SAMPLE_ROWS = 200
+MIN_SCORE = 0.45  # below this a field is left unmapped
+HEADER_WEIGHT = 0.7  # the rest of a score comes from the value profile; dates weigh both equally
+NAME_BONUS = 0.15
+TEMPERATURE = 0.1  # softmax temperature turning type scores into confidences
+
+_PERIOD = {"date": 0.9, "month": 1.0, "period": 1.0, "week": 0.7, "day": 0.7}
+
+# dataset type -> field -> (value kind, {header token: weight})
+FIELDS = {
+    "production_output": {
+        "date": ("date", {"date": 1.0, "day": 0.8, "period": 0.8, "week": 0.7, "month": 0.7, "shift": 0.4}),
+        "qty": ("numeric", {"qty": 1.0, "produced": 1.0, "quantity": 0.9, "output": 0.8, "units": 0.7, "pcs": 0.6, "count": 0.6}),
+        "unit": ("unit", {"unit": 1.0, "uom": 1.0, "units": 0.6}),
+        "product": ("id", {"product": 1.0, "sku": 1.0, "item": 0.8, "part": 0.7, "code": 0.5}),
+    },
+    "material_purchases": {
+        "period": ("date", _PERIOD),
+        "material": ("text", {"material": 1.0, "description": 0.7, "item": 0.6, "grade": 0.5}),
+        "mass_kg": ("numeric", {"kg": 1.0, "weight": 1.0, "mass": 1.0, "tonnes": 0.7, "qty": 0.4, "quantity": 0.4}),
+    },
+    "energy_site": {
+        "period": ("date", _PERIOD),
+        "electricity_kwh": ("numeric", {"electricity": 1.0, "electric": 1.0, "elec": 1.0, "kwh": 0.8, "power": 0.6}),
+        "gas_kwh": ("numeric", {"gas": 1.0, "therms": 0.8, "fuel": 0.5}),
+    },
+    "waste_summary": {
+        "waste_type": ("category", {"waste": 1.0, "ewc": 0.8, "stream": 0.6, "type": 0.5}),
+        "mass_kg": ("numeric", {"kg": 1.0, "weight": 1.0, "mass": 1.0, "quantity": 0.8, "tonnes": 0.7}),
+        "route": ("category", {"route": 1.0, "disposal": 1.0, "destination": 0.8, "treatment": 0.7, "fate": 0.7}),
+    },
+}
+DATASET_TYPES = list(FIELDS)
+# a per-row unit column is mapped for every type as an extra "unit" field (mfm.units converts on
+# it), but only scored into the type ranking where FIELDS lists it
+UNIT_FIELD = FIELDS["production_output"]["unit"]
+
+NAME_TOKENS = {
+    "production_output": {"production", "output", "produced", "shift"},
+    "material_purchases": {"purchase", "purchases", "material", "materials", "po"},
+    "energy_site": {"energy", "utility", "utilities", "meter", "electricity", "gas"},
+    "waste_summary": {"waste", "disposal", "ewc"},
+}
+
+_DATE_RE = r"^\s*(?:\d{4}[-/.]\d{1,2}(?:[-/.]\d{1,2})?|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})"
+_NUMBER_RE = r"\s*[+-]?(?:\d[\d,]*)?\.?\d+(?:[eE][+-]?\d+)?\s*"
+_MONTH_RE = r"^\s*(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?(?:\s+\d{2,4})?\s*$"
+
+def tokens(header):
+    """Lower-case word tokens of a header, plus its camelCase parts ('QtyProduced' -> qtyproduced, qty, produced)."""
+    h = str(header)
+    out = set(re.findall(r"[a-z]+|\d+", h.lower()))
+    out.update(p.lower() for p in re.findall(r"[A-Z]?[a-z]+", h))
+    return out
+
+_UNIT_LABELS = frozenset(COUNT_UNITS).union(*FACTORS.values())
+
+_VOCAB = sorted({t for fields in FIELDS.values() for _, toks in fields.values() for t in toks})
+_VOCAB_INDEX = {t: i for i, t in enumerate(_VOCAB)}
+
+def header_matches(columns):
+    """
+    (vocabulary token x column) match strengths: 1.0 for a whole header token, 0.7 for the start
+    of one ('electric' in 'Electricity'), 0.5 anywhere in the header ('qty' in 'NetQtyPcs').
+    """
+    m = np.zeros((len(_VOCAB), len(columns)))
+    for j, c in enumerate(columns):
+        toks = tokens(c)
+        flat = re.sub(r"[^a-z0-9]+", "", str(c).lower())
+        spaced = " " + " ".join(toks)
+        for i, t in enumerate(_VOCAB):
+            if t not in flat:
+                continue
+            if t in toks:
+                m[i, j] = 1.0
+            elif len(t) >= 3:
+                m[i, j] = 0.7 if " " + t in spaced else 0.5
+    return m
+
+def profile_columns(df):
+    """
+    One row per column of a sample: non-null count, numeric share, non-negative share (of the
+    numeric values), min, max, date share, unit-label share (mfm.units) and distinct-value count. Numeric columns are profiled
+    as one 2-D array and text columns as one concatenated array, so a 500-column sample costs a
+    handful of vectorised passes rather than 500 of them.
+    """
+    cols = list(df.columns)
+    n = len(cols)
+    p = {k: np.zeros(n) for k in ("count", "numeric", "nonneg", "min", "max", "date", "unit", "distinct")}
+    kinds = np.array([t.kind for t in df.dtypes], dtype="U1")
+    is_date = kinds == "M"
+    is_num = np.isin(kinds, ["i", "u", "f"])
+    is_text = ~(is_date | is_num)
+    # one conversion of the whole sample is much cheaper than pulling out hundreds of Series
+    block = df.to_numpy(dtype=object) if n else None
+
+    if is_num.any():
+        idx = np.flatnonzero(is_num)
+        try:
+            num = block[:, idx].astype(float)
+        except TypeError:  # nullable integer columns hold pd.NA
+            num = df.iloc[:, idx].to_numpy(dtype=float, na_value=np.nan)
+        srt = np.sort(num, axis=0)  # NaN sorts last
+        valid = ~np.isnan(srt)
+        k = valid.sum(axis=0)
+        has = k > 0
+        p["count"][idx] = k
+        p["numeric"][idx] = has
+        p["nonneg"][idx] = (srt >= 0).sum(axis=0) / np.maximum(k, 1)
+        p["min"][idx] = np.where(has, srt[0], 0.0)
+        p["max"][idx] = np.where(has, srt[np.maximum(k - 1, 0), np.arange(len(k))], 0.0)
+        p["distinct"][idx] = valid[:1].sum(axis=0) + ((np.diff(srt, axis=0) != 0) & valid[1:]).sum(axis=0)
+
+    if is_text.any():
+        idx = np.flatnonzero(is_text)
+        values = block[:, idx].ravel(order="F")
+        col = np.repeat(idx, len(df))
+        keep = pd.notna(values)
+        text = pd.Series(values[keep], dtype=str)
+        col = col[keep]
+        count = np.bincount(col, minlength=n)
+        k = np.maximum(count, 1)
+        codes, uniques = pd.factorize(text.to_numpy())
+        width = max(len(uniques), 1)
+        p["count"][idx] = count[idx]
+        p["distinct"][idx] = np.bincount(np.unique(col.astype(np.int64) * width + codes) // width, minlength=n)[idx]
+        is_unit = np.array([label(u) in _UNIT_LABELS for u in uniques], dtype=bool)
+        if len(codes):
+            p["unit"][idx] = (np.bincount(col, weights=is_unit[codes], minlength=n) / k)[idx]
+
+        # to_numeric is slow on strings that fail to parse, so only number-shaped ones are converted
+        parsed = np.full(len(text), np.nan)
+        shaped = text.str.fullmatch(_NUMBER_RE).to_numpy(dtype=bool)
+        if shaped.any():
+            parsed[shaped] = pd.to_numeric(text[shaped].str.replace(",", "", regex=False), errors="coerce").to_numpy(dtype=float)
+        is_number = ~np.isnan(parsed)
+        dmy = text.str.match(_DATE_RE).to_numpy(dtype=bool)
+        looks_date = dmy | text.str.match(_MONTH_RE, case=False).to_numpy(dtype=bool)
+        looks_date &= ~is_number | text.str.contains(r"[-/.]", regex=True).to_numpy(dtype=bool)
+        # confirm day/month/year patterns actually parse; month names ("Jan") are taken as they are
+        numeric_like = looks_date & dmy
+        if numeric_like.any():
+            looks_date[numeric_like] = pd.to_datetime(text[numeric_like], errors="coerce", format="mixed").notna().to_numpy()
+        is_number &= ~looks_date
+        n_num = np.bincount(col[is_number], minlength=n)
+        p["date"][idx] = (np.bincount(col, weights=looks_date, minlength=n) / k)[idx]
+        p["numeric"][idx] = (n_num / k)[idx]
+        p["nonneg"][idx] = (np.bincount(col[is_number], weights=parsed[is_number] >= 0, minlength=n) / np.maximum(n_num, 1))[idx]
+        if is_number.any():
+            g = pd.Series(parsed[is_number]).groupby(col[is_number])
+            lo, hi = g.min(), g.max()
+            p["min"][lo.index] = lo.to_numpy()
+            p["max"][hi.index] = hi.to_numpy()
+
+    if is_date.any():
+        dates = df.iloc[:, np.flatnonzero(is_date)]
+        p["count"][is_date] = dates.notna().sum().to_numpy()
+        p["date"][is_date] = p["count"][is_date] > 0
+        p["distinct"][is_date] = dates.nunique().to_numpy()
+    return pd.DataFrame({"column": cols, **p})
+
+def _fit(kind, p):
+    """How well each profiled column fits a value kind, 0..1 (arrays over the profile's columns)."""
+    filled = p["count"] > 0
+    numeric, date = p["numeric"], p["date"]
+    few = p["distinct"] <= np.maximum(20, 0.2 * p["count"])
+    if kind == "numeric":
+        return filled * numeric * (0.6 + 0.4 * p["nonneg"]) * (1.0 - date)
+    if kind == "date":
+        return filled * date
+    if kind == "category":
+        return filled * (1.0 - numeric) * (1.0 - date) * (0.4 + 0.6 * few)
+    if kind == "unit":
+        # a unit column holds unit labels; other text under a 'Unit ...' header (prices, costs) does not
+        return filled * (1.0 - numeric) * (1.0 - date) * (0.2 + 0.8 * p["unit"])
+    if kind == "text":
+        return filled * (1.0 - numeric) * (1.0 - date)
+    # ids (product codes) may be numeric but are never dates
+    return filled * np.maximum(1.0 - numeric, 0.5) * (1.0 - date)
+
+def _scores(fits, matches, dataset_type):
+    """Field -> array of scores over the columns."""
+    out = {}
+    for field, (kind, field_tokens) in FIELDS[dataset_type].items():
+        header = np.max([w * matches[_VOCAB_INDEX[t]] for t, w in field_tokens.items()], axis=0)
+        w = 0.5 if kind == "date" else HEADER_WEIGHT
+        out[field] = w * header + (1.0 - w) * fits[kind]
+    return out
+
+def _unit_scores(fits, matches, taken, columns):
+    """UNIT_FIELD scores over the columns, zero for columns other fields already took."""
+    kind, field_tokens = UNIT_FIELD
+    header = np.max([w * matches[_VOCAB_INDEX[t]] for t, w in field_tokens.items()], axis=0)
+    free = ~np.isin(np.asarray(columns, dtype=object), [c for c in taken if c is not None])
+    return {"unit": (HEADER_WEIGHT * header + (1.0 - HEADER_WEIGHT) * fits[kind]) * free}
+
+def _assign(scores, columns, top=3):
+    """Greedy one-column-per-field assignment, best pair first; returns (mapping, confidences, candidates)."""
+    fields = list(scores)
+    mapping = {f: None for f in fields}
+    conf = {f: 0.0 for f in fields}
+    candidates = {}
+    if not len(columns):
+        return mapping, conf, {f: [] for f in fields}
+    mat = np.vstack([scores[f] for f in fields])
+    for i, f in enumerate(fields):
+        order = np.argsort(-mat[i], kind="stable")[:top]
+        candidates[f] = [(columns[j], round(float(mat[i, j]), 3)) for j in order if mat[i, j] > 0]
+    work = mat.copy()
+    for _ in fields:
+        i, j = np.unravel_index(np.argmax(work), work.shape)
+        if work[i, j] < MIN_SCORE:
+            break
+        mapping[fields[i]] = columns[j]
+        conf[fields[i]] = round(float(mat[i, j]), 3)
+        work[i, :] = -1.0
+        work[:, j] = -1.0
+    return mapping, conf, candidates
+
+def infer_schema(df, filename=""):
+    """
+    Ranked dataset types and a column mapping for each, from a (head) sample. Returns
+    {"dataset_type", "confidence", "ranking": [(type, confidence), ...], "mapping",
+    "field_confidence", "mappings" (per type), "candidates" (per type, field: top columns with scores),
+    "profile"}.
+    """
+    columns = list(df.columns)
+    prof = profile_columns(df)
+    matches = header_matches(columns)
+    arrays = {k: prof[k].to_numpy() for k in ("count", "numeric", "nonneg", "date", "unit", "distinct")}
+    fits = {kind: _fit(kind, arrays) for kind in ("numeric", "date", "category", "unit", "text", "id")}
+    name_tokens = tokens(re.sub(r"\.[A-Za-z0-9]+$", "", str(filename)))
+
+    mappings, field_conf, candidates, type_score = {}, {}, {}, {}
+    for t in DATASET_TYPES:
+        mappings[t], field_conf[t], candidates[t] = _assign(_scores(fits, matches, t), columns)
+        type_score[t] = float(np.mean(list(field_conf[t].values()))) + (NAME_BONUS if name_tokens & NAME_TOKENS[t] else 0.0)
+        if "unit" not in mappings[t] and columns:
+            m, c, cand = _assign(_unit_scores(fits, matches, mappings[t].values(), columns), columns)
+            mappings[t].update(m)
+            field_conf[t].update(c)
+            candidates[t].update(cand)
+
+    s = np.array([type_score[t] for t in DATASET_TYPES])
+    p = np.exp((s - s.max()) / TEMPERATURE)
+    p /= p.sum()
+    ranking = sorted(zip(DATASET_TYPES, np.round(p, 3).tolist()), key=lambda x: -x[1])
+    best = ranking[0][0]
+    return {
+        "dataset_type": best,
+        "confidence": ranking[0][1],
+        "ranking": ranking,
+        "mapping": mappings[best],
+        "field_confidence": field_conf[best],
+        "mappings": mappings,
+        "candidates": candidates,
+        "profile": prof,
+    }
+
+def infer_file(source, name, nrows=SAMPLE_ROWS):
+    """infer_schema on the first `nrows` rows of a CSV/XLSX/.arrow file (the rest is never read)."""
+    from .ingest import read_head
+
+    return infer_schema(read_head(source, name, nrows=nrows), name)
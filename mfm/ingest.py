@@ -0,0 +1,239 @@
+"""
+Streaming ingestion: read large CSV/XLSX/Parquet logs (or their cached .arrow copies, see
+mfm.store) in chunks, keep only the mapped columns and reduce them to the grouped totals compute_balances
+needs. The reduced frames keep the original column names (so header unit hints survive) and
+resolve through mfm.schema with the same mapping, which names their columns.
+"""
+import os
+
+import pandas as pd
+
+from .infer import infer_schema
+
+CHUNK_ROWS = 200_000
+
+# Per dataset type: (group-by mapping keys, summed mapping keys). Rows in different units are
+# never summed together: the unit column stays a key and mfm.units converts when resolving.
+AGGREGATES = {
+    "production_output": (["date", "product", "unit"], ["qty"]),
+    "material_purchases": (["period", "material", "unit"], ["mass_kg"]),
+    "energy_site": (["period", "unit"], ["electricity_kwh", "gas_kwh"]),
+    "waste_summary": (["waste_type", "route", "unit"], ["mass_kg"]),
+}
+# Date keys are bucketed to the day before grouping: a time of day (and UTC offset) after the date
+# is cut off, so timestamped logs reduce to daily totals. Dates without a time are left as written.
+DATE_FIELDS = ("date", "period")
+TIME_OF_DAY = r"[T\s]+\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*(?:[AaPp][Mm])?\s*(?:Z|[+-]\d{2}:?\d{2})?\s*$"
+
+def _is_excel(name: str) -> bool:
+    return name.lower().endswith((".xlsx", ".xlsm"))
+
+def _is_arrow(name: str) -> bool:
+    return str(name).lower().endswith(".arrow")
+
+def _is_parquet(name: str) -> bool:
+    return str(name).lower().endswith(".parquet")
+
+def _parquet_chunks(source, chunksize, usecols=None):
+    import pyarrow.parquet as pq
+
+    _rewind(source)
+    pf = pq.ParquetFile(source)
+    batches = pf.iter_batches(batch_size=chunksize, columns=usecols)
+    empty = True
+    for batch in batches:
+        empty = False
+        yield batch.to_pandas()
+    if empty:
+        yield pf.schema_arrow.empty_table().select(usecols or pf.schema_arrow.names).to_pandas()
+
+def _as_str(s: pd.Series) -> pd.Series:
+    return s.astype(str).where(s.notna(), None)
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+def _size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    size = getattr(source, "size", None)
+    if size is None and hasattr(source, "getbuffer"):
+        size = source.getbuffer().nbytes
+    return size
+
+def _excel_chunks(source, chunksize, usecols=None, nrows=None):
+    from openpyxl import load_workbook
+
+    _rewind(source)
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(next(rows, ()))]
+        keep = [i for i, h in enumerate(header) if usecols is None or h in usecols]
+        cols = [header[i] for i in keep]
+        buf, seen = [], 0
+        for row in rows:
+            buf.append([row[i] if i < len(row) else None for i in keep])
+            seen += 1
+            if len(buf) >= chunksize or (nrows is not None and seen >= nrows):
+                yield pd.DataFrame(buf, columns=cols)
+                buf = []
+                if nrows is not None and seen >= nrows:
+                    return
+        if buf or not seen:
+            yield pd.DataFrame(buf, columns=cols)
+    finally:
+        wb.close()
+
+def iter_chunks(source, name, chunksize=CHUNK_ROWS, usecols=None, dtype=None):
+    """Yield DataFrame chunks of a CSV/XLSX/Parquet path or file-like object, or of a cached .arrow file."""
+    if _is_excel(name) or _is_arrow(name) or _is_parquet(name):
+        if _is_parquet(name):
+            chunks = _parquet_chunks(source, chunksize, usecols=usecols)
+        elif _is_arrow(name):
+            from .store import open_table
+
+            table = open_table(source)
+            table = table.select(usecols) if usecols is not None else table
+            chunks = (b.to_pandas() for b in table.to_batches(max_chunksize=chunksize))
+        else:
+            chunks = _excel_chunks(source, chunksize, usecols=usecols)
+        for chunk in chunks:
+            for c in (dtype or {}):
+                if c in chunk.columns:
+                    chunk[c] = _as_str(chunk[c])
+            yield chunk
+        return
+    _rewind(source)
+    yield from pd.read_csv(source, chunksize=chunksize, usecols=usecols, dtype=dtype)
+
+def read_head(source, name, nrows=200) -> pd.DataFrame:
+    """Read only the first `nrows` rows (headers + a value sample) of a file."""
+    if _is_arrow(name):
+        from .store import open_table
+
+        return open_table(source).slice(0, nrows).to_pandas()
+    if _is_parquet(name):
+        head = next(_parquet_chunks(source, nrows))
+    elif _is_excel(name):
+        head = next(_excel_chunks(source, nrows, nrows=nrows))
+    else:
+        _rewind(source)
+        head = pd.read_csv(source, nrows=nrows)
+    _rewind(source)
+    return head
+
+def _combine(parts, keys, vals):
+    if not keys:
+        return [pd.concat(parts, ignore_index=True)[vals].sum().to_frame().T]
+    df = pd.concat(parts)
+    return [df.groupby(level=list(range(len(keys))), dropna=False, sort=False)[vals].sum()]
+
+def _frame_partials(source, name, keys, vals, chunksize, dates=()):
+    for chunk in iter_chunks(source, name, chunksize=chunksize, usecols=keys + vals, dtype={k: str for k in keys}):
+        for d in dates:
+            chunk[d] = chunk[d].str.replace(TIME_OF_DAY, "", regex=True)
+        for v in vals:
+            # text in a value column is missing, as on the Arrow path (see _arrow_floats)
+            if chunk[v].dtype.kind not in "biuf":
+                chunk[v] = pd.to_numeric(chunk[v], errors="coerce")
+        chunk[vals] = chunk[vals].astype(float)
+        part = chunk[vals].sum().to_frame().T if not keys else \
+            chunk.groupby(keys, dropna=False, sort=False)[vals].sum()
+        yield part, len(chunk)
+
+def _arrow_partials(path, keys, vals, chunksize, dates=()):
+    # Cached Arrow files are reduced batch by batch with Arrow's own group-by, straight off the memory map.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from .store import open_table
+
+    table = open_table(path).select(keys + vals)
+    sums = [(v, "sum", pc.ScalarAggregateOptions(min_count=0)) for v in vals]
+    for batch in table.to_batches(max_chunksize=chunksize):
+        t = pa.table([_arrow_day(_arrow_key(batch.column(k))) if k in dates else _arrow_key(batch.column(k)) for k in keys] +
+                     [_arrow_floats(batch.column(v)) for v in vals], names=keys + vals)
+        if keys:
+            part = t.group_by(keys).aggregate(sums).to_pandas()
+            part = part.rename(columns={f"{v}_sum": v for v in vals}).set_index(keys)[vals]
+        else:
+            part = pd.DataFrame([[pc.sum(t[v], min_count=0).as_py() for v in vals]], columns=vals)
+        yield part, batch.num_rows
+
+def _arrow_key(col):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    col = pc.cast(col, pa.string())
+    # blank cells of text-typed caches (see mfm.store) are missing, as in the pandas path
+    return pc.if_else(pc.equal(col, ""), pa.scalar(None, pa.string()), col)
+
+def _arrow_floats(col):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_string(col.type) or pa.types.is_large_string(col.type):
+        # a cache stored as text (types drifted, see mfm.store): blanks and unparseable values become missing
+        return pa.array(pd.to_numeric(col.to_pandas(), errors="coerce"), type=pa.float64(), from_pandas=True)
+    return pc.cast(col, pa.float64())
+
+def _arrow_day(col):
+    import pyarrow.compute as pc
+
+    return pc.replace_substring_regex(col, pattern=TIME_OF_DAY, replacement="")
+
+def stream_dataset(source, name, dataset_type, mapping=None, chunksize=CHUNK_ROWS, progress=None) -> pd.DataFrame:
+    """
+    Reduce a (possibly huge) dataset file to grouped totals (per day, see DATE_FIELDS) in bounded memory.
+
+    Only the columns picked by `mapping` (default: inferred from a head sample, see mfm.infer) are read.
+    `progress(rows_read, fraction)` is called after each chunk; fraction is None when the size is unknown.
+    """
+    if mapping is None:
+        mapping = infer_schema(read_head(source, name))["mappings"][dataset_type]
+    key_fields, val_fields = AGGREGATES[dataset_type]
+    keys = list(dict.fromkeys(mapping[k] for k in key_fields if mapping.get(k)))
+    vals = list(dict.fromkeys(mapping[k] for k in val_fields if mapping.get(k) and mapping[k] not in keys))
+    dates = [mapping[k] for k in key_fields if k in DATE_FIELDS and mapping.get(k)]
+    if not vals:
+        return pd.DataFrame(columns=keys)
+
+    if _is_arrow(name):
+        from .store import open_table
+
+        total, total_rows = None, open_table(source).num_rows
+        partials = _arrow_partials(source, keys, vals, chunksize, dates)
+    elif _is_parquet(name):
+        import pyarrow.parquet as pq
+
+        _rewind(source)
+        total, total_rows = None, pq.ParquetFile(source).metadata.num_rows
+        partials = _frame_partials(source, name, keys, vals, chunksize, dates)
+    else:
+        total, total_rows = _size(source), None
+        partials = _frame_partials(source, name, keys, vals, chunksize, dates)
+
+    parts, part_rows, rows, limit = [], 0, 0, chunksize
+    for part, n in partials:
+        parts.append(part)
+        part_rows += len(part)
+        rows += n
+        # keep partial aggregates bounded: re-reduce once they outgrow a chunk, or twice what the last
+        # reduction left (many distinct groups), so the total re-reducing work stays linear
+        if part_rows > limit:
+            parts = _combine(parts, keys, vals)
+            part_rows = len(parts[0])
+            limit = max(chunksize, 2 * part_rows)
+        if progress is not None:
+            if total_rows:
+                progress(rows, min(rows / total_rows, 1.0))
+            else:
+                pos = source.tell() if hasattr(source, "tell") and not _is_excel(name) else None
+                progress(rows, min(pos / total, 1.0) if pos is not None and total else None)
+
+    if not parts:
+        return pd.DataFrame(columns=keys + vals)
+    out = _combine(parts, keys, vals)[0]
+    out = out.reset_index() if keys else out.reset_index(drop=True)
+    return out[keys + vals]
@@ -0,0 +1,170 @@
+"""
+Persistent store of confirmed file layouts.
+
+A layout is identified by its schema signature: a hash of the normalised column names (trimmed,
+lower-case, whitespace collapsed, order ignored), so next month's export of the same ERP report
+matches even if its rows differ. Each entry remembers the dataset type and column mapping the user
+confirmed; `classify` applies a stored layout straight away and falls back to inference
+(mfm.infer) for unseen ones. Hits and misses are counted across sessions; entries unused for
+`max_age_days`, or beyond `max_entries` (least recently used first), are evicted.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from .cache import CACHE_DIR
+from .infer import SAMPLE_ROWS, infer_schema
+
+MAX_ENTRIES = 500
+MAX_AGE_DAYS = 180
+
+def normalise(column) -> str:
+    return re.sub(r"\s+", " ", str(column).strip().lower())
+
+def layout_signature(columns) -> str:
+    names = sorted(normalise(c) for c in columns)
+    return hashlib.blake2b(json.dumps(names).encode(), digest_size=16).hexdigest()
+
+class LayoutStore:
+    """JSON file of confirmed layouts keyed by schema signature, with hit/miss counters."""
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES, max_age_days=MAX_AGE_DAYS):
+        self.path = path or os.path.join(CACHE_DIR, "layouts.json")
+        self.max_entries = int(max_entries)
+        self.max_age = float(max_age_days) * 86400.0
+        self._lock = threading.Lock()
+        self._data = None
+        self._mtime = None
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if self._data is None or mtime != self._mtime:
+            data = {"hits": 0, "misses": 0, "layouts": {}}
+            if mtime is not None:
+                try:
+                    with open(self.path) as f:
+                        data.update(json.load(f))
+                except (OSError, ValueError):
+                    pass  # unreadable store: start afresh, it is only a cache
+            self._data, self._mtime = data, mtime
+        return self._data
+
+    def _save(self):
+        d = os.path.dirname(self.path) or "."
+        os.makedirs(d, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".json.tmp", dir=d)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f)
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._mtime = os.path.getmtime(self.path)
+
+    def _evict(self, now):
+        layouts = self._data["layouts"]
+        for sig in [s for s, e in layouts.items() if now - e["last_used"] > self.max_age]:
+            del layouts[sig]
+        if len(layouts) > self.max_entries:
+            for sig in sorted(layouts, key=lambda s: layouts[s]["last_used"])[: len(layouts) - self.max_entries]:
+                del layouts[sig]
+
+    def lookup(self, columns):
+        """
+        The stored layout for these columns, or None. A hit returns {"dataset_type", "mapping"
+        (onto these columns), "uses", "signature"}; stored columns missing from the file map to None.
+        """
+        sig = layout_signature(columns)
+        actual = {normalise(c): c for c in columns}
+        with self._lock:
+            data = self._load()
+            entry = data["layouts"].get(sig)
+            if entry is not None and time.time() - entry["last_used"] > self.max_age:
+                del data["layouts"][sig]
+                entry = None
+            if entry is None:
+                data["misses"] += 1
+                self._save()
+                return None
+            data["hits"] += 1
+            entry["last_used"] = time.time()
+            entry["uses"] += 1
+            self._save()
+            return {
+                "dataset_type": entry["dataset_type"],
+                "mapping": {k: actual.get(v) if v is not None else None for k, v in entry["mapping"].items()},
+                "uses": entry["uses"],
+                "signature": sig,
+            }
+
+    def remember(self, columns, dataset_type, mapping):
+        """Store (or replace) the confirmed type and mapping for this layout; returns its signature."""
+        sig = layout_signature(columns)
+        now = time.time()
+        with self._lock:
+            data = self._load()
+            old = data["layouts"].get(sig, {})
+            data["layouts"][sig] = {
+                "columns": sorted(normalise(c) for c in columns),
+                "dataset_type": dataset_type,
+                "mapping": {k: normalise(v) if v is not None else None for k, v in mapping.items()},
+                "created": old.get("created", now),
+                "last_used": now,
+                "uses": old.get("uses", 0),
+            }
+            self._evict(now)
+            self._save()
+        return sig
+
+    def forget(self, columns):
+        with self._lock:
+            data = self._load()
+            if data["layouts"].pop(layout_signature(columns), None) is not None:
+                self._save()
+
+    def evict(self):
+        """Drop stale and surplus entries now (also done whenever a layout is stored)."""
+        with self._lock:
+            self._load()
+            self._evict(time.time())
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = self._load()
+            total = data["hits"] + data["misses"]
+            return {
+                "entries": len(data["layouts"]),
+                "hits": data["hits"],
+                "misses": data["misses"],
+                "hit_rate": (data["hits"] / total) if total else 0.0,
+            }
+
+def classify(df, filename="", store=None):
+    """
+    infer_schema's result shape for a head sample, taken from `store` when its layout has been
+    confirmed before ("source": "stored", confidence 1.0) and inferred otherwise ("source": "inferred").
+    """
+    hit = store.lookup(list(df.columns)) if store is not None else None
+    if hit is None:
+        return dict(infer_schema(df.head(SAMPLE_ROWS), filename), source="inferred")
+    t = hit["dataset_type"]
+    return {
+        "dataset_type": t,
+        "confidence": 1.0,
+        "ranking": [(t, 1.0)],
+        "mapping": hit["mapping"],
+        "field_confidence": {k: 1.0 if v is not None else 0.0 for k, v in hit["mapping"].items()},
+        "mappings": {t: hit["mapping"]},
+        "candidates": {t: {k: [(v, 1.0)] if v is not None else [] for k, v in hit["mapping"].items()}},
+        "source": "stored",
+        "uses": hit["uses"],
+    }
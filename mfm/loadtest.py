@@ -0,0 +1,77 @@
+"""
+Load test for the compute service (python -m mfm.service must be running).
+
+    python -m mfm.loadtest [--url http://127.0.0.1:8765] [--requests 200] [--concurrency 8]
+                           [--distinct 20] [--products 20]
+
+Sends --requests POST /balances calls from --concurrency threads, cycling through --distinct
+synthetic sites (so repeats exercise the reply cache), and reports throughput, latency
+percentiles and status counts.
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .synthetic import generate_bundle
+
+BLOCKS = [{"name": n, "yield_pct": 92, "capacity_units_per_hr": 60.0, "available_hours": 480.0, "downtime_pct": 8}
+          for n in ("Cutting", "Forming", "Welding", "Assembly", "Packing")]
+
+def make_request(seed, n_products=20):
+    bundle = generate_bundle(seed=seed, n_products=n_products)
+    tables = {k: json.loads(df.to_json(orient="split", index=False, date_format="iso")) for k, df in bundle.items()}
+    return {"site_name": f"Load test {seed}", "process_blocks": BLOCKS, "bundle": tables}
+
+def _post(url, body, timeout):
+    t0 = time.perf_counter()
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, TimeoutError) as e:
+        status = type(getattr(e, "reason", e)).__name__
+    return status, time.perf_counter() - t0
+
+def run_load(url, requests=200, concurrency=8, distinct=20, n_products=20, timeout=60.0):
+    """Returns {"requests", "seconds", "requests_per_sec", "status", "latency_ms": {p50, p95, p99, max}}."""
+    bodies = [json.dumps(make_request(i, n_products)).encode() for i in range(distinct)]
+    endpoint = url.rstrip("/") + "/balances"
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        out = list(pool.map(lambda i: _post(endpoint, bodies[i % distinct], timeout), range(requests)))
+    elapsed = time.perf_counter() - t0
+    lat = np.array([t for _, t in out]) * 1000.0
+    return {
+        "requests": requests,
+        "seconds": elapsed,
+        "requests_per_sec": requests / elapsed if elapsed > 0 else None,
+        "status": dict(Counter(str(s) for s, _ in out)),
+        "latency_ms": {f"p{p}": float(np.percentile(lat, p)) for p in (50, 95, 99)} | {"max": float(lat.max())},
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m mfm.loadtest", description="Load-test the mfm compute service.")
+    ap.add_argument("--url", default="http://127.0.0.1:8765")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--distinct", type=int, default=20, help="distinct site payloads to cycle through")
+    ap.add_argument("--products", type=int, default=20, help="products per synthetic site (payload size)")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    args = ap.parse_args(argv)
+
+    report = run_load(args.url, args.requests, args.concurrency, args.distinct, args.products, args.timeout)
+    print(json.dumps(report, indent=2))
+    return 0 if set(report["status"]) == {"200"} else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Level of detail for large flow maps.
+
+sankey_lod reduces a flows table (from, to, kg, kind) to a Sankey payload with at most
+`max_links` links, in steps that stop as soon as the payload fits (small maps pass unchanged):
+
+1. flows into loss and waste sinks (stage losses, waste, unaccounted) smaller than `min_share` of
+   the largest node throughput are merged into one "Other ..." node per kind; product exits and
+   the end gate are never merged;
+2. process nodes are collapsed by process type (block "type", else suggest_process_type), with
+   their loss nodes following them; flows inside a collapsed group disappear;
+3. the sink-merge threshold is raised until the link budget is met.
+
+Collapsed groups listed in `expand` (by group label or process type) stay at full detail, so a
+UI can open one node on demand. Mass into and out of the diagram is preserved.
+"""
+import pandas as pd
+
+from .ai_assist import suggest_process_type
+
+MAX_LINKS = 150
+# mergeable sink flow kinds -> label of their merged node
+OTHER_LABELS = {"stage_loss": "Other losses", "waste_out": "Other waste", "loss_unaccounted": "Other unaccounted"}
+_PROCESS_KINDS = ("throughput", "stage_loss", "product_out")
+
+def _aggregate(flows):
+    flows = flows[flows["from"] != flows["to"]]
+    return flows.groupby(["from", "to", "kind"], sort=False, as_index=False)["kg"].sum()
+
+def _sinks(flows):
+    """Nodes that only receive loss/waste flows and feed nothing; product exits never qualify."""
+    sinks = set(flows["to"]) - set(flows["from"]) - set(OTHER_LABELS.values())
+    return sinks - set(flows.loc[~flows["kind"].isin(list(OTHER_LABELS)), "to"])
+
+def _merge_small(flows, threshold):
+    small = flows["to"].isin(_sinks(flows)) & (flows["kg"] < threshold)
+    merged = {}
+    if small.any():
+        other = flows.loc[small, "kind"].map(OTHER_LABELS)
+        for lab, members in flows.loc[small, "to"].groupby(other.to_numpy()):
+            merged[lab] = sorted(set(members))
+        flows = flows.copy()
+        flows.loc[small, "to"] = other
+        flows = _aggregate(flows)
+    return flows, merged
+
+def _node_scale(flows):
+    out = flows.groupby("from")["kg"].sum()
+    inn = flows.groupby("to")["kg"].sum()
+    return float(max(out.max() if len(out) else 0.0, inn.max() if len(inn) else 0.0))
+
+def _collapse(flows, types, expand):
+    procs = pd.unique(pd.concat([flows.loc[flows["kind"].isin(_PROCESS_KINDS), "from"],
+                                 flows.loc[flows["kind"].isin(("material_in", "throughput")), "to"]]))
+    by_type = {}
+    for p in procs:
+        by_type.setdefault(types.get(p) or suggest_process_type(str(p)), []).append(p)
+
+    rename, groups = {}, {}
+    for t, members in by_type.items():
+        label = f"{t.capitalize()} ({len(members)} steps)"
+        if len(members) < 2 or t in expand or label in expand:
+            continue
+        groups[label] = members
+        for m in members:
+            rename[m] = label
+            rename[f"{m} losses"] = f"{label} losses"
+    if not groups:
+        return flows, groups
+    relabel = lambda s: s.map(rename).fillna(s)
+    flows = flows.assign(**{"from": relabel(flows["from"]), "to": relabel(flows["to"])})
+    return _aggregate(flows), groups
+
+def sankey_lod(flows, types=None, expand=(), max_links=MAX_LINKS, min_share=0.005):
+    """
+    Bounded Sankey payload from a flows table. Returns build_sankey_inputs' keys plus
+    "groups" (collapsed label -> member blocks), "merged" (other label -> merged nodes)
+    and "links_in" (links before reduction).
+    """
+    types = types or {}
+    expand = set(expand or ())
+    links_in = len(flows)
+    raw = flows
+    flows = _aggregate(flows[["from", "to", "kg", "kind"]].astype({"kg": float}))
+    scale = _node_scale(flows)
+
+    merged, groups = {}, {}
+    if len(flows) > max_links:
+        flows, merged = _merge_small(flows, min_share * scale)
+    if len(flows) > max_links:
+        flows, groups = _collapse(flows, types, expand)
+    if len(flows) > max_links:
+        sinks = _sinks(flows) - set(merged)
+        sink_kg = flows.loc[flows["to"].isin(sinks), "kg"].sort_values(ascending=False)
+        keep = max(max_links - (len(flows) - len(sink_kg)), 0)
+        if keep < len(sink_kg):
+            flows, more = _merge_small(flows, sink_kg.iloc[keep] if keep else float("inf"))
+            for lab, members in more.items():
+                merged[lab] = sorted(set(merged.get(lab, [])) | set(members))
+    if len(flows) > max_links and expand:
+        # expanded groups alone still blow the budget: fall back to the fully collapsed view
+        return sankey_lod(raw, types, (), max_links, min_share)
+
+    labels = pd.unique(pd.concat([flows["from"], flows["to"]], ignore_index=True)).tolist()
+    idx = {lab: i for i, lab in enumerate(labels)}
+    return {
+        "labels": labels,
+        "sources": [idx[x] for x in flows["from"]],
+        "targets": [idx[x] for x in flows["to"]],
+        "values": flows["kg"].tolist(),
+        "groups": groups,
+        "merged": merged,
+        "links_in": links_in,
+    }
@@ -1,8 +1,16 @@
 import pandas as pd
 import numpy as np
 
+from .lod import sankey_lod
+from .network import build_network, network_flows, solve_network
+from .nodes import NodeGraph
+from .products import product_masses, resolve_master, row_unit_masses
+from .profiling import NULL_PROFILER, StageProfiler
+from .schema import resolve_bundle
+from .simulate import simulate_bottlenecks
+
 def build_flow_model(site_name, boundary_start, boundary_end, process_blocks, data_bundle, time_period,
-                     scenarios, unit_mass_kg_per_unit=7.0, carbon_factors=None):
+                     scenarios, unit_mass_kg_per_unit=7.0, carbon_factors=None, product_master=None):
     return {
         "site_name": site_name,
         "boundary_start": boundary_start,
@@ -13,67 +21,55 @@ def build_flow_model(site_name, boundary_start, boundary_end, process_blocks, da
         "scenarios": scenarios,
         "unit_mass_kg_per_unit": float(unit_mass_kg_per_unit),
         "carbon_factors": carbon_factors or {},
+        # per-product unit masses (mfm.products); unit_mass_kg_per_unit covers products not in it
+        "product_master": resolve_master(product_master),
     }
 
-def _find_col(df, keywords):
-    for c in df.columns:
-        lc = c.lower()
-        if any(k in lc for k in keywords):
-            return c
-    return None
-
-def _sum_material_in_kg(material_df):
-    kg_col = _find_col(material_df, ["kg", "weight"])
-    return float(material_df[kg_col].astype(float).sum()) if kg_col else None
-
-def _sum_waste_kg(waste_df):
-    kg_col = _find_col(waste_df, ["kg", "quantity"])
-    return float(waste_df[kg_col].astype(float).sum()) if kg_col else None
-
-def _waste_by_type(waste_df):
-    type_col = _find_col(waste_df, ["waste"])
-    kg_col = _find_col(waste_df, ["kg", "quantity"])
-    if not type_col or not kg_col:
-        return pd.DataFrame(columns=["Waste Type", "Quantity (kg)"])
-    out = waste_df[[type_col, kg_col]].copy()
-    out.columns = ["Waste Type", "Quantity (kg)"]
-    out["Quantity (kg)"] = out["Quantity (kg)"].astype(float)
-    return out
+def _sum_material_in_kg(material):
+    return material.total_kg
 
-def _energy_totals(energy_df):
-    elec_col = _find_col(energy_df, ["electric"])
-    gas_col  = _find_col(energy_df, ["gas"])
-    elec = float(energy_df[elec_col].sum()) if elec_col else 0.0
-    gas  = float(energy_df[gas_col].sum())  if gas_col else 0.0
-    return elec, gas, bool(elec_col or gas_col)
-
-def _waste_emissions_kgco2e(waste_df, factors):
-    route_col = _find_col(waste_df, ["route", "disposal"])
-    kg_col = _find_col(waste_df, ["kg", "quantity"])
-    if not route_col or not kg_col:
-        return 0.0, {}
+def _sum_waste_kg(waste):
+    return waste.total_kg
 
-    tmp = waste_df.copy()
-    tmp[kg_col] = tmp[kg_col].astype(float)
-    routes = tmp[route_col].astype(str).str.lower().str.strip()
-
-    def route_factor(r: str) -> float:
-        if "landfill" in r:
-            return float(factors.get("waste_landfill_kgco2e_per_kg", 0.50))
-        if "incin" in r:
-            return float(factors.get("waste_incineration_kgco2e_per_kg", 0.70))
-        if "recycl" in r or "recycle" in r:
-            return float(factors.get("waste_recycling_kgco2e_per_kg", 0.05))
-        if "haz" in r:
-            return float(factors.get("waste_hazardous_kgco2e_per_kg", 1.20))
-        return float(factors.get("waste_landfill_kgco2e_per_kg", 0.50))
-
-    tmp["_ef"] = routes.apply(route_factor)
-    tmp["_co2e"] = tmp[kg_col] * tmp["_ef"]
-    breakdown = tmp.groupby(routes)["_co2e"].sum().to_dict()
-    return float(tmp["_co2e"].sum()), breakdown
-
-def compute_bottlenecks(blocks, total_units_required):
+def _waste_by_type(waste):
+    if waste.type_labels is None or waste.kg is None:
+        return pd.DataFrame(columns=["Waste Type", "Quantity (kg)"])
+    return pd.DataFrame({"Waste Type": waste.type_labels, "Quantity (kg)": waste.kg_by_type})
+
+def _energy_totals(energy):
+    elec, gas = energy.totals
+    return elec, gas, energy.has_energy
+
+# (carbon factor key, default) for each schema.ROUTE_CLASSES entry; unrecognised routes use landfill
+_ROUTE_FACTORS = [
+    ("waste_landfill_kgco2e_per_kg", 0.50),
+    ("waste_incineration_kgco2e_per_kg", 0.70),
+    ("waste_recycling_kgco2e_per_kg", 0.05),
+    ("waste_hazardous_kgco2e_per_kg", 1.20),
+    ("waste_landfill_kgco2e_per_kg", 0.50),
+]
+
+def _waste_emissions_kgco2e(waste, factors):
+    if waste.route_labels is None or waste.kg is None:
+        return 0.0, {}
+    ef = np.array([float(factors.get(k, d)) for k, d in _ROUTE_FACTORS])[waste.route_class]
+    co2e = waste.kg_by_route * ef
+    return float(co2e.sum()), dict(zip(waste.route_labels.tolist(), co2e.tolist()))
+
+SIM_COLUMNS = {
+    "Utilisation": "Sim utilisation",
+    "Throughput (units/hr)": "Sim throughput (units/hr)",
+    "Avg WIP (units)": "Sim avg WIP (units)",
+    "Avg time in queue (hr)": "Sim avg queue time (hr)",
+    "Blocked %": "Sim blocked %",
+    "Starved %": "Sim starved %",
+}
+
+def compute_bottlenecks(blocks, total_units_required, simulate=None):
+    """
+    Capacity check per block. `simulate` (dict of simulate_bottlenecks options, or True) also runs
+    the discrete-event line simulation and adds its results as "Sim ..." columns.
+    """
     rows = []
     for b in blocks:
         cap = float(b.get("capacity_units_per_hr", 0.0))
@@ -96,6 +92,11 @@ def compute_bottlenecks(blocks, total_units_required):
         })
 
     df = pd.DataFrame(rows)
+    if simulate:
+        sim = simulate_bottlenecks(blocks, total_units_required, **(simulate if isinstance(simulate, dict) else {}))
+        for c, name in SIM_COLUMNS.items():
+            df[name] = sim["blocks"][c].to_numpy()
+        df.attrs["simulation"] = sim["line"]
     df = df.sort_values("Utilisation", ascending=False, na_position="last")
 
     def risk(u):
@@ -108,165 +109,219 @@ def compute_bottlenecks(blocks, total_units_required):
     df["Risk"] = df["Utilisation"].apply(risk)
     return df
 
-def compute_balances(model):
-    data = model["data"]
-    blocks = model["blocks"]
-    sc = model["scenarios"]
+def _rows(arr):
+    return 0 if arr is None else len(arr)
 
-    ai_messages = []
-    assumptions = []
+# --- Result nodes: compute_balances is split into these so that, given a node cache, a change
+# to one input (say the energy slider) reruns only the nodes that read it ---
 
-    # --- Inputs ---
-    mat_in = _sum_material_in_kg(data["material_purchases"])
-    if mat_in is None:
-        mat_in = 0.0
-        assumptions.append("Material input mass missing; treated as 0 kg.")
+def _node_inputs(data):
+    return {"mat_in": _sum_material_in_kg(data.material), "waste_out": _sum_waste_kg(data.waste),
+            "qty": data.production.total_qty, "qty_kg": data.production.total_kg}
 
-    waste_df = data["waste_summary"]
-    waste_out = _sum_waste_kg(waste_df)
-    if waste_out is None:
-        waste_out = 0.0
-        assumptions.append("Waste mass missing; treated as 0 kg.")
+def _node_products(data, product_master):
+    return product_masses(data.production, product_master)
 
-    # Production
-    prod_df = data["production_output"]
-    qty_col = _find_col(prod_df, ["qty", "produced", "quantity"])
-    qty = float(prod_df[qty_col].sum()) if qty_col else 0.0
+def _node_mass_balance(inputs, products, unit_mass, scrap_reduction_pct, yield_improve_pct):
+    mat_in = inputs["mat_in"] if inputs["mat_in"] is not None else 0.0
+    waste_out = inputs["waste_out"] if inputs["waste_out"] is not None else 0.0
+    waste_out_scn = waste_out * (1.0 - scrap_reduction_pct / 100.0)
+    prod_mass = products["known_kg"] + products["unknown_qty"] * unit_mass + inputs["qty_kg"]
+    prod_mass_out = prod_mass * (1.0 + yield_improve_pct / 100.0)
+    return {
+        "mat_in": mat_in,
+        "waste_out_scn": waste_out_scn,
+        "prod_mass_out": prod_mass_out,
+        "unaccounted": max(mat_in - prod_mass_out - waste_out_scn, 0.0),
+    }
 
-    unit_mass = float(model.get("unit_mass_kg_per_unit", 7.0))
-    prod_mass_out_base = qty * unit_mass
-    assumptions.append(f"Converted output to mass using unit mass = {unit_mass:.2f} kg/unit.")
+def _node_energy(data, energy_intensity_improve_pct):
+    elec_kwh, gas_kwh, has_energy = _energy_totals(data.energy)
+    orig_elec, orig_gas = elec_kwh, gas_kwh
+    improve = energy_intensity_improve_pct / 100.0
+    if has_energy and improve > 0:
+        elec_kwh *= (1.0 - improve)
+        gas_kwh  *= (1.0 - improve)
+    return {"elec_kwh": elec_kwh, "gas_kwh": gas_kwh, "orig_elec": orig_elec, "orig_gas": orig_gas,
+            "has_energy": has_energy}
+
+def _node_energy_alloc(energy, blocks, allocate_energy):
+    if not (energy["has_energy"] and allocate_energy):
+        return None
+    # proxy: equal weights (simple + stable), unless you want to use yields
+    weights = np.ones(len(blocks), dtype=float)
+    weights = weights / weights.sum() if weights.sum() > 0 else weights
+    return pd.DataFrame({
+        "Process": [b["user_label"] for b in blocks],
+        "Electricity_kWh": (energy["elec_kwh"] * weights).round(0).astype(int),
+        "Gas_kWh": (energy["gas_kwh"] * weights).round(0).astype(int),
+    })
+
+def _node_waste_profile(data):
+    waste = data.waste
+    waste_by_type = _waste_by_type(waste)
+    diverted_kg = None
+    if waste.route_labels is not None and waste.kg is not None:
+        diverted_kg = float(waste.kg_by_route[waste.route_diverted].sum())
 
-    # --- Scenarios ---
-    scrap_reduction_pct = sc.get("scrap_reduction_pct", 0.0) / 100.0
-    yield_improve_pct = sc.get("yield_improve_pct", 0.0) / 100.0
-    energy_improve_pct = sc.get("energy_intensity_improve_pct", 0.0) / 100.0
+    opportunities = []
+    if not waste_by_type.empty:
+        kg_flagged = {name: float(waste.kg_by_type[flag].sum()) for name, flag in waste.type_flags.items()}
+        if kg_flagged["metal_scrap"] > 500:
+            opportunities.append("High clean metal scrap: consider closed-loop recycling with supplier or local reprocessor.")
+        if kg_flagged["mixed"] > 300:
+            opportunities.append("Mixed waste is significant: segregation could increase recycling rate and reduce disposal cost.")
+        if kg_flagged["sludge_haz"] > 100:
+            opportunities.append("Hazardous/sludge stream: review upstream controls and chemical use to reduce generation.")
+    return {"waste_by_type": waste_by_type, "diverted_kg": diverted_kg, "opportunities": opportunities}
 
-    waste_out_scn = waste_out * (1.0 - scrap_reduction_pct)
-    prod_mass_out = prod_mass_out_base * (1.0 + yield_improve_pct)
+def _node_circularity(waste_profile, mass_balance, scrap_reduction_pct):
+    diverted_kg_scn = (waste_profile["diverted_kg"] or 0.0) * (1.0 - scrap_reduction_pct / 100.0)
+    waste_out_scn = mass_balance["waste_out_scn"]
+    diversion_pct = (diverted_kg_scn / waste_out_scn * 100.0) if waste_out_scn > 0 else 0.0
+    return {"diverted_kg": diverted_kg_scn, "diversion_pct": diversion_pct}
 
-    if scrap_reduction_pct > 0:
-        ai_messages.append(f"Scenario applied: waste reduced by {sc.get('scrap_reduction_pct',0.0):.0f}%.")
-    if yield_improve_pct > 0:
-        ai_messages.append(f"Scenario applied: yield improved by {sc.get('yield_improve_pct',0.0):.0f}% (proxy).")
+def _node_waste_carbon(data, carbon_factors):
+    co2e_waste, breakdown = _waste_emissions_kgco2e(data.waste, carbon_factors)
+    return {"co2e_waste": co2e_waste, "breakdown": breakdown}
 
-    # --- Energy ---
-    energy_df = data["energy_site"]
-    elec_kwh, gas_kwh, has_energy = _energy_totals(energy_df)
-    orig_elec, orig_gas = elec_kwh, gas_kwh
+def _node_carbon(energy, waste_carbon, carbon_factors, scrap_reduction_pct):
+    ef_e = float(carbon_factors.get("electricity_kgco2e_per_kwh", 0.20))
+    ef_g = float(carbon_factors.get("gas_kgco2e_per_kwh", 0.18))
+    scrap = scrap_reduction_pct / 100.0
 
-    if has_energy and energy_improve_pct > 0:
-        elec_kwh *= (1.0 - energy_improve_pct)
-        gas_kwh  *= (1.0 - energy_improve_pct)
-        ai_messages.append(f"Scenario applied: energy intensity improved by {sc.get('energy_intensity_improve_pct',0.0):.0f}%.")
+    co2e_energy = (energy["elec_kwh"] * ef_e) + (energy["gas_kwh"] * ef_g)
+    co2e_waste = waste_carbon["co2e_waste"]
+    # Apply scrap reduction to waste CO2e (simple proportional MVP)
+    co2e_waste_scn = co2e_waste * (1.0 - scrap)
+
+    avoided_energy_co2e = ((energy["orig_elec"] - energy["elec_kwh"]) * ef_e) + ((energy["orig_gas"] - energy["gas_kwh"]) * ef_g)
+    avoided_waste_co2e = co2e_waste * scrap
+    return {
+        "co2e_energy": co2e_energy,
+        "co2e_waste_scn": co2e_waste_scn,
+        "co2e_total": co2e_energy + co2e_waste_scn,
+        "co2e_avoided": max(avoided_energy_co2e + avoided_waste_co2e, 0.0),
+    }
+
+def _node_bottlenecks(blocks, inputs, unit_mass):
+    # production reported by mass counts as mass / unit mass units
+    units = inputs["qty"] + (inputs["qty_kg"] / unit_mass if unit_mass > 0 else 0.0)
+    return compute_bottlenecks(blocks, total_units_required=units)
+
+def _node_flows(blocks, boundary_start, boundary_end, mass_balance):
+    mb = mass_balance
+    net = build_network(blocks, boundary_end)
+    node_in = solve_network(net, mb["mat_in"])
+    flows = network_flows(net, node_in, boundary_start, boundary_end, mb["mat_in"], mb["prod_mass_out"])
+
+    rows = [{"from": "All processes", "to": "Waste streams", "kg": mb["waste_out_scn"], "kind": "waste_out"}]
+    if mb["unaccounted"] > 0:
+        rows.append({"from": "All processes", "to": "Unaccounted losses", "kg": mb["unaccounted"], "kind": "loss_unaccounted"})
+    return {"table": pd.concat([flows, pd.DataFrame(rows)], ignore_index=True), "notes": net["notes"]}
+
+RESULT_NODES = NodeGraph({
+    "inputs": (_node_inputs, ("data",)),
+    "products": (_node_products, ("data", "product_master")),
+    "mass_balance": (_node_mass_balance, ("inputs", "products", "unit_mass", "scrap_reduction_pct", "yield_improve_pct")),
+    "energy": (_node_energy, ("data", "energy_intensity_improve_pct")),
+    "energy_alloc": (_node_energy_alloc, ("energy", "blocks", "allocate_energy")),
+    "waste_profile": (_node_waste_profile, ("data",)),
+    "circularity": (_node_circularity, ("waste_profile", "mass_balance", "scrap_reduction_pct")),
+    "waste_carbon": (_node_waste_carbon, ("data", "carbon_factors")),
+    "carbon": (_node_carbon, ("energy", "waste_carbon", "carbon_factors", "scrap_reduction_pct")),
+    "bottlenecks": (_node_bottlenecks, ("blocks", "inputs", "unit_mass")),
+    "flows": (_node_flows, ("blocks", "boundary_start", "boundary_end", "mass_balance")),
+})
+
+def compute_balances(model, profile=False, nodes=None):
+    """
+    `profile=True` adds results["profile"]: per-stage wall time, rows and memory (see mfm.profiling);
+    profile="time" skips the (slower) memory tracing.
+
+    `nodes` is an optional LRUCache of RESULT_NODES outputs shared between calls: only nodes whose
+    inputs changed since an earlier call are recomputed (listed in results["recomputed"]).
+    """
+    prof = StageProfiler(memory=profile != "time") if profile else NULL_PROFILER
+    with prof:
+        return _balances(model, prof, nodes)
+
+def _balances(model, prof, nodes):
+    raw = model["data"]
+    prof.stage("resolve", sum(len(df) for df in raw.values() if hasattr(df, "__len__")) if isinstance(raw, dict) else None)
+    data = resolve_bundle(model["data"])
+    blocks = model["blocks"]
+    sc = model["scenarios"]
+    factors = model.get("carbon_factors", {})
+    unit_mass = float(model.get("unit_mass_kg_per_unit", 7.0))
+    waste = data.waste
+
+    leaves = {
+        "data": data,
+        "blocks": blocks,
+        "unit_mass": unit_mass,
+        "product_master": model.get("product_master"),
+        "carbon_factors": factors,
+        "boundary_start": model["boundary_start"],
+        "boundary_end": model["boundary_end"],
+        "scrap_reduction_pct": float(sc.get("scrap_reduction_pct", 0.0)),
+        "yield_improve_pct": float(sc.get("yield_improve_pct", 0.0)),
+        "energy_intensity_improve_pct": float(sc.get("energy_intensity_improve_pct", 0.0)),
+        "allocate_energy": bool(sc.get("allocate_energy", False)),
+    }
+    rows = {
+        "inputs": _rows(data.material.kg) + _rows(waste.kg) + _rows(data.production.qty),
+        "products": _rows(data.production.product_labels),
+        "energy": _rows(data.energy.elec_kwh),
+        "waste_profile": _rows(waste.kg),
+        "waste_carbon": _rows(waste.route_labels),
+        "bottlenecks": len(blocks),
+        "flows": len(blocks),
+    }
+    out, recomputed = RESULT_NODES.evaluate(leaves, cache=nodes, profiler=prof, rows=rows)
+    inputs, products, mb, energy, carbon = out["inputs"], out["products"], out["mass_balance"], out["energy"], out["carbon"]
+
+    # Messages are assembled here, in a fixed order, from whichever node outputs are current
+    prof.stage("kpis")
+    ai_messages = []
+    assumptions = []
+    if inputs["mat_in"] is None:
+        assumptions.append("Material input mass missing; treated as 0 kg.")
+    if inputs["waste_out"] is None:
+        assumptions.append("Waste mass missing; treated as 0 kg.")
+    assumptions.extend(products["notes"])
+    if products["unknown_qty"] > 0 or products["table"] is None:
+        assumptions.append(f"Converted output to mass using unit mass = {unit_mass:.2f} kg/unit.")
+    assumptions.extend(data.conversions)
 
-    allocate_energy = sc.get("allocate_energy", False)
-    energy_alloc = None
-    if has_energy:
+    if leaves["scrap_reduction_pct"] > 0:
+        ai_messages.append(f"Scenario applied: waste reduced by {sc.get('scrap_reduction_pct',0.0):.0f}%.")
+    if leaves["yield_improve_pct"] > 0:
+        ai_messages.append(f"Scenario applied: yield improved by {sc.get('yield_improve_pct',0.0):.0f}% (proxy).")
+    if energy["has_energy"]:
+        if leaves["energy_intensity_improve_pct"] > 0:
+            ai_messages.append(f"Scenario applied: energy intensity improved by {sc.get('energy_intensity_improve_pct',0.0):.0f}%.")
         assumptions.append("Energy is site-level; process allocation is optional and uses a simple proxy.")
-        if allocate_energy:
-            # proxy: equal weights (simple + stable), unless you want to use yields
-            weights = np.ones(len(blocks), dtype=float)
-            weights = weights / weights.sum() if weights.sum() > 0 else weights
-            energy_alloc = pd.DataFrame({
-                "Process": [b["user_label"] for b in blocks],
-                "Electricity_kWh": (elec_kwh * weights).round(0).astype(int),
-                "Gas_kWh": (gas_kwh * weights).round(0).astype(int),
-            })
+        if leaves["allocate_energy"]:
             ai_messages.append("AI assist: allocated site energy to processes using a simple proxy (editable assumption).")
 
-    # --- Mass balance sanity ---
+    mat_in, prod_mass_out, waste_out_scn, unaccounted = mb["mat_in"], mb["prod_mass_out"], mb["waste_out_scn"], mb["unaccounted"]
     if mat_in > 0 and prod_mass_out > mat_in * 1.02:
         ai_messages.append(
             "Sanity check: product mass exceeds material input. "
             "Check 'kg per unit' (pcs→kg conversion) or material input data."
         )
-
-    unaccounted = max(mat_in - prod_mass_out - waste_out_scn, 0.0)
-
     if unaccounted > 0:
         ai_messages.append(f"Detected ~{unaccounted:,.0f} kg unaccounted material (likely offcuts/rejects).")
         assumptions.append("Unaccounted mass treated as process loss (demo).")
-
-    # --- Circularity ---
-    waste_by_type = _waste_by_type(waste_df)
-
-    route_col = _find_col(waste_df, ["route", "disposal"])
-    diverted_kg = 0.0
-    if route_col:
-        kg_col = _find_col(waste_df, ["kg", "quantity"])
-        tmp = waste_df.copy()
-        tmp[kg_col] = tmp[kg_col].astype(float)
-        r = tmp[route_col].astype(str).str.lower().str.strip()
-        diverted_kg = float(tmp[r.str.contains("recycl|reuse|recycle", regex=True)][kg_col].sum())
-    else:
+    if out["waste_profile"]["diverted_kg"] is None:
         assumptions.append("No disposal route column detected; diversion % may be incomplete.")
-
-    diverted_kg_scn = diverted_kg * (1.0 - scrap_reduction_pct)
-    diversion_pct = (diverted_kg_scn / waste_out_scn * 100.0) if waste_out_scn > 0 else 0.0
-
-    opportunities = []
-    if not waste_by_type.empty:
-        steel = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("steel|metal|scrap", regex=True)]
-        if not steel.empty and float(steel["Quantity (kg)"].sum()) > 500:
-            opportunities.append("High clean metal scrap: consider closed-loop recycling with supplier or local reprocessor.")
-        mixed = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("mixed", regex=True)]
-        if not mixed.empty and float(mixed["Quantity (kg)"].sum()) > 300:
-            opportunities.append("Mixed waste is significant: segregation could increase recycling rate and reduce disposal cost.")
-        sludge = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("sludge|haz", regex=True)]
-        if not sludge.empty and float(sludge["Quantity (kg)"].sum()) > 100:
-            opportunities.append("Hazardous/sludge stream: review upstream controls and chemical use to reduce generation.")
-
-    # --- Carbon ---
-    factors = model.get("carbon_factors", {})
-    ef_e = float(factors.get("electricity_kgco2e_per_kwh", 0.20))
-    ef_g = float(factors.get("gas_kgco2e_per_kwh", 0.18))
-
-    co2e_energy = (elec_kwh * ef_e) + (gas_kwh * ef_g)
-    co2e_waste, co2e_waste_breakdown = _waste_emissions_kgco2e(waste_df, factors)
-    # Apply scrap reduction to waste CO2e (simple proportional MVP)
-    co2e_waste_scn = co2e_waste * (1.0 - scrap_reduction_pct)
-    co2e_total = co2e_energy + co2e_waste_scn
-
-    avoided_energy_co2e = ((orig_elec - elec_kwh) * ef_e) + ((orig_gas - gas_kwh) * ef_g)
-    avoided_waste_co2e = co2e_waste * scrap_reduction_pct
-    co2e_avoided = max(avoided_energy_co2e + avoided_waste_co2e, 0.0)
-
-    if co2e_avoided > 0:
-        ai_messages.append(f"Estimated CO₂e avoided (scenario): ~{co2e_avoided:,.0f} kgCO₂e.")
-
-    # --- Bottlenecks ---
-    bottlenecks = compute_bottlenecks(blocks, total_units_required=qty)
-
-    # --- Flows for Sankey ---
-    rows = []
-    start = model["boundary_start"]
-    end = model["boundary_end"]
-
-    # Input to first block
-    rows.append({"from": start, "to": blocks[0]["user_label"], "kg": mat_in, "kind": "material_in"})
-
-    # A simple yield cascade through blocks (better-looking Sankey)
-    stage_mass = mat_in
-    for i in range(len(blocks) - 1):
-        y = float(blocks[i].get("yield_pct", 92)) / 100.0
-        next_mass = stage_mass * y
-        rows.append({"from": blocks[i]["user_label"], "to": blocks[i+1]["user_label"], "kg": max(next_mass, 0.0), "kind": "throughput"})
-
-        loss_here = max(stage_mass - next_mass, 0.0)
-        if loss_here > 0:
-            rows.append({"from": blocks[i]["user_label"], "to": f"{blocks[i]['user_label']} losses", "kg": loss_here, "kind": "stage_loss"})
-        stage_mass = next_mass
-
-    # Outputs
-    rows.append({"from": blocks[-1]["user_label"], "to": end, "kg": prod_mass_out, "kind": "product_out"})
-    rows.append({"from": "All processes", "to": "Waste streams", "kg": waste_out_scn, "kind": "waste_out"})
-    if unaccounted > 0:
-        rows.append({"from": "All processes", "to": "Unaccounted losses", "kg": unaccounted, "kind": "loss_unaccounted"})
-
-    flows_table = pd.DataFrame(rows)
+    if carbon["co2e_avoided"] > 0:
+        ai_messages.append(f"Estimated CO₂e avoided (scenario): ~{carbon['co2e_avoided']:,.0f} kgCO₂e.")
+    assumptions.extend(out["flows"]["notes"])
 
     # KPIs
+    elec_kwh, gas_kwh = energy["elec_kwh"], energy["gas_kwh"]
     material_eff = (prod_mass_out / mat_in) * 100.0 if mat_in > 0 else 0.0
     waste_intensity = (waste_out_scn / prod_mass_out) if prod_mass_out > 0 else 0.0
     energy_intensity = ((elec_kwh + gas_kwh) / prod_mass_out) if prod_mass_out > 0 else 0.0
@@ -282,30 +337,53 @@ def compute_balances(model):
         "energy_elec_kwh": elec_kwh,
         "energy_gas_kwh": gas_kwh,
         "energy_intensity_kwh_per_kg": energy_intensity,
-        "energy_alloc_table": energy_alloc,
+        "energy_alloc_table": out["energy_alloc"],
 
-        "waste_by_type": waste_by_type,
-        "diversion_pct": diversion_pct,
-        "diverted_kg": diverted_kg_scn,
-        "opportunities": opportunities,
+        "waste_by_type": out["waste_profile"]["waste_by_type"],
+        "diversion_pct": out["circularity"]["diversion_pct"],
+        "diverted_kg": out["circularity"]["diverted_kg"],
+        "opportunities": list(out["waste_profile"]["opportunities"]),
 
-        "co2e_energy_kg": co2e_energy,
-        "co2e_waste_kg": co2e_waste_scn,
-        "co2e_total_kg": co2e_total,
-        "co2e_avoided_kg": co2e_avoided,
-        "co2e_waste_breakdown": co2e_waste_breakdown,
+        "co2e_energy_kg": carbon["co2e_energy"],
+        "co2e_waste_kg": carbon["co2e_waste_scn"],
+        "co2e_total_kg": carbon["co2e_total"],
+        "co2e_avoided_kg": carbon["co2e_avoided"],
+        "co2e_waste_breakdown": out["waste_carbon"]["breakdown"],
 
-        "bottlenecks_table": bottlenecks,
+        "bottlenecks_table": out["bottlenecks"],
+        "products_table": products["table"],
+        "unknown_products": products["unknown"],
 
         "ai_messages": ai_messages,
         "assumptions": assumptions,
-        "flows_table": flows_table,
+        "flows_table": out["flows"]["table"],
         "blocks": blocks,
-        "boundary_start": start,
-        "boundary_end": end,
+        "boundary_start": model["boundary_start"],
+        "boundary_end": model["boundary_end"],
+        "recomputed": recomputed,
+        "profile": prof.finish(),
     }
 
-def build_sankey_inputs(results):
+
+KPI_FIELDS = [
+    "mat_in_kg", "prod_out_kg", "waste_out_kg", "unaccounted_kg", "material_eff_pct", "waste_intensity",
+    "energy_elec_kwh", "energy_gas_kwh", "energy_intensity_kwh_per_kg", "diversion_pct", "diverted_kg",
+    "co2e_energy_kg", "co2e_waste_kg", "co2e_total_kg", "co2e_avoided_kg",
+]
+
+def kpi_summary(results):
+    """Flat dict of the scalar KPIs plus the most constrained process."""
+    out = {k: float(results[k]) for k in KPI_FIELDS}
+    bdf = results.get("bottlenecks_table")
+    top = bdf.iloc[0] if isinstance(bdf, pd.DataFrame) and not bdf.empty else None
+    out["top_bottleneck"] = top["Process"] if top is not None else None
+    out["top_utilisation"] = float(top["Utilisation"]) if top is not None else np.nan
+    return out
+
+def build_sankey_inputs(results, lod=None):
+    """Sankey payload of the flows table; `lod` (dict of sankey_lod options) bounds its size."""
+    if lod is not None:
+        return sankey_lod(results["flows_table"], **lod)
     flows = results["flows_table"].copy()
     labels = pd.unique(pd.concat([flows["from"], flows["to"]], ignore_index=True)).tolist()
     idx = {lab: i for i, lab in enumerate(labels)}
@@ -315,3 +393,184 @@ def build_sankey_inputs(results):
     values = flows["kg"].astype(float).tolist()
 
     return {"labels": labels, "sources": sources, "targets": targets, "values": values}
+
+SWEEP_KPIS = ["prod_out_kg", "waste_out_kg", "unaccounted_kg", "material_eff_pct", "co2e_total_kg", "co2e_avoided_kg"]
+
+def _base_aggregates(model):
+    """Scenario-independent totals that compute_balances derives from the data bundle."""
+    data = resolve_bundle(model["data"])
+    factors = model.get("carbon_factors", {})
+
+    elec, gas, _ = _energy_totals(data.energy)
+    co2e_waste, _ = _waste_emissions_kgco2e(data.waste, factors)
+    products = product_masses(data.production, model.get("product_master"))
+    # mass known without the scalar unit mass: master products plus rows reported by mass
+    fixed_kg = products["known_kg"] + data.production.total_kg
+
+    return {
+        "mat_in_kg": _sum_material_in_kg(data.material) or 0.0,
+        "waste_kg": _sum_waste_kg(data.waste) or 0.0,
+        "prod_mass_kg": products["unknown_qty"] * float(model.get("unit_mass_kg_per_unit", 7.0)) + fixed_kg,
+        "unknown_qty": products["unknown_qty"],
+        "fixed_kg": fixed_kg,
+        "elec_kwh": elec,
+        "gas_kwh": gas,
+        "co2e_waste_kg": co2e_waste,
+        "ef_e": float(factors.get("electricity_kgco2e_per_kwh", 0.20)),
+        "ef_g": float(factors.get("gas_kgco2e_per_kwh", 0.18)),
+    }
+
+def sweep_scenarios(model, scrap_reduction_pct=0.0, yield_improve_pct=0.0, energy_intensity_improve_pct=0.0, grid=True):
+    """
+    Evaluate the scenario KPIs of compute_balances for many scenario values in one NumPy pass.
+
+    With grid=True every combination of the three value arrays is evaluated (cartesian product);
+    otherwise the arrays are broadcast element-wise. Returns a DataFrame with one row per scenario.
+    """
+    base = _base_aggregates(model)
+
+    s, y, e = (np.atleast_1d(np.asarray(v, dtype=float)) for v in
+               (scrap_reduction_pct, yield_improve_pct, energy_intensity_improve_pct))
+    if grid:
+        s, y, e = (a.ravel() for a in np.meshgrid(s, y, e, indexing="ij"))
+    else:
+        s, y, e = np.broadcast_arrays(s, y, e)
+
+    sf, yf, ef = s / 100.0, y / 100.0, np.where(e > 0, e, 0.0) / 100.0
+
+    mat_in = base["mat_in_kg"]
+    prod = base["prod_mass_kg"] * (1.0 + yf)
+    waste = base["waste_kg"] * (1.0 - sf)
+    unaccounted = np.maximum(mat_in - prod - waste, 0.0)
+    eff = prod / mat_in * 100.0 if mat_in > 0 else np.zeros_like(prod)
+
+    energy_co2e = base["elec_kwh"] * base["ef_e"] + base["gas_kwh"] * base["ef_g"]
+    co2e_total = energy_co2e * (1.0 - ef) + base["co2e_waste_kg"] * (1.0 - sf)
+    co2e_avoided = np.maximum(energy_co2e * ef + base["co2e_waste_kg"] * sf, 0.0)
+
+    return pd.DataFrame({
+        "scrap_reduction_pct": s,
+        "yield_improve_pct": y,
+        "energy_intensity_improve_pct": e,
+        "prod_out_kg": prod,
+        "waste_out_kg": waste,
+        "unaccounted_kg": unaccounted,
+        "material_eff_pct": eff,
+        "co2e_total_kg": co2e_total,
+        "co2e_avoided_kg": co2e_avoided,
+    })
+
+# Trend granularity labels -> pandas period frequencies
+TIMESERIES_FREQS = {"Week": "W", "Month": "M", "Quarter": "Q"}
+
+def _period_totals(dates, gran, values, freq):
+    """
+    Sum columns of `values` per period (indexed by period ordinal); monthly rows are spread evenly
+    over their days for weekly output. Only unique dates are converted to periods.
+    """
+    df = pd.DataFrame(values)
+    d = pd.DatetimeIndex(dates)
+    ok = ~d.isna()
+    df, d = df[ok], d[ok]
+    if gran == "M" and freq == "W" and len(d):
+        days = d.days_in_month.to_numpy()
+        rep = np.repeat(np.arange(len(d)), days)
+        offset = np.arange(len(rep)) - np.repeat(np.cumsum(days) - days, days)
+        df = df.iloc[rep].div(days[rep], axis=0)
+        d = d[rep] + pd.to_timedelta(offset, unit="D")
+    codes, uniq = pd.factorize(d)
+    ordinals, inverse = np.unique(pd.DatetimeIndex(uniq).to_period(freq).asi8[codes], return_inverse=True)
+    return pd.DataFrame({c: np.bincount(inverse, weights=df[c].to_numpy(dtype=float), minlength=len(ordinals))
+                         for c in df.columns}, index=ordinals)
+
+def _production_values(prod, master):
+    """Per-row "qty" (units taking the scalar unit mass) and, where any, "prod_kg" (mass known per row)."""
+    qty = np.nan_to_num(prod.qty)
+    vals = {"qty": qty}
+    if prod.kg is not None:
+        vals["prod_kg"] = np.nan_to_num(prod.kg)
+    row_mass = row_unit_masses(prod, master)
+    if row_mass is not None:
+        known = ~np.isnan(row_mass)
+        vals["prod_kg"] = vals.get("prod_kg", 0.0) + np.where(known, qty * np.nan_to_num(row_mass), 0.0)
+        vals["qty"] = np.where(known, 0.0, qty)
+    return vals
+
+def compute_timeseries(model, freq="M"):
+    """
+    Per-period material, energy, waste and carbon KPIs (scenarios applied), on the union of the
+    periods found in the datasets. Datasets without a period column are allocated to periods by
+    production volume. `freq` is a pandas period frequency ("W", "M", "Q") or a TIMESERIES_FREQS label.
+    """
+    data = resolve_bundle(model["data"])
+    sc = model["scenarios"]
+    factors = model.get("carbon_factors", {})
+    freq = TIMESERIES_FREQS.get(freq, freq)
+    assumptions = list(data.notes) + list(data.conversions)
+
+    prod, mat, energy, waste = data.production, data.material, data.energy, data.waste
+    if prod.dates is None or prod.qty is None:
+        return {"timeseries": pd.DataFrame(), "assumptions": assumptions + ["No dated production records; time series unavailable."]}
+
+    ef_route = np.array([float(factors.get(k, d)) for k, d in _ROUTE_FACTORS])
+    waste_vals = {}
+    if waste.kg is not None:
+        kg = np.nan_to_num(waste.kg)
+        waste_vals["waste_kg"] = kg
+        if waste.route_codes is not None:
+            waste_vals["waste_co2e"] = kg * ef_route[waste.route_class][waste.route_codes]
+            waste_vals["diverted_kg"] = kg * waste.route_diverted[waste.route_codes]
+
+    sources = [
+        ("Production", prod, _production_values(prod, model.get("product_master"))),
+        ("Material purchases", mat, {"mat_kg": np.nan_to_num(mat.kg)} if mat.kg is not None else {}),
+        ("Energy", energy, {k: np.nan_to_num(v) for k, v in (("elec", energy.elec_kwh), ("gas", energy.gas_kwh)) if v is not None}),
+        ("Waste", waste, waste_vals),
+    ]
+    dated, undated = [], []
+    for label, view, vals in sources:
+        if not vals:
+            continue
+        if view.dates is not None:
+            dated.append(_period_totals(view.dates, view.date_gran, vals, freq))
+        else:
+            undated.append((label, vals))
+
+    ts = pd.concat(dated, axis=1).groupby(level=0).sum().sort_index()
+    volume = ts["qty"] * float(model.get("unit_mass_kg_per_unit", 7.0)) + ts["prod_kg"] if "prod_kg" in ts else ts["qty"]
+    share = volume / volume.sum() if volume.sum() > 0 else volume * 0.0
+    for label, vals in undated:
+        for k, v in vals.items():
+            ts[k] = share * float(np.sum(v))
+        assumptions.append(f"{label} has no period column; allocated to periods by production volume.")
+    ts = ts.reindex(columns=["qty", "prod_kg", "mat_kg", "elec", "gas", "waste_kg", "waste_co2e", "diverted_kg"]).fillna(0.0)
+
+    s = sc.get("scrap_reduction_pct", 0.0) / 100.0
+    y = sc.get("yield_improve_pct", 0.0) / 100.0
+    e = max(sc.get("energy_intensity_improve_pct", 0.0), 0.0) / 100.0
+    ef_e = float(factors.get("electricity_kgco2e_per_kwh", 0.20))
+    ef_g = float(factors.get("gas_kgco2e_per_kwh", 0.18))
+
+    prod_kg = (ts["qty"] * float(model.get("unit_mass_kg_per_unit", 7.0)) + ts["prod_kg"]) * (1.0 + y)
+    waste_kg = ts["waste_kg"] * (1.0 - s)
+    elec, gas = ts["elec"] * (1.0 - e), ts["gas"] * (1.0 - e)
+    co2e_energy = elec * ef_e + gas * ef_g
+    co2e_waste = ts["waste_co2e"] * (1.0 - s)
+
+    out = pd.DataFrame({
+        "mat_in_kg": ts["mat_kg"],
+        "prod_out_kg": prod_kg,
+        "waste_out_kg": waste_kg,
+        "unaccounted_kg": (ts["mat_kg"] - prod_kg - waste_kg).clip(lower=0.0),
+        "material_eff_pct": (prod_kg / ts["mat_kg"] * 100.0).where(ts["mat_kg"] > 0),
+        "waste_intensity": (waste_kg / prod_kg).where(prod_kg > 0),
+        "energy_elec_kwh": elec,
+        "energy_gas_kwh": gas,
+        "energy_intensity_kwh_per_kg": ((elec + gas) / prod_kg).where(prod_kg > 0),
+        "diversion_pct": (ts["diverted_kg"] / ts["waste_kg"] * 100.0).where(ts["waste_kg"] > 0),
+        "co2e_energy_kg": co2e_energy,
+        "co2e_waste_kg": co2e_waste,
+        "co2e_total_kg": co2e_energy + co2e_waste,
+    })
+    out.index = pd.PeriodIndex.from_ordinals(out.index.to_numpy(dtype="int64"), freq=freq, name="period")
+    return {"timeseries": out, "assumptions": assumptions}
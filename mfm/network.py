@@ -0,0 +1,154 @@
+"""
+Process network: blocks are nodes with a yield, optional `routes` are weighted edges.
+
+A block may carry `routes = [{"to": <block label or end gate>, "fraction": 0.8}, ...]` splitting
+its good output; any unrouted remainder leaves through the end gate. Blocks without routes pass
+their output to the next block (the last one to the end gate), so without any routes the blocks
+form the classic linear chain. `input_share` sets the fraction of material input entering at a
+block (default: all of it at the first block).
+
+Steady-state inflows x solve (I - A) x = b, with A[i, j] = yield_j * fraction_{j->i}, so
+splits, merges and rework loops are all handled by one sparse solve.
+"""
+import numpy as np
+import pandas as pd
+
+DIRECT_SOLVE_MAX_NODES = 1000
+
+def parse_routes(text):
+    """'Welding: 0.9; Inspection: 0.1' -> [{"to": "Welding", "fraction": 0.9}, ...]"""
+    routes = []
+    for part in (text or "").split(";"):
+        if not part.strip():
+            continue
+        to, _, frac = part.rpartition(":")
+        if not to:
+            to, frac = frac, "1"
+        routes.append({"to": to.strip(), "fraction": float(frac)})
+    return routes
+
+def format_routes(routes):
+    return "; ".join(f"{r['to']}: {float(r.get('fraction', 1.0)):g}" for r in routes or [])
+
+def build_network(blocks, boundary_end):
+    labels = [b["user_label"] for b in blocks]
+    n = len(blocks)
+    idx = {lab: i for i, lab in enumerate(labels)}
+    yields = np.array([float(b.get("yield_pct", 92)) / 100.0 for b in blocks])
+    explicit = any(b.get("routes") for b in blocks)
+    notes = []
+
+    share = np.array([float(b.get("input_share", 0.0)) for b in blocks])
+    if share.sum() <= 0:
+        share = np.zeros(n)
+        share[0] = 1.0
+    else:
+        share = share / share.sum()
+
+    exit_frac = np.zeros(n)
+    if not explicit:
+        src = np.arange(n - 1)
+        dst = src + 1
+        frac = np.ones(n - 1)
+        exit_frac[-1] = 1.0
+        # the last block's output is measured production, which closes the balance
+        yields[-1] = 1.0
+    else:
+        src, dst, frac = [], [], []
+        for j, b in enumerate(blocks):
+            if not b.get("routes"):
+                if j + 1 < n:
+                    src.append(j); dst.append(j + 1); frac.append(1.0)
+                else:
+                    exit_frac[j] = 1.0
+                continue
+            routes = [r for r in b.get("routes") or [] if float(r.get("fraction", 1.0)) > 0]
+            total = sum(float(r.get("fraction", 1.0)) for r in routes)
+            scale = 1.0 / total if total > 1.0 else 1.0
+            if total > 1.0 + 1e-9:
+                notes.append(f"Routing fractions from '{labels[j]}' sum to {total:.2f}; normalised to 1.")
+            for r in routes:
+                f = float(r.get("fraction", 1.0)) * scale
+                to = r["to"]
+                if to in idx:
+                    src.append(j); dst.append(idx[to]); frac.append(f)
+                else:
+                    if to != boundary_end:
+                        notes.append(f"Route target '{to}' from '{labels[j]}' is not a block; treated as leaving via the end gate.")
+                    exit_frac[j] += f
+            exit_frac[j] += max(1.0 - total * scale, 0.0)
+        src, dst, frac = np.asarray(src, dtype=int), np.asarray(dst, dtype=int), np.asarray(frac, dtype=float)
+        for j in np.flatnonzero(~_reached(n, src, dst, share > 0)):
+            notes.append(f"'{labels[j]}' receives no material: no input enters there and no route leads to it.")
+
+    return {
+        "labels": labels, "yields": yields, "src": src, "dst": dst, "frac": frac,
+        "exit_frac": exit_frac, "input_share": share, "linear": not explicit, "notes": notes,
+    }
+
+def _reached(n, src, dst, start):
+    """Nodes reachable along the edges from the `start` mask."""
+    order = np.argsort(src, kind="stable")
+    bounds = np.searchsorted(src[order], np.arange(n + 1))
+    seen = start.copy()
+    stack = list(np.flatnonzero(seen))
+    while stack:
+        j = stack.pop()
+        for k in dst[order[bounds[j]:bounds[j + 1]]]:
+            if not seen[k]:
+                seen[k] = True
+                stack.append(k)
+    return seen
+
+def solve_network(net, mat_in):
+    """Steady-state inflow (kg) to every node."""
+    n = len(net["labels"])
+    if net["linear"]:
+        return np.cumprod(np.concatenate([[mat_in], net["yields"][:-1]]))
+    import scipy.sparse as sp  # only routed networks need the sparse solvers
+    from scipy.sparse.linalg import lgmres, spsolve
+
+    a = sp.csc_matrix((net["yields"][net["src"]] * net["frac"], (net["dst"], net["src"])), shape=(n, n))
+    m = (sp.identity(n, format="csc") - a).tocsc()
+    b = net["input_share"] * mat_in
+    x, info = None, 1
+    if n > DIRECT_SOLVE_MAX_NODES:
+        # large, loopy networks fill in badly under LU; a Krylov solve is far cheaper
+        x, info = lgmres(m, b, rtol=1e-12, atol=0.0, maxiter=1000)
+    if info != 0:
+        x = spsolve(m, b)
+    x = np.atleast_1d(x)
+    if not np.all(np.isfinite(x)):
+        raise ValueError("Process network has a closed loop with no losses or exit; flows cannot be balanced.")
+    return x
+
+def network_flows(net, x, boundary_start, boundary_end, mat_in, prod_mass_out):
+    """Flow rows (from, to, kg, kind) of the solved network, grouped per node in block order."""
+    labels = np.asarray(net["labels"], dtype=object)
+    y = net["yields"]
+    n = len(labels)
+
+    inputs = pd.DataFrame({"from": boundary_start, "to": labels, "kg": mat_in * net["input_share"],
+                           "kind": "material_in", "_node": -1, "_ord": 0})
+    inputs = inputs[net["input_share"] > 0]
+
+    edges = pd.DataFrame({"from": labels[net["src"]], "to": labels[net["dst"]],
+                          "kg": np.maximum(y[net["src"]] * net["frac"] * x[net["src"]], 0.0),
+                          "kind": "throughput", "_node": net["src"], "_ord": 0})
+
+    loss = np.maximum(x - y * x, 0.0)
+    keep = loss > 0
+    losses = pd.DataFrame({"from": labels[keep], "to": [f"{lab} losses" for lab in labels[keep]], "kg": loss[keep],
+                           "kind": "stage_loss", "_node": np.flatnonzero(keep), "_ord": 1})
+
+    # measured product mass leaves through the exit nodes, in proportion to their modelled exit flow
+    exits = y * net["exit_frac"] * x
+    w = exits if exits.sum() > 0 else net["exit_frac"]
+    w = w / w.sum() if w.sum() > 0 else w
+    out = w > 0
+    products = pd.DataFrame({"from": labels[out], "to": boundary_end, "kg": prod_mass_out * w[out],
+                             "kind": "product_out", "_node": n, "_ord": 0})
+
+    flows = pd.concat([inputs, edges, losses, products], ignore_index=True)
+    flows = flows.sort_values(["_node", "_ord"], kind="stable", ignore_index=True)
+    return flows.drop(columns=["_node", "_ord"])
@@ -0,0 +1,60 @@
+"""
+Dependency-tracked result nodes.
+
+A NodeGraph is a list of named nodes, each a function of named inputs: values the caller supplies
+("leaves") or the outputs of earlier nodes. A node's key hashes its name with the keys of its
+inputs (leaves are fingerprinted, nodes pass on their own key), so given a node cache a node runs
+only when something it reads has changed and every other output is reused from an earlier run.
+"""
+import hashlib
+
+from .cache import fingerprint
+from .profiling import NULL_PROFILER
+
+_MISSING = object()
+
+class NodeGraph:
+    def __init__(self, nodes):
+        """`nodes`: name -> (function, input names), each node after the nodes it reads."""
+        self.nodes = dict(nodes)
+        names = list(self.nodes)
+        for i, (name, (_, inputs)) in enumerate(self.nodes.items()):
+            later = [x for x in inputs if x in names[i:]]
+            if later:
+                raise ValueError(f"Node {name!r} reads {', '.join(later)} before it is computed.")
+        self.leaves = sorted({x for _, inputs in self.nodes.values() for x in inputs} - set(names))
+
+    def inputs_of(self, name):
+        """Leaf inputs `name` depends on, directly or through other nodes."""
+        out, todo = set(), [name]
+        while todo:
+            for x in self.nodes[todo.pop()][1]:
+                if x in self.nodes:
+                    todo.append(x)
+                else:
+                    out.add(x)
+        return sorted(out)
+
+    def evaluate(self, leaves, cache=None, profiler=NULL_PROFILER, rows=None):
+        """
+        Outputs of every node for these leaf values, as (outputs by node name, names of the nodes
+        that ran). With `cache` (an LRUCache) unchanged nodes are reused; without, all nodes run.
+        `rows` optionally gives the profiler a row count per node.
+        """
+        rows = rows or {}
+        keys = {x: fingerprint(leaves[x]) for x in self.leaves} if cache is not None else None
+        out, ran = {}, []
+        for name, (fn, inputs) in self.nodes.items():
+            if keys is not None:
+                keys[name] = hashlib.blake2b("|".join([name, *(keys[x] for x in inputs)]).encode(),
+                                             digest_size=16).hexdigest()
+                hit = cache.get(keys[name], _MISSING)
+                if hit is not _MISSING:
+                    out[name] = hit
+                    continue
+            profiler.stage(name, rows.get(name))
+            out[name] = fn(*[out[x] if x in self.nodes else leaves[x] for x in inputs])
+            ran.append(name)
+            if keys is not None:
+                cache.put(keys[name], out[name])
+        return out, ran
@@ -0,0 +1,140 @@
+"""
+Vector Sankey for PDF reports, drawn from a build_sankey_inputs payload with ReportLab paths
+(no browser or rasterizer involved).
+
+Layout: nodes are placed in columns by their longest path from a source (back-edges of rework
+loops are ignored for depth), stacked in a column in barycentre order of their inputs, and sized
+by the larger of their in- and outflow on one kg-to-points scale shared by all columns.
+"""
+import numpy as np
+from reportlab.lib import colors
+
+NODE_W = 9.0
+NODE_PAD = 6.0
+_LOSS_WORDS = ("loss", "waste", "other", "unaccounted")
+_COLORS = {"source": colors.HexColor("#2E7D32"), "loss": colors.HexColor("#C62828"), "node": colors.HexColor("#1565C0")}
+
+def _depths(n, src, tgt):
+    """Longest-path column per node, ignoring edges that close a cycle."""
+    out = [[] for _ in range(n)]
+    for s, t in zip(src, tgt):
+        out[s].append(t)
+    state = [0] * n  # 0 new, 1 on stack, 2 done
+    order, back = [], set()
+    for root in range(n):
+        if state[root]:
+            continue
+        stack = [(root, iter(out[root]))]
+        state[root] = 1
+        while stack:
+            v, it = stack[-1]
+            for t in it:
+                if state[t] == 1:
+                    back.add((v, t))
+                elif state[t] == 0:
+                    state[t] = 1
+                    stack.append((t, iter(out[t])))
+                    break
+            else:
+                state[v] = 2
+                order.append(v)
+                stack.pop()
+    depth = [0] * n
+    for v in reversed(order):  # topological order of the forward edges
+        for t in out[v]:
+            if (v, t) not in back:
+                depth[t] = max(depth[t], depth[v] + 1)
+    return depth
+
+def sankey_layout(sankey, width, height):
+    """Node rectangles and link bands in a top-left origin box of `width` x `height` points."""
+    labels = sankey["labels"]
+    n = len(labels)
+    src = np.asarray(sankey["sources"], dtype=int)
+    tgt = np.asarray(sankey["targets"], dtype=int)
+    val = np.asarray(sankey["values"], dtype=float)
+    keep = val > 0
+    src, tgt, val = src[keep], tgt[keep], val[keep]
+
+    v_in = np.bincount(tgt, weights=val, minlength=n)
+    v_out = np.bincount(src, weights=val, minlength=n)
+    size = np.maximum(v_in, v_out)
+    depth = np.asarray(_depths(n, src.tolist(), tgt.tolist()))
+    n_cols = int(depth.max()) + 1 if n else 0
+    col_x = np.linspace(0.0, width - NODE_W, n_cols) if n_cols > 1 else np.zeros(n_cols)
+
+    cols = [np.flatnonzero(depth == d) for d in range(n_cols)]
+    ky = min(((height - NODE_PAD * (len(c) - 1)) / size[c].sum() for c in cols if size[c].sum() > 0), default=0.0)
+    ky = max(ky, 0.0)
+
+    y0 = np.zeros(n)
+    for d, col in enumerate(cols):
+        if d > 0:
+            # order by the weighted mean height of each node's inputs, keeping ties stable
+            centre = np.full(n, np.inf)
+            w = np.bincount(tgt, weights=val * (y0[src] + size[src] * ky / 2), minlength=n)
+            centre[v_in > 0] = w[v_in > 0] / v_in[v_in > 0]
+            col = col[np.argsort(centre[col], kind="stable")]
+        heights = size[col] * ky
+        span = heights.sum() + NODE_PAD * (len(col) - 1)
+        y = max((height - span) / 2.0, 0.0)
+        for i, hgt in zip(col, heights):
+            y0[i] = y
+            y += hgt + NODE_PAD
+
+    nodes = [{"label": labels[i], "x": float(col_x[depth[i]]), "y": float(y0[i]), "h": float(size[i] * ky),
+              "role": "source" if v_in[i] == 0 else "loss" if any(w in str(labels[i]).lower() for w in _LOSS_WORDS) else "node"}
+             for i in range(n)]
+
+    # stack links on each node's side in the vertical order of the node at the other end
+    links = []
+    out_off = np.zeros(n)
+    in_off = np.zeros(n)
+    for k in np.lexsort((y0[tgt], src)):
+        links.append({"s": int(src[k]), "t": int(tgt[k]), "w": float(val[k] * ky), "value": float(val[k]),
+                      "sy": float(y0[src[k]] + out_off[src[k]])})
+        out_off[src[k]] += val[k] * ky
+    by_target = sorted(range(len(links)), key=lambda j: (links[j]["t"], y0[links[j]["s"]]))
+    for j in by_target:
+        t = links[j]["t"]
+        links[j]["ty"] = float(y0[t] + in_off[t])
+        in_off[t] += links[j]["w"]
+    return {"nodes": nodes, "links": links}
+
+def _short(s, n=22):
+    s = str(s)
+    return s if len(s) <= n else s[: n - 1] + "…"
+
+def draw_sankey(c, sankey, x, y, width, height, font_size=7):
+    """Draw the payload on canvas `c` inside the box whose top-left corner is (x, y)."""
+    label_w = 70.0
+    lay = sankey_layout(sankey, width - label_w, height)
+    nodes = lay["nodes"]
+
+    def py(v):
+        return y - v
+
+    c.saveState()
+    for ln in lay["links"]:
+        s, t = nodes[ln["s"]], nodes[ln["t"]]
+        x0, x1 = x + s["x"] + NODE_W, x + t["x"]
+        d = max((x1 - x0) / 2.0, 30.0)  # rework loops (x1 <= x0) bow out and back
+        p = c.beginPath()
+        p.moveTo(x0, py(ln["sy"]))
+        p.curveTo(x0 + d, py(ln["sy"]), x1 - d, py(ln["ty"]), x1, py(ln["ty"]))
+        p.lineTo(x1, py(ln["ty"] + ln["w"]))
+        p.curveTo(x1 - d, py(ln["ty"] + ln["w"]), x0 + d, py(ln["sy"] + ln["w"]), x0, py(ln["sy"] + ln["w"]))
+        p.close()
+        c.setFillColor(_COLORS[s["role"]], alpha=0.28)
+        c.drawPath(p, stroke=0, fill=1)
+
+    c.setFont("Helvetica", font_size)
+    for nd in nodes:
+        if nd["h"] <= 0:
+            continue
+        c.setFillColor(_COLORS[nd["role"]], alpha=1.0)
+        c.rect(x + nd["x"], py(nd["y"] + nd["h"]), NODE_W, nd["h"], stroke=0, fill=1)
+        c.setFillColor(colors.black)
+        ty = py(nd["y"] + nd["h"] / 2.0) - font_size / 3.0
+        c.drawString(x + nd["x"] + NODE_W + 2, ty, _short(nd["label"]))
+    c.restoreState()
@@ -0,0 +1,149 @@
+"""
+Product master: unit mass (and optionally material) per product code.
+
+Production logs are reduced once, when resolved (mfm.schema), to counted quantities per distinct
+product code, so applying a master is one Index.get_indexer over the SKUs rather than a join over
+the log; per-row masses (for time series) are a single gather through the row codes. Products
+missing from the master fall back to the model's unit mass and are reported.
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .cache import fingerprint
+from .schema import find_col, find_token_col
+from .units import find_unit_col, normalise
+
+def _key(code) -> str:
+    # whole-number floats are integer codes that pandas widened (a blank cell in the column)
+    if isinstance(code, (float, np.floating)) and float(code).is_integer():
+        return str(int(code))
+    return str(code).strip()
+
+def code_keys(values) -> pd.Index:
+    """Product codes as stripped strings, so 1001, 1001.0, '1001' and ' 1001 ' match."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    return pd.Index(np.array([_key(u) for u in uniques], dtype=object)[codes])
+
+@dataclass(frozen=True)
+class ProductMaster:
+    codes: pd.Index                       # unique code keys
+    unit_mass_kg: np.ndarray
+    material: Optional[np.ndarray]
+    fingerprint: str
+    notes: tuple = ()
+
+    def __len__(self):
+        return len(self.codes)
+
+def _read(path) -> pd.DataFrame:
+    # read as text so codes keep their written form; the unit mass is parsed in resolve_master
+    if str(path).lower().endswith((".xlsx", ".xlsm")):
+        return pd.read_excel(path, dtype=str)
+    return pd.read_csv(path, dtype=str)
+
+def _frame(master) -> pd.DataFrame:
+    if isinstance(master, pd.DataFrame):
+        return master
+    if isinstance(master, (str, os.PathLike)):
+        return _read(master)
+    if isinstance(master, dict) and "columns" in master:
+        return pd.DataFrame(master.get("data", []), columns=master["columns"])
+    if isinstance(master, dict):
+        # {code: unit mass} or {code: {"unit_mass_kg": ..., "material": ...}}
+        rows = [dict(v, product_code=k) if isinstance(v, dict) else {"product_code": k, "unit_mass_kg": v}
+                for k, v in master.items()]
+        return pd.DataFrame.from_records(rows)
+    return pd.DataFrame.from_records(master)
+
+def resolve_master(master) -> Optional[ProductMaster]:
+    """
+    ProductMaster from a table (DataFrame, CSV/XLSX path, records, {"columns", "data"}) with a
+    product code, a unit mass (any mass unit, see mfm.units) and optionally a material column, or
+    from a {code: unit mass} dict. Rows without a code or mass are dropped; the last of duplicate
+    codes wins. None (and an already resolved master) pass through.
+    """
+    if master is None or isinstance(master, ProductMaster):
+        return master
+    df = _frame(master)
+    code_col = find_token_col(df, ["product", "products", "sku"]) or find_token_col(df, ["code", "item", "part"])
+    if code_col is None:
+        raise ValueError("Product master has no product code column.")
+    rest = df.drop(columns=[code_col])
+    mass_col = find_col(rest, ["mass", "weight", "kg"])
+    if mass_col is None:
+        raise ValueError("Product master has no unit mass column.")
+    material_col = find_col(rest.drop(columns=[mass_col]), ["material"])
+
+    unit_col = find_unit_col(rest, (mass_col, material_col))
+    mass, conv = normalise(pd.to_numeric(df[mass_col], errors="coerce").to_numpy(dtype=float), mass_col, "mass",
+                           df[unit_col] if unit_col is not None else None, unit_col)
+    notes = [f"Product master: {c}" for c in conv]
+    keep = df[code_col].notna().to_numpy() & ~np.isnan(mass)
+    if not keep.all():
+        notes.append(f"Product master: {int((~keep).sum()):,} rows without a code or unit mass ignored.")
+    codes = code_keys(df[code_col].to_numpy()[keep])
+    last = ~codes.duplicated(keep="last")
+    if not last.all():
+        notes.append(f"Product master: {int((~last).sum()):,} duplicate product codes; the last entry is used.")
+    material = df[material_col].to_numpy(dtype=object)[keep][last] if material_col is not None else None
+    codes, mass = codes[last], mass[keep][last]
+    return ProductMaster(
+        codes=codes,
+        unit_mass_kg=mass,
+        material=material,
+        fingerprint=fingerprint(list(codes), mass, None if material is None else [str(m) for m in material]),
+        notes=tuple(notes),
+    )
+
+def lookup(labels, master):
+    """Master index per product label (-1 where unknown)."""
+    if master is None or labels is None:
+        return np.full(0 if labels is None else len(labels), -1)
+    return master.codes.get_indexer(code_keys(labels))
+
+def product_masses(production, master):
+    """
+    Apply a ProductMaster (or None) to a ResolvedProduction. Returns {"known_kg": counted units of
+    known products times their unit mass, "unknown_qty": counted units left for the scalar unit
+    mass, "table": per-product qty / unit mass / mass / material (None without a product column),
+    "unknown": unknown products by qty, descending, "notes"}.
+    """
+    labels, qty = production.product_labels, production.qty_by_product
+    total = production.total_qty
+    if master is None or labels is None or qty is None:
+        return {"known_kg": 0.0, "unknown_qty": total, "table": None, "unknown": None, "notes": []}
+
+    idx = lookup(labels, master)
+    known = idx >= 0
+    mass = np.append(master.unit_mass_kg, np.nan)[idx]  # unknown (-1) picks the trailing NaN
+    known_qty = float(qty[known].sum())
+    table = pd.DataFrame({"product": labels, "qty": qty, "unit_mass_kg": mass, "mass_kg": qty * mass})
+    if master.material is not None:
+        table["material"] = np.append(master.material, None)[idx]
+    unknown = table.loc[~known, ["product", "qty"]].sort_values("qty", ascending=False, kind="stable")
+
+    notes = list(master.notes)
+    share = 1.0 - known_qty / total if total > 0 else 0.0
+    notes.append(f"Product masses from the product master for {int(known.sum()):,} of {len(labels):,} products.")
+    if len(unknown):
+        shown = ", ".join(str(p) for p in unknown["product"].head(5))
+        notes.append(f"{len(unknown):,} products not in the product master ({share:.1%} of units, e.g. {shown}); "
+                     "their output uses the default unit mass.")
+    return {
+        "known_kg": float(np.dot(qty[known], mass[known])),
+        "unknown_qty": total - known_qty,
+        "table": table,
+        "unknown": unknown.reset_index(drop=True),
+        "notes": notes,
+    }
+
+def row_unit_masses(production, master):
+    """Master unit mass per production row (NaN for unknown products or without a master)."""
+    if master is None or production.product_codes is None:
+        return None
+    per_label = np.append(master.unit_mass_kg, np.nan)[lookup(production.product_labels, master)]
+    return per_label[production.product_codes]
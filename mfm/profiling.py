@@ -0,0 +1,90 @@
+"""
+Stage timing and memory for compute_balances.
+
+A StageProfiler is advanced stage by stage (`stage(name, rows)` ends the previous stage and starts
+the next; `finish()` ends the last) and yields a plain-dict profile record. Memory is measured
+with tracemalloc while the profiler runs: `alloc_kb` is memory still held at the end of a stage,
+`peak_kb` the stage's high-water mark above its starting point. Used as a context manager, the
+profiler stops the tracing it started on exit even if the profiled code raises. When profiling
+is off, compute_balances uses NULL_PROFILER, whose methods do nothing.
+"""
+import json
+import time
+import tracemalloc
+
+class StageProfiler:
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.spans = []
+        self._owns_trace = False
+        self._current = None
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_trace = True
+        self._t0 = time.perf_counter()
+
+    def _close(self, now):
+        name, rows, t, mem = self._current
+        span = {"stage": name, "seconds": now - t, "rows": rows}
+        if self.memory:
+            cur, peak = tracemalloc.get_traced_memory()
+            span["alloc_kb"] = (cur - mem) / 1024.0
+            span["peak_kb"] = max(peak - mem, 0) / 1024.0
+        self.spans.append(span)
+        self._current = None
+
+    def stage(self, name, rows=None):
+        now = time.perf_counter()
+        if self._current is not None:
+            self._close(now)
+        mem = 0
+        if self.memory:
+            tracemalloc.reset_peak()
+            mem = tracemalloc.get_traced_memory()[0]
+        self._current = (name, None if rows is None else int(rows), time.perf_counter(), mem)
+
+    def close(self):
+        """Stop tracemalloc if this profiler started it (idempotent)."""
+        if self._owns_trace:
+            tracemalloc.stop()
+            self._owns_trace = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def finish(self):
+        if self._current is not None:
+            self._close(time.perf_counter())
+        self.close()
+        return {
+            "total_seconds": time.perf_counter() - self._t0,
+            "memory_traced": self.memory,
+            "spans": self.spans,
+        }
+
+class _NullProfiler:
+    def stage(self, name, rows=None):
+        pass
+
+    def finish(self):
+        return None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_PROFILER = _NullProfiler()
+
+def profile_json(results, indent=2):
+    """The profile record of a compute_balances result as JSON (None if it was not profiled)."""
+    prof = results.get("profile")
+    return None if prof is None else json.dumps(prof, indent=indent)
@@ -1,17 +1,24 @@
+import os
 from io import BytesIO
 from datetime import datetime
 import pandas as pd
 
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+
+from .cache import LRUCache, fingerprint
+from .pdf_sankey import draw_sankey
+
+_pdf_cache = LRUCache(maxsize=16)
 
 def _safe_text(s: str) -> str:
     return (s or "").replace("\n", " ").strip()
 
-def build_pdf_report(site_name: str, boundary_start: str, boundary_end: str, results: dict, sankey_fig=None) -> bytes:
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
+def _results_key(results: dict) -> str:
+    return results.get("fingerprint") or fingerprint(results)
+
+def _draw_report(c, site_name, boundary_start, boundary_end, results, sankey=None):
     w, h = A4
 
     y = h - 50
@@ -54,25 +61,17 @@ def build_pdf_report(site_name: str, boundary_start: str, boundary_end: str, res
             y = h - 50
             c.setFont("Helvetica", 11)
 
-    # Sankey image
-    if sankey_fig is not None:
-        try:
-            img_bytes = sankey_fig.to_image(format="png", width=1200, height=650, scale=2)
-            img = ImageReader(BytesIO(img_bytes))
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(40, y, "Material Flow Map")
-            y -= 10
-            img_w = w - 80
-            img_h = img_w * 0.54
-            if y - img_h < 60:
-                c.showPage()
-                y = h - 50
-            c.drawImage(img, 40, y - img_h, width=img_w, height=img_h, preserveAspectRatio=True, mask='auto')
-            y -= (img_h + 18)
-        except Exception:
-            c.setFont("Helvetica", 10)
-            c.drawString(40, y, "Note: Sankey image export unavailable in this environment.")
-            y -= 16
+    # Sankey
+    if sankey is not None:
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(40, y, "Material Flow Map")
+        y -= 14
+        map_h = (w - 80) * 0.5
+        if y - map_h < 60:
+            c.showPage()
+            y = h - 50
+        draw_sankey(c, sankey, 40, y, w - 80, map_h)
+        y -= (map_h + 18)
 
     def bullet_section(title: str, items: list[str]):
         nonlocal y
@@ -104,4 +103,41 @@ def build_pdf_report(site_name: str, boundary_start: str, boundary_end: str, res
         bullet_section("Bottleneck risk (top)", [f"{top['Process']} — {top['Risk']} (utilisation: {float(top['Utilisation'])*100:.0f}%)"])
 
     c.save()
+
+def build_pdf_report(site_name: str, boundary_start: str, boundary_end: str, results: dict,
+                     sankey: dict = None) -> bytes:
+    """
+    One-page-or-so PDF summary. The flow map is drawn as vectors from a `sankey` payload
+    (build_sankey_inputs); without one the report has no flow map.
+    """
+    buf = BytesIO()
+    _draw_report(canvas.Canvas(buf, pagesize=A4), site_name, boundary_start, boundary_end, results, sankey=sankey)
     return buf.getvalue()
+
+def write_pdf_report(path, site_name: str, boundary_start: str, boundary_end: str, results: dict,
+                     sankey: dict = None) -> str:
+    """build_pdf_report written straight to `path` (atomically) instead of returned as bytes."""
+    tmp = f"{path}.part"
+    try:
+        _draw_report(canvas.Canvas(tmp, pagesize=A4), site_name, boundary_start, boundary_end, results, sankey=sankey)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+def warm_renderer():
+    """Load font metrics and prime ReportLab's caches, so a pool worker's first report is as fast as the rest."""
+    for font in ("Helvetica", "Helvetica-Bold"):
+        pdfmetrics.getFont(font)
+    build_pdf_report("", "", "", {}, sankey={"labels": ["a", "b"], "sources": [0], "targets": [1], "values": [1.0]})
+
+def cached_pdf_report(site_name: str, boundary_start: str, boundary_end: str, results: dict, sankey: dict = None) -> bytes:
+    """build_pdf_report memoized on the results fingerprint and the (level-of-detail dependent) Sankey payload."""
+    rkey = _results_key(results)
+    key = fingerprint(rkey, site_name, boundary_start, boundary_end, sankey)
+    pdf = _pdf_cache.get(key)
+    if pdf is None:
+        pdf = build_pdf_report(site_name, boundary_start, boundary_end, results, sankey=sankey)
+        _pdf_cache.put(key, pdf)
+    return pdf
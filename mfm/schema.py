@@ -0,0 +1,315 @@
+"""
+Dataset schema resolution: locate the columns the model needs once per dataset and keep
+them as pre-cast NumPy arrays in canonical units (kg, kWh; see mfm.units), so recomputes never
+re-scan headers, re-cast or re-convert values.
+
+Columns come from the dataset's confirmed field mapping (mfm.infer) when one is given, otherwise
+from header keywords.
+"""
+import calendar
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .cache import fingerprint
+from .infer import tokens
+from .units import find_unit_col, normalise, split_counts
+
+def find_col(df, keywords):
+    for c in df.columns:
+        lc = str(c).lower()
+        if any(k in lc for k in keywords):
+            return c
+    return None
+
+def find_token_col(df, words):
+    """First column with one of `words` as a whole header token ('SKU', 'ProductCode'; not 'Production qty')."""
+    for c in df.columns:
+        if tokens(c) & set(words):
+            return c
+    return None
+
+def _mapped(df, mapping, field, keywords, find=find_col):
+    """The column `mapping` assigns to `field` (None if unmapped), or the first keyword match without a mapping."""
+    if mapping is None:
+        return find(df, keywords)
+    col = mapping.get(field)
+    return col if col in df.columns else None
+
+def _mapped_unit(df, mapping, exclude):
+    if mapping is None:
+        return find_unit_col(df, exclude)
+    col = mapping.get("unit")
+    return col if col in df.columns and col not in exclude else None
+
+def _floats(df, col):
+    return df[col].astype(float).to_numpy() if col is not None else None
+
+def _units(df, col):
+    return df[col] if col is not None else None
+
+def _total(values) -> float:
+    # NaN-skipping, like the pandas sums this replaces
+    return float(np.nansum(values)) if values is not None else 0.0
+
+# Waste route classes, matched in order on the lowercased route label ("other" falls back to landfill factors)
+ROUTE_CLASSES = ["landfill", "incineration", "recycling", "hazardous", "other"]
+_ROUTE_RULES = [("landfill", ("landfill",)), ("incineration", ("incin",)), ("recycling", ("recycl",)), ("hazardous", ("haz",))]
+_DIVERTED = ("recycl", "reuse")
+# Waste type flags used by the circular-opportunity prompts, matched on the lowercased type label
+TYPE_FLAGS = {"metal_scrap": ("steel", "metal", "scrap"), "mixed": ("mixed",), "sludge_haz": ("sludge", "haz")}
+
+def _route_class(label: str) -> int:
+    for cls, keys in _ROUTE_RULES:
+        if any(k in label for k in keys):
+            return ROUTE_CLASSES.index(cls)
+    return ROUTE_CLASSES.index("other")
+
+def _factorize(values):
+    """Integer codes + uniques in first-seen order; missing values become their own category."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return codes, np.asarray(uniques, dtype=object)
+
+def _kg_by(codes, n, kg):
+    return np.bincount(codes, weights=np.nan_to_num(kg), minlength=n) if kg is not None else None
+
+_MONTHS = {m.lower(): i for i, m in enumerate(calendar.month_abbr) if m}
+
+def _parse_periods(values, ref_year):
+    """
+    Period start dates (datetime64) and granularity ("D" or "M") of a date/month column.
+    Month names without a year ("Jan") are placed in `ref_year`. Only unique values are parsed.
+    """
+    codes, uniques = pd.factorize(pd.Series(values).astype(str).str.strip())
+    u = pd.Series(uniques, dtype=object)
+    month_name = u.str.fullmatch(r"[A-Za-z]{3,9}\.?") & u.str[:3].str.lower().isin(_MONTHS)
+    parsed = pd.to_datetime(u.where(~month_name), errors="coerce")
+    if month_name.any():
+        months = u[month_name].str[:3].str.lower().map(_MONTHS)
+        parsed[month_name] = pd.to_datetime({"year": ref_year, "month": months, "day": 1})
+    monthly = month_name | u.str.fullmatch(r"\d{4}[-/]\d{1,2}")
+    gran = "M" if len(u) and monthly.all() else "D"
+    dates = parsed.to_numpy(dtype="datetime64[ns]")
+    return (dates[codes] if len(codes) else dates[:0]), gran
+
+def _periods(df, col, ref_year):
+    if col is None:
+        return None, None, None
+    dates, gran = _parse_periods(df[col], ref_year)
+    return col, dates, gran
+
+@dataclass(frozen=True)
+class ResolvedProduction:
+    qty_col: Optional[str]
+    qty: Optional[np.ndarray]
+    date_col: Optional[str] = None
+    dates: Optional[np.ndarray] = None    # datetime64 period start per row
+    date_gran: Optional[str] = None       # "D" (dated rows) or "M" (monthly rows)
+    kg: Optional[np.ndarray] = None       # rows reported in a mass unit, in kg (their qty is 0)
+    conversions: tuple = ()
+    product_col: Optional[str] = None
+    product_labels: Optional[np.ndarray] = None   # raw product codes, first-seen order
+    product_codes: Optional[np.ndarray] = None
+    qty_by_product: Optional[np.ndarray] = None   # counted units per product label (see mfm.products)
+
+    @property
+    def total_qty(self) -> float:
+        return _total(self.qty)
+
+    @property
+    def total_kg(self) -> float:
+        return _total(self.kg)
+
+@dataclass(frozen=True)
+class ResolvedMaterial:
+    kg_col: Optional[str]
+    kg: Optional[np.ndarray]
+    date_col: Optional[str] = None
+    dates: Optional[np.ndarray] = None
+    date_gran: Optional[str] = None
+    conversions: tuple = ()
+
+    @property
+    def total_kg(self) -> Optional[float]:
+        return _total(self.kg) if self.kg is not None else None
+
+@dataclass(frozen=True)
+class ResolvedEnergy:
+    elec_col: Optional[str]
+    gas_col: Optional[str]
+    elec_kwh: Optional[np.ndarray]
+    gas_kwh: Optional[np.ndarray]
+    date_col: Optional[str] = None
+    dates: Optional[np.ndarray] = None
+    date_gran: Optional[str] = None
+    conversions: tuple = ()
+
+    @property
+    def has_energy(self) -> bool:
+        return bool(self.elec_col or self.gas_col)
+
+    @property
+    def totals(self):
+        return _total(self.elec_kwh), _total(self.gas_kwh)
+
+@dataclass(frozen=True)
+class ResolvedWaste:
+    """Waste register classified once into categorical codes, with kg totals per category."""
+    kg_col: Optional[str]
+    type_col: Optional[str]
+    route_col: Optional[str]
+    kg: Optional[np.ndarray]
+    type_labels: Optional[np.ndarray]     # raw type values, first-seen order
+    type_codes: Optional[np.ndarray]
+    type_flags: dict                       # TYPE_FLAGS name -> bool per type label
+    kg_by_type: Optional[np.ndarray]
+    route_labels: Optional[np.ndarray]    # lowercased + stripped, sorted
+    route_codes: Optional[np.ndarray]
+    route_class: Optional[np.ndarray]     # index into ROUTE_CLASSES per route label
+    route_diverted: Optional[np.ndarray]  # bool per route label
+    kg_by_route: Optional[np.ndarray]
+    date_col: Optional[str] = None
+    dates: Optional[np.ndarray] = None
+    date_gran: Optional[str] = None
+    conversions: tuple = ()
+
+    @property
+    def total_kg(self) -> Optional[float]:
+        return _total(self.kg) if self.kg is not None else None
+
+@dataclass(frozen=True)
+class ResolvedBundle:
+    production: ResolvedProduction
+    material: ResolvedMaterial
+    energy: ResolvedEnergy
+    waste: ResolvedWaste
+    fingerprint: str
+    notes: tuple = field(default=())
+
+    @property
+    def conversions(self) -> tuple:
+        """Unit conversions applied while resolving, one sentence each (reported as assumptions)."""
+        return self.production.conversions + self.material.conversions + self.energy.conversions + self.waste.conversions
+
+PERIOD_KEYWORDS = ["date", "month", "period", "week"]
+
+def resolve_production(df, ref_year=None, mapping=None) -> ResolvedProduction:
+    qty_col = _mapped(df, mapping, "qty", ["qty", "produced", "quantity"])
+    qty = kg = None
+    notes = []
+    if qty_col is not None:
+        # rows counted in pcs stay quantities; rows reported in a mass unit are product mass in kg
+        qty, kg, notes = split_counts(_floats(df, qty_col), qty_col, _units(df, _mapped_unit(df, mapping, (qty_col,))))
+    product_col = _mapped(df, mapping, "product", ["product", "products", "sku"], find=find_token_col)
+    product_labels = product_codes = qty_by_product = None
+    if product_col is not None:
+        product_codes, product_labels = _factorize(df[product_col])
+        qty_by_product = _kg_by(product_codes, len(product_labels), qty)
+    date_col, dates, gran = _periods(df, _mapped(df, mapping, "date", PERIOD_KEYWORDS), ref_year)
+    return ResolvedProduction(qty_col=qty_col, qty=qty, date_col=date_col, dates=dates, date_gran=gran,
+                              kg=kg, conversions=tuple(notes), product_col=product_col,
+                              product_labels=product_labels, product_codes=product_codes, qty_by_product=qty_by_product)
+
+def _normalised(df, col, kind, unit_col, notes):
+    if col is None:
+        return None
+    values, conv = normalise(_floats(df, col), col, kind, _units(df, unit_col), unit_col)
+    notes.extend(conv)
+    return values
+
+def resolve_material(df, ref_year=None, mapping=None) -> ResolvedMaterial:
+    kg_col = _mapped(df, mapping, "mass_kg", ["kg", "weight", "mass", "tonne"])
+    notes = []
+    kg = _normalised(df, kg_col, "mass", _mapped_unit(df, mapping, (kg_col,)), notes)
+    date_col, dates, gran = _periods(df, _mapped(df, mapping, "period", PERIOD_KEYWORDS), ref_year)
+    return ResolvedMaterial(kg_col=kg_col, kg=kg, date_col=date_col, dates=dates, date_gran=gran, conversions=tuple(notes))
+
+def resolve_energy(df, ref_year=None, mapping=None) -> ResolvedEnergy:
+    elec_col = _mapped(df, mapping, "electricity_kwh", ["electric"])
+    gas_col = _mapped(df, mapping, "gas_kwh", ["gas"])
+    unit_col = _mapped_unit(df, mapping, (elec_col, gas_col))
+    notes = []
+    elec_kwh = _normalised(df, elec_col, "energy", unit_col, notes)
+    gas_kwh = _normalised(df, gas_col, "gas", unit_col, notes)
+    date_col, dates, gran = _periods(df, _mapped(df, mapping, "period", PERIOD_KEYWORDS), ref_year)
+    return ResolvedEnergy(elec_col=elec_col, gas_col=gas_col, elec_kwh=elec_kwh, gas_kwh=gas_kwh,
+                          date_col=date_col, dates=dates, date_gran=gran, conversions=tuple(notes))
+
+def resolve_waste(df, ref_year=None, mapping=None) -> ResolvedWaste:
+    kg_col = _mapped(df, mapping, "mass_kg", ["kg", "quantity", "weight", "mass", "tonne"])
+    type_col = _mapped(df, mapping, "waste_type", ["waste"])
+    route_col = _mapped(df, mapping, "route", ["route", "disposal"])
+    notes = []
+    kg = _normalised(df, kg_col, "mass", _mapped_unit(df, mapping, (kg_col, type_col, route_col)), notes)
+
+    type_labels = type_codes = kg_by_type = None
+    type_flags = {}
+    if type_col is not None:
+        type_codes, type_labels = _factorize(df[type_col])
+        lc = [str(t).lower() for t in type_labels]
+        type_flags = {name: np.array([any(k in t for k in keys) for t in lc], dtype=bool)
+                      for name, keys in TYPE_FLAGS.items()}
+        kg_by_type = _kg_by(type_codes, len(type_labels), kg)
+
+    route_labels = route_codes = route_class = route_diverted = kg_by_route = None
+    if route_col is not None:
+        raw_codes, raw = _factorize(df[route_col])
+        # case/whitespace variants collapse onto one label; only the uniques are string-processed
+        route_labels, remap = np.unique(np.array([str(r).lower().strip() for r in raw], dtype=object), return_inverse=True)
+        route_codes = remap[raw_codes]
+        route_class = np.array([_route_class(r) for r in route_labels], dtype=np.int8)
+        route_diverted = np.array([any(k in r for k in _DIVERTED) for r in route_labels], dtype=bool)
+        kg_by_route = _kg_by(route_codes, len(route_labels), kg)
+
+    return ResolvedWaste(
+        kg_col=kg_col,
+        type_col=type_col,
+        route_col=route_col,
+        kg=kg,
+        type_labels=type_labels,
+        type_codes=type_codes,
+        type_flags=type_flags,
+        kg_by_type=kg_by_type,
+        route_labels=route_labels,
+        route_codes=route_codes,
+        route_class=route_class,
+        route_diverted=route_diverted,
+        kg_by_route=kg_by_route,
+        **dict(zip(("date_col", "dates", "date_gran"),
+                   _periods(df, _mapped(df, mapping, "period", PERIOD_KEYWORDS), ref_year))),
+        conversions=tuple(notes),
+    )
+
+def resolve_bundle(bundle, mappings=None) -> ResolvedBundle:
+    """
+    Resolve a data bundle (dict of the four dataset DataFrames); missing datasets resolve
+    to empty views. `mappings` ({dataset type: {field: column}}, see mfm.infer) names the columns
+    of the datasets it covers; the others are matched on header keywords. Already-resolved
+    bundles pass through unchanged.
+    """
+    if isinstance(bundle, ResolvedBundle):
+        return bundle
+    empty = pd.DataFrame()
+    mappings = mappings or {}
+    production = resolve_production(bundle.get("production_output", empty), ref_year=pd.Timestamp.today().year,
+                                    mapping=mappings.get("production_output"))
+
+    # month-only periods ("Jan") in the other datasets are placed in the production year
+    notes = []
+    years = pd.DatetimeIndex(production.dates).year.dropna() if production.dates is not None else []
+    ref_year = int(pd.Series(years).mode().iloc[0]) if len(years) else pd.Timestamp.today().year
+    datasets = {"material_purchases": resolve_material, "energy_site": resolve_energy, "waste_summary": resolve_waste}
+    views = {k: fn(bundle.get(k, empty), ref_year=ref_year, mapping=mappings.get(k)) for k, fn in datasets.items()}
+    if any(v.date_gran == "M" for v in views.values()):
+        notes.append(f"Monthly periods are placed in {ref_year} where the data gives no year.")
+
+    return ResolvedBundle(
+        production=production,
+        material=views["material_purchases"],
+        energy=views["energy_site"],
+        waste=views["waste_summary"],
+        fingerprint=fingerprint(bundle, mappings),
+        notes=tuple(notes),
+    )
@@ -0,0 +1,238 @@
+"""
+Local HTTP/JSON compute service.
+
+    python -m mfm.service [--host 127.0.0.1] [--port 8765] [--workers N] [--max-queue 64] [--timeout 30]
+
+POST /balances with a site.json-style model (see mfm.batch) plus its data, either inline as
+"bundle": {dataset type: [row dicts] | {"columns": [...], "data": [[...], ...]}} or by reference
+as "bundle_dir": a local directory of data files. Optional "lod" (sankey_lod options, default {})
+shapes the Sankey payload. The reply holds "kpis", "flows" (records), "sankey", "assumptions",
+"fingerprint", "cached" and "seconds".
+
+Requests run on a process pool. At most --max-queue requests are accepted at once (further ones
+get 503); a request holds its slot until its computation finishes, so work abandoned after the
+--timeout (504) still counts against the limit. Identical concurrent requests share one
+computation, and replies are cached by request fingerprint (for "bundle_dir" requests, together
+with the names, sizes and mtimes of the directory's files). GET /health and GET /stats report
+liveness and counters.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from .batch import load_bundle, model_from_spec
+from .cache import LRUCache, fingerprint
+from .model import build_sankey_inputs, compute_balances, kpi_summary
+
+MAX_BODY_BYTES = 256 * 1024 ** 2
+
+def _frame(table):
+    if isinstance(table, dict) and "columns" in table:
+        return pd.DataFrame(table.get("data", []), columns=table["columns"])
+    return pd.DataFrame.from_records(table)
+
+def _jsonable(v):
+    if isinstance(v, (np.integer, np.floating)):
+        return v.item()
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    if isinstance(v, pd.DataFrame):
+        return v.to_dict(orient="records")
+    return str(v)
+
+def _dir_state(path):
+    """(name, size, mtime) of each file in a bundle directory, so edited data changes the cache key."""
+    try:
+        entries = sorted(os.scandir(path), key=lambda e: e.name)
+    except OSError:
+        return None
+    return [(e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in entries if e.is_file()]
+
+def evaluate(request):
+    """Build and evaluate one model request; returns a JSON-ready dict."""
+    t0 = time.perf_counter()
+    if "bundle_dir" in request:
+        bundle = load_bundle(request["bundle_dir"])
+    else:
+        bundle = {k: _frame(v) for k, v in (request.get("bundle") or {}).items()}
+    model = model_from_spec(request, bundle)
+    results = compute_balances(model)
+    return {
+        "site_name": model["site_name"],
+        "kpis": kpi_summary(results),
+        "flows": results["flows_table"].to_dict(orient="records"),
+        "sankey": build_sankey_inputs(results, lod=request.get("lod", {})),
+        "assumptions": results["assumptions"],
+        "seconds": time.perf_counter() - t0,
+    }
+
+class ComputeService:
+    """Worker pool, admission limit, request coalescing and reply cache behind the HTTP handler."""
+
+    def __init__(self, workers=None, max_queue=64, timeout=30.0, cache_size=256):
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.timeout = timeout
+        self.cache = LRUCache(maxsize=cache_size)
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._abandoned = set()  # timed-out futures still running in the pool
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "rejected": 0, "timeouts": 0, "coalesced": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters, inflight=len(self._inflight), abandoned=len(self._abandoned))
+        out["cache"] = self.cache.stats()
+        return out
+
+    def balances(self, request, key=None):
+        """Returns (HTTP status, reply dict). `key` identifies the request (default: its fingerprint)."""
+        self._count("requests")
+        key = key or fingerprint(request)
+        if "bundle_dir" in request:
+            key = fingerprint(key, _dir_state(request["bundle_dir"]))
+        hit = self.cache.get(key)
+        if hit is not None:
+            self._count("ok")
+            return 200, dict(hit, cached=True)
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            return 503, {"error": "Service busy: request queue is full."}
+        try:
+            with self._lock:
+                fut = self._inflight.get(key)
+                if fut is None:
+                    fut = self.pool.submit(evaluate, request)
+                    self._inflight[key] = fut
+                    fut.add_done_callback(lambda f, k=key: self._forget(k, f))
+                else:
+                    self.counters["coalesced"] += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot is freed when the computation ends, not when this request stops waiting for it
+        fut.add_done_callback(lambda f: self._slots.release())
+        try:
+            reply = fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            if not fut.cancel():
+                with self._lock:
+                    self._abandoned.add(fut)
+            self._count("timeouts")
+            return 504, {"error": f"Timed out after {self.timeout:g}s."}
+        except Exception as e:
+            self._count("errors")
+            return 422, {"error": f"{type(e).__name__}: {e}"}
+        reply = dict(reply, fingerprint=key)
+        self.cache.put(key, reply)
+        self._count("ok")
+        return 200, dict(reply, cached=False)
+
+    def _forget(self, key, fut):
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+            self._abandoned.discard(fut)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, payload, close=False):
+        body = json.dumps(payload, default=_jsonable).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send(200, self.service.stats())
+        else:
+            self._send(404, {"error": "Not found."})
+
+    def do_POST(self):
+        # on a keep-alive connection an unread body would be parsed as the next request: every reply
+        # either follows reading the whole body or closes the connection
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self._send(400, {"error": "Invalid Content-Length."}, close=True)
+            return
+        if length > MAX_BODY_BYTES:
+            self._send(413, {"error": "Request body too large."}, close=True)
+            return
+        body = self.rfile.read(length)
+        if self.path != "/balances":
+            self._send(404, {"error": "Not found."})
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as e:
+            self._send(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(request, dict):
+            self._send(400, {"error": "Expected a JSON object."})
+            return
+        # the raw body is a cheaper cache key than hashing the parsed tables value by value
+        self._send(*self.service.balances(request, key=hashlib.blake2b(body, digest_size=20).hexdigest()))
+
+    def log_message(self, fmt, *args):
+        pass
+
+def make_server(host="127.0.0.1", port=8765, **service_kwargs):
+    """A ThreadingHTTPServer bound to `host:port`, with its ComputeService at `.service`."""
+    service = ComputeService(**service_kwargs)
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m mfm.service", description="Serve compute_balances over local HTTP/JSON.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--max-queue", type=int, default=64, help="requests accepted at once before answering 503")
+    ap.add_argument("--timeout", type=float, default=30.0, help="seconds per request before answering 504")
+    ap.add_argument("--cache-size", type=int, default=256)
+    args = ap.parse_args(argv)
+
+    server = make_server(args.host, args.port, workers=args.workers, max_queue=args.max_queue,
+                         timeout=args.timeout, cache_size=args.cache_size)
+    print(f"mfm service on http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
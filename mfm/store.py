@@ -0,0 +1,121 @@
+"""
+Local on-disk cache of uploaded datasets as typed Arrow IPC files, keyed by content hash.
+
+Each upload is parsed once (CSV via pyarrow's streaming reader, XLSX via openpyxl read-only
+rows) and written batch by batch; later reads memory-map the file without copying.
+"""
+import hashlib
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from .cache import CACHE_DIR
+
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+def _cache_dir(cache_dir=None) -> str:
+    d = cache_dir or CACHE_DIR
+    os.makedirs(d, exist_ok=True)
+    return d
+
+def _open_binary(source):
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb"), True
+    source.seek(0)
+    return source, False
+
+def content_hash(source, block_size=1 << 20) -> str:
+    """blake2b of the raw bytes of a path or file-like object."""
+    h = hashlib.blake2b(digest_size=20)
+    f, owned = _open_binary(source)
+    try:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    finally:
+        if owned:
+            f.close()
+        else:
+            f.seek(0)
+    return h.hexdigest()
+
+def _csv_batches(source, as_strings=False):
+    f, owned = _open_binary(source)
+    try:
+        convert = None
+        if as_strings:
+            header = pacsv.open_csv(f).schema.names
+            f.seek(0)
+            convert = pacsv.ConvertOptions(column_types={c: pa.string() for c in header})
+        yield from pacsv.open_csv(f, convert_options=convert)
+    finally:
+        if owned:
+            f.close()
+
+def _excel_batches(source, as_strings=False):
+    from .ingest import _excel_chunks
+
+    schema = None
+    for chunk in _excel_chunks(source, 50_000):
+        if as_strings:
+            chunk = chunk.map(lambda v: None if v is None else str(v))
+            schema = schema or pa.schema([(str(c), pa.string()) for c in chunk.columns])
+        batch = pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+        schema = schema or batch.schema
+        yield batch
+
+def _write_ipc(batches, path):
+    writer = None
+    try:
+        for batch in batches:
+            if writer is None:
+                writer = pa.ipc.new_file(path, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return writer is not None
+
+def cache_upload(source, name, cache_dir=None) -> str:
+    """Convert an uploaded CSV/XLSX into `<cache_dir>/<content hash>.arrow` (once) and return its path."""
+    d = _cache_dir(cache_dir)
+    path = os.path.join(d, f"{content_hash(source)}.arrow")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    read = _excel_batches if name.lower().endswith((".xlsx", ".xlsm")) else _csv_batches
+    fd, tmp = tempfile.mkstemp(suffix=".arrow.tmp", dir=d)
+    os.close(fd)
+    try:
+        try:
+            written = _write_ipc(read(source), tmp)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # types drifted after the first block: store every column as text instead
+            written = _write_ipc(read(source, as_strings=True), tmp)
+        if not written:
+            _write_ipc([pa.RecordBatch.from_pylist([])], tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    prune_cache(cache_dir=d)
+    return path
+
+def open_table(path) -> pa.Table:
+    """Memory-mapped, zero-copy view of a cached Arrow file."""
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+def prune_cache(max_bytes=MAX_CACHE_BYTES, cache_dir=None):
+    """Evict least recently used cache files until the cache fits in `max_bytes`."""
+    d = _cache_dir(cache_dir)
+    files = [os.path.join(d, f) for f in os.listdir(d) if f.endswith(".arrow")]
+    files.sort(key=os.path.getmtime)
+    total = sum(os.path.getsize(f) for f in files)
+    while files and total > max_bytes:
+        f = files.pop(0)
+        total -= os.path.getsize(f)
+        os.remove(f)
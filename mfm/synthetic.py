@@ -1,3 +1,9 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
 import pandas as pd
 
 def make_synthetic_bundle():
@@ -36,3 +42,189 @@ def make_synthetic_bundle():
         "energy_site": energy_site,
         "waste_summary": waste_summary,
     }
+
+# ---------------------------------------------------------------------------------------------
+# Scalable generator for load testing
+# ---------------------------------------------------------------------------------------------
+_WASTE_TYPES = [
+    ("Steel scrap", "Recycling"), ("Mixed waste", "Landfill"), ("Sludge", "Hazardous"),
+    ("Cardboard", "Recycling"), ("Aluminium swarf", "Recycling"), ("Plastic film", "Incineration"),
+    ("Paint waste", "Hazardous"), ("Wood pallets", "Reuse"), ("Oily rags", "Incineration"),
+]
+_MATERIALS = ["Mild steel sheet", "Stainless sheet", "Aluminium extrusion", "Steel tube", "Fasteners", "Powder coat"]
+
+def _names(base, n):
+    return [base[i % len(base)] + (f" {i // len(base) + 1}" if i >= len(base) else "") for i in range(n)]
+
+def _site_spec(rng, n_products, n_materials, n_waste_types, units_per_day, unit_mass_kg, yield_pct):
+    """Per-site constants: product mix and masses, material and waste splits, energy intensities."""
+    waste = list(zip(_names([w for w, _ in _WASTE_TYPES], n_waste_types),
+                     [_WASTE_TYPES[i % len(_WASTE_TYPES)][1] for i in range(n_waste_types)]))
+    return {
+        "products": [f"SKU-{i:05d}" for i in range(n_products)],
+        "product_share": rng.dirichlet(np.full(n_products, 2.0)),
+        "unit_mass": unit_mass_kg * rng.lognormal(0.0, 0.15, n_products),
+        "units_per_day": units_per_day * rng.uniform(0.7, 1.3),
+        "materials": _names(_MATERIALS, n_materials),
+        "material_share": rng.dirichlet(np.full(n_materials, 2.0)),
+        "yield": np.clip(rng.normal(yield_pct, 2.0) / 100.0, 0.5, 0.99),
+        "unaccounted": rng.uniform(0.0, 0.03),
+        "waste": waste,
+        "waste_share": rng.dirichlet(np.full(n_waste_types, 1.5)),
+        "elec_base_kw": rng.uniform(20.0, 80.0),
+        "elec_kwh_per_kg": rng.uniform(0.6, 1.4),
+        "gas_kwh_per_kg": rng.uniform(0.3, 0.8),
+    }
+
+def _period_hours(dates, freq):
+    edges = dates.append(pd.DatetimeIndex([dates[-1] + pd.tseries.frequencies.to_offset(freq)]))
+    return np.diff(edges.values.astype("datetime64[s]").astype(np.int64)) / 3600.0
+
+def _chunk(rng, spec, dates, hours):
+    """The four tables for `dates`; every quantity derives from the sampled production mass."""
+    n_t, n_p = len(dates), len(spec["products"])
+    lam = spec["units_per_day"] * hours[:, None] / 24.0 * spec["product_share"][None, :]
+    qty = rng.poisson(lam)
+    prod_kg = (qty * spec["unit_mass"][None, :]).sum(axis=1)
+
+    # material bought to cover production at the site's yield, with purchasing noise
+    mat_kg = prod_kg / spec["yield"] * rng.lognormal(0.0, 0.05, n_t)
+    mat_split = mat_kg[:, None] * rng.dirichlet(spec["material_share"] * 200.0 + 1e-9, n_t)
+    waste_kg = np.maximum(mat_kg - prod_kg, 0.0) * (1.0 - spec["unaccounted"])
+    waste_split = waste_kg[:, None] * rng.dirichlet(spec["waste_share"] * 200.0 + 1e-9, n_t)
+    elec = spec["elec_base_kw"] * hours + spec["elec_kwh_per_kg"] * prod_kg * rng.lognormal(0.0, 0.05, n_t)
+    gas = spec["gas_kwh_per_kg"] * prod_kg * rng.lognormal(0.0, 0.08, n_t)
+
+    n_m, n_w = len(spec["materials"]), len(spec["waste"])
+    keep = qty.ravel() > 0
+    return {
+        "production_output": pd.DataFrame({
+            "Date": np.repeat(dates.values, n_p)[keep],
+            "Product Code": np.tile(np.asarray(spec["products"], dtype=object), n_t)[keep],
+            "Qty Produced": qty.ravel()[keep],
+            "Unit": "pcs",
+        }),
+        "material_purchases": pd.DataFrame({
+            "Date": np.repeat(dates.values, n_m),
+            "Material Description": np.tile(np.asarray(spec["materials"], dtype=object), n_t),
+            "Weight (kg)": mat_split.ravel().round(1),
+        }),
+        "energy_site": pd.DataFrame({"Date": dates.values, "Electricity_kWh": elec.round(1), "Gas_kWh": gas.round(1)}),
+        "waste_summary": pd.DataFrame({
+            "Date": np.repeat(dates.values, n_w),
+            "Waste Type": np.tile(np.asarray([w for w, _ in spec["waste"]], dtype=object), n_t),
+            "Quantity (kg)": waste_split.ravel().round(1),
+            "Disposal Route": np.tile(np.asarray([r for _, r in spec["waste"]], dtype=object), n_t),
+        }),
+    }
+
+def _chunks(seed, start, end, freq, chunk_periods, n_products, n_materials, n_waste_types,
+            units_per_day, unit_mass_kg, yield_pct):
+    rng = np.random.default_rng(seed)
+    spec = _site_spec(rng, n_products, n_materials, n_waste_types, units_per_day, unit_mass_kg, yield_pct)
+    dates = pd.date_range(start, end, freq=freq)
+    if len(dates) == 0:
+        raise ValueError(f"No '{freq}' periods between {start} and {end}.")
+    hours = _period_hours(dates, freq)
+    for lo in range(0, len(dates), chunk_periods):
+        yield spec, _chunk(rng, spec, dates[lo:lo + chunk_periods], hours[lo:lo + chunk_periods])
+
+def _meta(spec):
+    return {
+        "unit_mass_by_product": dict(zip(spec["products"], spec["unit_mass"].round(3).tolist())),
+        "unit_mass_kg_per_unit": float(np.average(spec["unit_mass"], weights=spec["product_share"])),
+        "yield_pct": float(spec["yield"] * 100.0),
+    }
+
+def generate_bundle(seed=0, n_products=5, n_materials=3, n_waste_types=4, start="2025-01-01", end="2025-03-31",
+                    freq="D", units_per_day=60.0, unit_mass_kg=7.0, yield_pct=90.0, meta=False):
+    """
+    Seeded, internally consistent data bundle: one row per period (`freq`, a pandas frequency) and
+    product / material / waste type. Material covers production at ~`yield_pct`, waste is the
+    difference less a small unaccounted share, and energy is a base load plus a per-kg term.
+    With meta=True returns (bundle, sampled site constants such as per-product unit masses).
+    """
+    (spec, bundle), = _chunks(seed, start, end, freq, 10 ** 9, n_products, n_materials, n_waste_types,
+                              units_per_day, unit_mass_kg, yield_pct)
+    return (bundle, _meta(spec)) if meta else bundle
+
+def stream_bundle(out_dir, seed=0, fmt="csv", chunk_periods=2_000, n_products=5, n_materials=3, n_waste_types=4,
+                  start="2025-01-01", end="2025-03-31", freq="D", units_per_day=60.0, unit_mass_kg=7.0, yield_pct=90.0):
+    """
+    Write a generated bundle to `out_dir/<dataset type>.<csv|parquet>` chunk by chunk, so bundles far
+    larger than memory can be produced. Returns {"rows": {dataset type: rows written}, "meta": ...}.
+    """
+    if fmt not in ("csv", "parquet"):
+        raise ValueError("fmt must be 'csv' or 'parquet'")
+    os.makedirs(out_dir, exist_ok=True)
+    rows, writers, spec = {}, {}, None
+    try:
+        for spec, part in _chunks(seed, start, end, freq, chunk_periods, n_products, n_materials, n_waste_types,
+                               units_per_day, unit_mass_kg, yield_pct):
+            for name, df in part.items():
+                path = os.path.join(out_dir, f"{name}.{fmt}")
+                if fmt == "csv":
+                    df.to_csv(path, mode="a" if name in rows else "w", header=name not in rows, index=False)
+                else:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    if name not in writers:
+                        writers[name] = pq.ParquetWriter(path, table.schema)
+                    writers[name].write_table(table)
+                rows[name] = rows.get(name, 0) + len(df)
+    finally:
+        for w in writers.values():
+            w.close()
+    return {"rows": rows, "meta": _meta(spec)}
+
+def generate_sites(root, n_sites=10, seed=0, fmt="csv", blocks=None, **params):
+    """
+    Write `n_sites` site directories (data files, product_master.csv + site.json) under `root`, in the
+    layout read by `python -m mfm.batch`. Each site gets its own seed drawn from `seed`.
+    """
+    blocks = blocks or [{"name": n, "yield_pct": 92, "capacity_units_per_hr": 60.0, "available_hours": 480.0,
+                         "downtime_pct": 8} for n in ("Cutting", "Forming", "Welding", "Assembly", "Packing")]
+    seeds = np.random.SeedSequence(seed).spawn(n_sites)
+    paths = []
+    for i, ss in enumerate(seeds):
+        site_dir = os.path.join(root, f"site_{i:04d}")
+        out = stream_bundle(site_dir, seed=ss, fmt=fmt, **params)
+        spec = {
+            "site_name": f"Synthetic site {i + 1}",
+            "boundary_start": "Goods In",
+            "boundary_end": "Dispatch",
+            "unit_mass_kg_per_unit": round(out["meta"]["unit_mass_kg_per_unit"], 3),
+            "process_blocks": blocks,
+        }
+        masses = out["meta"]["unit_mass_by_product"]
+        pd.DataFrame({"Product Code": list(masses), "Unit Mass (kg)": list(masses.values())}).to_csv(
+            os.path.join(site_dir, "product_master.csv"), index=False)
+        with open(os.path.join(site_dir, "site.json"), "w") as f:
+            json.dump(spec, f, indent=2)
+        paths.append(site_dir)
+    return paths
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m mfm.synthetic", description="Generate synthetic site data for load testing.")
+    ap.add_argument("out", help="output directory (one sub-directory per site)")
+    ap.add_argument("--sites", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--products", type=int, default=5)
+    ap.add_argument("--materials", type=int, default=3)
+    ap.add_argument("--waste-types", type=int, default=4)
+    ap.add_argument("--start", default="2025-01-01")
+    ap.add_argument("--end", default="2025-03-31")
+    ap.add_argument("--freq", default="D", help="row frequency, a pandas offset alias (h, D, W, MS, ...)")
+    ap.add_argument("--units-per-day", type=float, default=60.0)
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    args = ap.parse_args(argv)
+
+    generate_sites(args.out, n_sites=args.sites, seed=args.seed, fmt=args.format, n_products=args.products,
+                   n_materials=args.materials, n_waste_types=args.waste_types, start=args.start, end=args.end,
+                   freq=args.freq, units_per_day=args.units_per_day)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Monte Carlo uncertainty propagation through the mass, energy and carbon balance.
+
+`uncertainty` maps an input to a distribution spec. Inputs: "yield_pct" and "downtime_pct"
+(sampled independently per block around each block's value), "unit_mass_kg_per_unit" (products
+not in the product master), and any
+carbon factor key (e.g. "electricity_kgco2e_per_kwh", "waste_landfill_kgco2e_per_kg").
+Specs: {"dist": "normal" | "uniform" | "triangular" | "lognormal", "rel": 0.1} spreads relative
+to the point value; absolute parameters (sd, low, mode, high, sigma) override `rel`.
+
+All N samples are evaluated as NumPy arrays, in chunks to bound memory; with `workers` > 1 the
+chunks run in a process pool that writes into one shared-memory result array.
+"""
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from .model import _ROUTE_FACTORS, _base_aggregates
+from .network import build_network
+from .schema import resolve_bundle
+
+MC_KPIS = ["material_eff_pct", "unaccounted_kg", "co2e_total_kg", "prod_out_kg", "modelled_out_kg", "max_utilisation"]
+CHUNK_SAMPLES = 20_000
+
+def _draw(spec, base, size, rng):
+    base = np.asarray(base, dtype=float)
+    rel = float(spec.get("rel", 0.0))
+    dist = spec.get("dist", "normal")
+    if dist == "normal":
+        return rng.normal(spec.get("mean", base), spec.get("sd", rel * np.abs(base)), size)
+    if dist == "uniform":
+        return rng.uniform(spec.get("low", base * (1 - rel)), spec.get("high", base * (1 + rel)), size)
+    if dist == "triangular":
+        low, high = spec.get("low", base * (1 - rel)), spec.get("high", base * (1 + rel))
+        mode = spec.get("mode", base)
+        u = rng.random(size)
+        # vectorised inverse CDF (numpy's triangular needs scalar-compatible, strictly ordered bounds)
+        span = np.maximum(high - low, 1e-300)
+        c = (mode - low) / span
+        return np.where(u < c, low + np.sqrt(u * span * (mode - low)), high - np.sqrt((1 - u) * span * (high - mode)))
+    if dist == "lognormal":
+        return base * rng.lognormal(0.0, spec.get("sigma", rel), size)
+    raise ValueError(f"Unknown distribution '{dist}'")
+
+def _prepare(model):
+    """Everything the sampler needs, reduced once from the model (small, picklable)."""
+    data = resolve_bundle(model["data"])
+    blocks = model["blocks"]
+    factors = model.get("carbon_factors", {})
+    sc = model["scenarios"]
+    waste = data.waste
+
+    net = build_network(blocks, model["boundary_end"])
+    base = _base_aggregates(model)
+    base.update({
+        "qty": data.production.total_qty,
+        "qty_kg": data.production.total_kg,
+        "unit_mass": float(model.get("unit_mass_kg_per_unit", 7.0)),
+        "factors": {k: float(v) for k, v in factors.items()},
+        "kg_by_route": waste.kg_by_route if waste.kg_by_route is not None else np.zeros(0),
+        "route_class": waste.route_class if waste.route_class is not None else np.zeros(0, dtype=int),
+        "yields": np.array([float(b.get("yield_pct", 92)) for b in blocks]),
+        "cap": np.array([float(b.get("capacity_units_per_hr", 0.0)) for b in blocks]),
+        "hrs": np.array([float(b.get("available_hours", 0.0)) for b in blocks]),
+        "down": np.array([float(b.get("downtime_pct", 0.0)) for b in blocks]),
+        "labels": [b.get("user_label", b.get("name", "Process")) for b in blocks],
+        "net": net,
+        "s": sc.get("scrap_reduction_pct", 0.0) / 100.0,
+        "y": sc.get("yield_improve_pct", 0.0) / 100.0,
+        "e": max(sc.get("energy_intensity_improve_pct", 0.0), 0.0) / 100.0,
+    })
+    return base
+
+def _exit_flows(net, yields, mat_in, tol=1e-10, max_iter=100_000):
+    """Batched steady-state exit flow for (N, n) sampled yields, by fixed-point iteration x = b + A(y) x."""
+    n_samples, n = yields.shape
+    if net["linear"]:
+        return mat_in * np.prod(yields[:, :-1], axis=1)
+    b = net["input_share"] * mat_in
+    scatter = sp.csr_matrix((np.ones(len(net["src"])), (np.arange(len(net["src"])), net["dst"])), shape=(len(net["src"]), n))
+    w = yields[:, net["src"]] * net["frac"]
+    x = np.broadcast_to(b, (n_samples, n)).copy()
+    for _ in range(max_iter):
+        x_new = b + (scatter.T @ (w * x[:, net["src"]]).T).T
+        done = np.max(np.abs(x_new - x)) <= tol * max(np.max(np.abs(x_new)), 1.0)
+        x = x_new
+        if done:
+            break
+    else:
+        raise ValueError("Process network did not converge; check for closed loops without losses or exits.")
+    return (yields * net["exit_frac"] * x).sum(axis=1)
+
+def _evaluate(base, spec, n, rng):
+    """Sample inputs and return an (n, len(MC_KPIS)) KPI array plus (n, blocks) utilisation."""
+    nb = len(base["yields"])
+    yields = base["yields"] * np.ones((n, nb))
+    if "yield_pct" in spec:
+        yields = _draw(spec["yield_pct"], base["yields"], (n, nb), rng)
+    yields = np.clip(yields, 0.0, 100.0) / 100.0
+    if base["net"]["linear"] and nb:
+        yields[:, -1] = 1.0
+    down = base["down"] * np.ones((n, nb))
+    if "downtime_pct" in spec:
+        down = _draw(spec["downtime_pct"], base["down"], (n, nb), rng)
+    down = np.clip(down, 0.0, 100.0) / 100.0
+    unit_mass = np.full(n, base["unit_mass"])
+    if "unit_mass_kg_per_unit" in spec:
+        unit_mass = np.maximum(_draw(spec["unit_mass_kg_per_unit"], base["unit_mass"], n, rng), 0.0)
+
+    def factor(key, default):
+        point = base["factors"].get(key, default)
+        return np.maximum(_draw(spec[key], point, n, rng), 0.0) if key in spec else np.full(n, point)
+
+    ef_e = factor("electricity_kgco2e_per_kwh", 0.20)
+    ef_g = factor("gas_kgco2e_per_kwh", 0.18)
+    ef_route = np.column_stack([factor(k, d) for k, d in _ROUTE_FACTORS])
+
+    s, y, e = base["s"], base["y"], base["e"]
+    mat_in = base["mat_in_kg"]
+    prod = (base["unknown_qty"] * unit_mass + base["fixed_kg"]) * (1.0 + y)
+    waste = base["waste_kg"] * (1.0 - s)
+    co2e_waste = (ef_route[:, base["route_class"]] * base["kg_by_route"]).sum(axis=1) * (1.0 - s)
+    co2e_total = (base["elec_kwh"] * ef_e + base["gas_kwh"] * ef_g) * (1.0 - e) + co2e_waste
+
+    eff_cap = base["cap"] * base["hrs"] * (1.0 - down)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # production reported by mass counts as mass / unit mass units, as in compute_bottlenecks
+        units = base["qty"] + np.where(unit_mass > 0, base["qty_kg"] / unit_mass, 0.0)
+        util = np.where(eff_cap > 0, units[:, None] / eff_cap, np.nan)
+    max_util = np.fmax.reduce(util, axis=1) if nb else np.full(n, np.nan)
+    modelled = _exit_flows(base["net"], yields, mat_in) if nb else np.zeros(n)
+
+    kpis = np.column_stack([
+        prod / mat_in * 100.0 if mat_in > 0 else np.zeros(n),
+        np.maximum(mat_in - prod - waste, 0.0),
+        co2e_total,
+        prod,
+        modelled,
+        max_util,
+    ])
+    return kpis, util
+
+def _chunked(base, spec, n, seed_seq, out_kpi, out_util):
+    rng = np.random.default_rng(seed_seq)
+    for lo in range(0, n, CHUNK_SAMPLES):
+        hi = min(lo + CHUNK_SAMPLES, n)
+        out_kpi[lo:hi], out_util[lo:hi] = _evaluate(base, spec, hi - lo, rng)
+
+def _worker(base, spec, lo, hi, n, nb, seed_seq, shm_names):
+    shm_k, shm_u = (shared_memory.SharedMemory(name=nm) for nm in shm_names)
+    try:
+        kpi = np.ndarray((n, len(MC_KPIS)), dtype=np.float64, buffer=shm_k.buf)
+        util = np.ndarray((n, nb), dtype=np.float64, buffer=shm_u.buf)
+        _chunked(base, spec, hi - lo, seed_seq, kpi[lo:hi], util[lo:hi])
+    finally:
+        shm_k.close()
+        shm_u.close()
+
+def run_monte_carlo(model, uncertainty, n=100_000, seed=0, percentiles=(5, 50, 95), workers=None):
+    """
+    Propagate input distributions through the balance. Returns {"bands": KPI x percentile table
+    (plus mean), "bottlenecks": per-block utilisation bands and P(over capacity), "n": n}.
+    """
+    base = _prepare(model)
+    nb = len(base["yields"])
+    workers = max(int(workers or 1), 1)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+
+    if workers == 1:
+        kpi = np.empty((n, len(MC_KPIS)))
+        util = np.empty((n, nb))
+        _chunked(base, uncertainty, n, seeds[0], kpi, util)
+    else:
+        shm_k = shared_memory.SharedMemory(create=True, size=max(n * len(MC_KPIS) * 8, 1))
+        shm_u = shared_memory.SharedMemory(create=True, size=max(n * nb * 8, 1))
+        try:
+            bounds = np.linspace(0, n, workers + 1).astype(int)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futs = [pool.submit(_worker, base, uncertainty, lo, hi, n, nb, seeds[i], (shm_k.name, shm_u.name))
+                        for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))]
+                for f in futs:
+                    f.result()
+            kpi = np.ndarray((n, len(MC_KPIS)), dtype=np.float64, buffer=shm_k.buf).copy()
+            util = np.ndarray((n, nb), dtype=np.float64, buffer=shm_u.buf).copy()
+        finally:
+            for shm in (shm_k, shm_u):
+                shm.close()
+                shm.unlink()
+
+    cols = [f"p{p:g}" for p in percentiles]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns (e.g. no capacity data)
+        bands = pd.DataFrame(np.nanpercentile(kpi, percentiles, axis=0).T, index=MC_KPIS, columns=cols)
+        bands["mean"] = np.nanmean(kpi, axis=0)
+        bott = pd.DataFrame(np.nanpercentile(util, percentiles, axis=0).T if nb else np.empty((0, len(cols))),
+                            index=base["labels"], columns=[f"Utilisation {c}" for c in cols])
+        bott["P(over capacity)"] = (util >= 1.0).mean(axis=0) if nb else []
+    bott.index.name = "Process"
+    return {"bands": bands, "bottlenecks": bott.reset_index(), "n": n}
@@ -0,0 +1,140 @@
+"""
+Unit normalisation to the model's canonical units: kg for mass, kWh for energy.
+
+Runs once, when a bundle is resolved (mfm.schema). A quantity column is scaled by a factor looked
+up per row from a unit column (only its distinct labels are parsed) or, for rows without a usable
+label, from a unit hint in the column header ("Weight (t)", "Gas_MWh"); anything else is taken
+as already canonical. Every conversion applied is described in a note, which the model reports
+among its assumptions, so the resolved arrays are never converted again downstream.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+KG_PER = {
+    "kg": 1.0, "kgs": 1.0, "kilogram": 1.0, "kilograms": 1.0,
+    "g": 1e-3, "gram": 1e-3, "grams": 1e-3,
+    "t": 1000.0, "tonne": 1000.0, "tonnes": 1000.0, "mt": 1000.0, "metricton": 1000.0,
+    "ton": 1000.0, "tons": 1000.0,  # read as metric tonnes
+    "lb": 0.45359237, "lbs": 0.45359237, "pound": 0.45359237, "pounds": 0.45359237,
+}
+KWH_PER = {
+    "kwh": 1.0, "wh": 1e-3, "mwh": 1e3, "gwh": 1e6,
+    "mj": 1.0 / 3.6, "gj": 1000.0 / 3.6,
+    "therm": 29.3071, "therms": 29.3071, "thm": 29.3071,
+}
+# Gas metered by volume: volume correction 1.02264 x calorific value 39.5 MJ/m³ / 3.6 (UK billing formula)
+GAS_KWH_PER_M3 = 11.22
+M3_PER = {"m3": 1.0, "cubicmetre": 1.0, "cubicmetres": 1.0, "cubicmeter": 1.0, "cubicmeters": 1.0,
+          "ft3": 0.0283168, "cf": 0.0283168, "hcf": 2.83168, "ccf": 2.83168}
+COUNT_UNITS = {"pcs", "pc", "piece", "pieces", "ea", "each", "unit", "units", "nos", "no"}
+
+# quantity kind -> {unit label: factor to the canonical unit}
+FACTORS = {
+    "mass": KG_PER,
+    "energy": KWH_PER,
+    "gas": dict(KWH_PER, **{u: f * GAS_KWH_PER_M3 for u, f in M3_PER.items()}),
+}
+CANONICAL = {"mass": "kg", "energy": "kWh", "gas": "kWh"}
+_DISPLAY = {"kwh": "kWh", "wh": "Wh", "mwh": "MWh", "gwh": "GWh", "mj": "MJ", "gj": "GJ", "m3": "m³", "ft3": "ft³"}
+_UNIT_HEADERS = {"unit", "units", "uom", "unitofmeasure", "unitofmeasurement"}
+
+def label(unit) -> str:
+    """Lower-case unit label without spaces, dots or underscores ('Cubic Metres' -> 'cubicmetres', 'm³' -> 'm3')."""
+    return re.sub(r"[\s._]+", "", str(unit).lower()).replace("³", "3")
+
+def header_unit(column, kind):
+    """The unit a header names for `kind` ('Weight (t)' -> 't', 'ElectricityMWh' -> 'mwh'), or None."""
+    toks = re.findall(r"[a-z0-9³]+", str(column).lower())
+    table = FACTORS[kind]
+    for t in toks:
+        if label(t) in table:
+            return label(t)
+    # run-together headers ('GasKwh', 'weightlbs'): longest unit suffix of two or more letters
+    for t in toks:
+        for u in sorted(table, key=len, reverse=True):
+            if len(u) >= 2 and t.endswith(u) and len(t) > len(u):
+                return u
+    return None
+
+def find_unit_col(df, exclude=()):
+    """
+    First non-numeric column headed just 'Unit', 'Units', 'UoM' or 'Unit of Measure', or None.
+    Headers that only contain the word ('Unit Price', 'Unit Cost') are not unit columns.
+    """
+    for c in df.columns:
+        if c in exclude or df[c].dtype.kind in "biufcmM":
+            continue
+        if label(c) in _UNIT_HEADERS:
+            return c
+    return None
+
+def _fmt(f):
+    return f"{f:,.6g}"
+
+def _rows(n):
+    return f"{int(n):,} row{'' if n == 1 else 's'}"
+
+def _labels(units):
+    """Row codes into the distinct unit labels (missing labels get the last code) and the labels."""
+    codes, uniques = pd.factorize(units if isinstance(units, pd.Series) else np.asarray(units, dtype=object))
+    codes = np.where(codes < 0, len(uniques), codes)
+    return codes, list(uniques), np.bincount(codes, minlength=len(uniques) + 1)
+
+def normalise(values, column, kind, units=None, unit_col=None):
+    """
+    `values` (float array) in the canonical unit of `kind`, with notes describing the conversions.
+
+    `units` is the per-row unit column; rows whose label is not a `kind` unit (or is missing)
+    fall back to the header hint of `column`, then to the canonical unit.
+    """
+    table, canon = FACTORS[kind], CANONICAL[kind]
+    hint = header_unit(column, kind)
+    default = table[hint] if hint is not None else 1.0
+    if units is None:
+        if default == 1.0:
+            return values, []
+        return values * default, [f"Converted '{column}' from {_DISPLAY.get(hint, hint)} to {canon} (×{_fmt(default)})."]
+
+    codes, uniques, counts = _labels(units)
+    factors = np.array([table.get(label(u), np.nan) for u in uniques] + [np.nan])
+    known = ~np.isnan(factors)
+    notes = [f"Converted '{column}' from {u} to {canon} (×{_fmt(factors[i])}) on {_rows(counts[i])}."
+             for i, u in enumerate(uniques) if known[i] and factors[i] != 1.0]
+    if counts[~known].sum():
+        unknown = [repr(str(u)) for i, u in enumerate(uniques) if not known[i]]
+        what = f"unrecognised {unit_col} {', '.join(unknown[:5])}" if unknown else f"no {unit_col}"
+        notes.append(f"'{column}': {_rows(counts[~known].sum())} with {what} "
+                     f"taken as {_DISPLAY.get(hint, hint) + ' (from the header)' if hint else canon}.")
+    factors[~known] = default
+    return values * factors[codes], notes
+
+def split_counts(values, column, units=None):
+    """
+    Production quantities -> (counted units, mass in kg or None, notes). Rows in a mass unit (their
+    own label, or the header hint for rows labelled with neither a mass nor a count unit) are product
+    mass measured directly: they leave the count and are converted to kg. Other rows stay counts.
+    """
+    hint = header_unit(column, "mass")
+    fallback = KG_PER[hint] if hint is not None else np.nan
+    if units is None:
+        if hint is None:
+            return values, None, []
+        return (np.zeros_like(values), values * fallback,
+                [f"'{column}' is in {hint}: taken as product mass directly (converted to kg), not through unit mass."])
+
+    codes, uniques, counts = _labels(units)
+    labels = [label(u) for u in uniques]
+    factors = np.array([KG_PER.get(u, np.nan if u in COUNT_UNITS else fallback) for u in labels] + [fallback])
+    mass = ~np.isnan(factors)
+    if not counts[mass].sum():
+        return values, None, []
+    per_row = factors[codes]
+    is_mass = ~np.isnan(per_row)
+    names = sorted({str(u) for i, u in enumerate(uniques) if labels[i] in KG_PER and counts[i]})
+    if counts[mass].sum() > sum(counts[i] for i, l in enumerate(labels) if l in KG_PER):
+        names.append(f"{hint} (from the header)")
+    notes = [f"'{column}': {_rows(counts[mass].sum())} in {', '.join(names)} "
+             f"taken as product mass directly (converted to kg), not through unit mass."]
+    return np.where(is_mass, 0.0, values), np.where(is_mass, values * np.nan_to_num(per_row), 0.0), notes
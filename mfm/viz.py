@@ -8,6 +8,12 @@ def _shorten(s: str, n: int = 18) -> str:
 def render_sankey(sankey, title="Material Flow Map"):
     full_labels = sankey["labels"]
     short_labels = [_shorten(l, 18) for l in full_labels]
+    members = {**sankey.get("groups", {}), **sankey.get("merged", {})}
+    hover = [
+        l if l not in members else
+        f"{l}<br>" + ", ".join(map(str, members[l][:8])) + (f" +{len(members[l]) - 8} more" if len(members[l]) > 8 else "")
+        for l in full_labels
+    ]
 
     fig = go.Figure(
         data=[
@@ -19,7 +25,7 @@ def render_sankey(sankey, title="Material Flow Map"):
                     thickness=22,
                     line=dict(width=0.5),
                     hovertemplate="%{customdata}<extra></extra>",
-                    customdata=full_labels,
+                    customdata=hover,
                 ),
                 link=dict(
                     source=sankey["sources"],
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from mfm.batch import load_bundle, run_site
+from mfm.synthetic import generate_sites
+
+def test_parquet_sites_match_csv_sites(tmp_path):
+    recs = {}
+    for fmt in ("csv", "parquet"):
+        site_dir = generate_sites(tmp_path / fmt, n_sites=1, seed=3, fmt=fmt, end="2025-01-31")[0]
+        recs[fmt], _ = run_site(site_dir)
+    assert recs["parquet"]["status"] == "ok", recs["parquet"]["error"]
+    assert recs["parquet"]["mat_in_kg"] > 0
+    for k in ("mat_in_kg", "prod_out_kg", "waste_out_kg"):
+        assert recs["parquet"][k] == pytest.approx(recs["csv"][k])
+
+def test_site_without_data_files_is_an_error(tmp_path):
+    with pytest.raises(ValueError, match="No dataset files"):
+        load_bundle(tmp_path)
+    (tmp_path / "site.json").write_text('{"site_name": "Empty", "process_blocks": []}')
+    rec, _ = run_site(tmp_path)
+    assert rec["status"] == "error"
+    assert "No dataset files" in rec["error"]
+
+def test_same_type_files_are_combined(tmp_path):
+    site_dir = generate_sites(tmp_path / "one", n_sites=1, seed=5, end="2025-02-28")[0]
+    whole = load_bundle(site_dir).production
+    prod = pd.read_csv(f"{site_dir}/production_output.csv")
+    split = tmp_path / "split"
+    split.mkdir()
+    for f in ("material_purchases.csv", "energy_site.csv", "waste_summary.csv"):
+        (split / f).write_bytes(open(f"{site_dir}/{f}", "rb").read())
+    month = pd.to_datetime(prod.iloc[:, 0]).dt.month
+    prod[month == 1].to_csv(split / "production_jan.csv", index=False)
+    prod[month == 2].to_csv(split / "production_feb.csv", index=False)
+    parts = load_bundle(split).production
+    assert parts.total_qty == pytest.approx(whole.total_qty)
+    assert parts.total_kg == pytest.approx(whole.total_kg)
+
+def test_same_type_files_with_different_columns_are_an_error(tmp_path):
+    pd.DataFrame({"Month": ["2025-01"], "Waste Type": ["Scrap"], "Weight (kg)": [10.0]}).to_csv(
+        tmp_path / "waste_jan.csv", index=False)
+    pd.DataFrame({"Month": ["2025-02"], "Waste Type": ["Scrap"], "Weight (t)": [1.0]}).to_csv(
+        tmp_path / "waste_feb.csv", index=False)
+    with pytest.raises(ValueError, match="both hold waste_summary"):
+        load_bundle(tmp_path)
@@ -0,0 +1,66 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mfm import ingest
+from mfm.ingest import stream_dataset
+from mfm.store import cache_upload, open_table
+
+MAPPING = {"date": "Timestamp", "product": "SKU", "qty": "Qty", "unit": None}
+
+def _mes_log(days=3, per_day=96):
+    ts = pd.date_range("2025-01-01", periods=days * per_day, freq=f"{24 * 60 // per_day}min")
+    return pd.DataFrame({"Timestamp": ts.strftime("%Y-%m-%d %H:%M:%S"),
+                         "SKU": np.where(np.arange(len(ts)) % 2, "A", "B"), "Qty": 1.0})
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_timestamped_rows_reduce_to_days(tmp_path, cached):
+    log = _mes_log()
+    path = tmp_path / "mes.csv"
+    log.to_csv(path, index=False)
+    if cached:
+        path = cache_upload(str(path), "mes.csv", cache_dir=str(tmp_path / "cache"))
+    out = stream_dataset(str(path), str(path), "production_output", MAPPING, chunksize=50)
+    assert len(out) == 3 * 2
+    assert sorted(out["Timestamp"].unique()) == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    assert out["Qty"].sum() == len(log)
+
+def test_dates_without_time_are_kept():
+    df = pd.DataFrame({"Month": ["Jan", "Feb", "Jan"], "Material": "Steel", "Weight": [1.0, 2.0, 3.0]})
+    out = stream_dataset(io.BytesIO(df.to_csv(index=False).encode()), "m.csv", "material_purchases",
+                         {"period": "Month", "material": "Material", "mass_kg": "Weight"})
+    assert dict(zip(out["Month"], out["Weight"])) == {"Jan": 4.0, "Feb": 2.0}
+
+def test_many_groups_are_not_re_reduced_every_chunk(monkeypatch):
+    calls = []
+    combine = ingest._combine
+    monkeypatch.setattr(ingest, "_combine", lambda *a: calls.append(1) or combine(*a))
+    df = pd.DataFrame({"Date": "2025-01-01", "Product": [f"P{i}" for i in range(5000)], "Qty": 1.0})
+    out = stream_dataset(io.BytesIO(df.to_csv(index=False).encode()), "p.csv", "production_output",
+                         {"date": "Date", "product": "Product", "qty": "Qty"}, chunksize=50)
+    assert len(out) == 5000 and out["Qty"].sum() == 5000
+    assert len(calls) < 15
+
+def test_text_typed_cache_with_blank_values(tmp_path):
+    # the quantity column only turns non-numeric after pyarrow's first block, so the cache is stored as text
+    n = 40_000
+    qty = ["2"] * n
+    qty[10], qty[-1] = "", "n.a."
+    path = tmp_path / "waste.csv"
+    pd.DataFrame({"Waste Type": ["Scrap", ""] * (n // 2), "Weight": qty}).to_csv(path, index=False)
+    cached = cache_upload(str(path), "waste.csv", cache_dir=str(tmp_path / "cache"))
+    assert str(open_table(cached).schema.field("Weight").type) == "string"
+    out = stream_dataset(cached, cached, "waste_summary", {"waste_type": "Waste Type", "mass_kg": "Weight"})
+    assert out["Weight"].sum() == 2.0 * (n - 2)
+    assert out["Waste Type"].isna().sum() == 1
+
+def test_text_in_a_value_column_is_missing_on_both_paths(tmp_path):
+    path = tmp_path / "waste.csv"
+    pd.DataFrame({"Waste Type": ["Scrap", "Scrap", "Mixed"], "Weight": ["10", "see note", "5"]}).to_csv(path, index=False)
+    mapping = {"waste_type": "Waste Type", "mass_kg": "Weight"}
+    cached = cache_upload(str(path), "waste.csv", cache_dir=str(tmp_path / "cache"))
+    for src in (str(path), cached):
+        out = stream_dataset(src, src, "waste_summary", mapping)
+        assert dict(zip(out["Waste Type"], out["Weight"])) == {"Scrap": 10.0, "Mixed": 5.0}
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from mfm.lod import sankey_lod
+
+def _chain(n=30, product_kg=1.0):
+    rows = [{"from": "Goods In", "to": "Step 0", "kg": 1000.0, "kind": "material_in"}]
+    for i in range(n):
+        rows.append({"from": f"Step {i}", "to": f"Step {i} losses", "kg": 0.5 + i, "kind": "stage_loss"})
+        if i + 1 < n:
+            rows.append({"from": f"Step {i}", "to": f"Step {i + 1}", "kg": 1000.0, "kind": "throughput"})
+    rows.append({"from": f"Step {n - 1}", "to": "Dispatch", "kg": product_kg, "kind": "product_out"})
+    rows.append({"from": "All processes", "to": "Waste streams", "kg": 2.0, "kind": "waste_out"})
+    rows.append({"from": "All processes", "to": "Unaccounted losses", "kg": 0.1, "kind": "loss_unaccounted"})
+    return pd.DataFrame(rows)
+
+def _links(out):
+    labels = out["labels"]
+    return {(labels[s], labels[t]): v for s, t, v in zip(out["sources"], out["targets"], out["values"])}
+
+def _out_kg(links):
+    sources = {a for a, _ in links}
+    return sum(v for (_, b), v in links.items() if b not in sources)
+
+def test_small_product_exit_is_never_merged():
+    flows = _chain()
+    out = sankey_lod(flows, max_links=20)
+    links = _links(out)
+    assert len(links) <= 20
+    assert [v for (_, b), v in links.items() if b == "Dispatch"] == [1.0]
+    assert all("Dispatch" not in members for members in out["merged"].values())
+    assert set(out["merged"]) <= {"Other losses", "Other waste", "Other unaccounted"}
+    assert _out_kg(links) == flows.loc[~flows["kind"].isin(["material_in", "throughput"]), "kg"].sum()
+
+def test_small_maps_pass_unchanged():
+    flows = _chain(n=3)
+    out = sankey_lod(flows)
+    assert len(out["values"]) == len(flows)
+    assert out["merged"] == {} and out["groups"] == {}
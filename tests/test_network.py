@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from mfm.network import build_network, network_flows, solve_network
+
+def _blocks(routes=None, yields=(90, 80, 100)):
+    routes = routes or {}
+    return [{"user_label": lab, "yield_pct": y, "routes": routes.get(lab)} for lab, y in zip("ABC", yields)]
+
+def test_unrouted_blocks_keep_the_chain_in_a_partially_routed_network():
+    net = build_network(_blocks({"C": [{"to": "B", "fraction": 0.2}]}), "Dispatch")
+    x = solve_network(net, 1000.0)
+    # B receives A's output plus the rework from C: x_B = 900 + 0.2 * x_C, x_C = 0.8 * x_B
+    assert x == pytest.approx([1000.0, 900.0 / 0.84, 0.8 * 900.0 / 0.84])
+    assert net["exit_frac"] == pytest.approx([0.0, 0.0, 0.8])
+    assert net["notes"] == []
+    flows = network_flows(net, x, "Goods In", "Dispatch", 1000.0, 500.0)
+    edges = {(a, b): kg for a, b, kg in flows[["from", "to", "kg"]].itertuples(index=False)}
+    assert edges[("A", "B")] == pytest.approx(900.0)
+    assert edges[("C", "B")] == pytest.approx(0.2 * x[2])
+    assert [a for a, b in edges if b == "Dispatch"] == ["C"]
+
+def test_blocks_without_inflow_are_noted():
+    net = build_network(_blocks({"A": [{"to": "C", "fraction": 1.0}]}), "Dispatch")
+    x = solve_network(net, 1000.0)
+    assert x[1] == 0.0
+    assert any("'B' receives no material" in n for n in net["notes"])
+
+def test_no_routes_is_the_linear_chain():
+    net = build_network(_blocks(), "Dispatch")
+    assert net["linear"]
+    assert np.allclose(solve_network(net, 1000.0), [1000.0, 900.0, 720.0])
@@ -0,0 +1,53 @@
+import pytest
+
+from mfm.cache import LRUCache
+from mfm.model import build_flow_model, compute_balances, kpi_summary
+from mfm.schema import resolve_bundle
+from mfm.synthetic import make_synthetic_bundle
+
+BLOCKS = [{"name": n, "user_label": n, "yield_pct": 92, "capacity_units_per_hr": 60.0, "available_hours": 160.0,
+           "downtime_pct": 10} for n in ("Intake", "Cutting", "Forming", "Welding")]
+FACTORS = {"electricity_kgco2e_per_kwh": 0.2, "gas_kgco2e_per_kwh": 0.18}
+
+@pytest.fixture
+def model():
+    bundle = resolve_bundle(make_synthetic_bundle())
+    return build_flow_model("S", "Goods In", "Dispatch", BLOCKS, bundle, "Quarter", {}, 7.0, FACTORS)
+
+def _same(a, b):
+    assert kpi_summary(a) == kpi_summary(b)
+    assert a["assumptions"] == b["assumptions"] and a["ai_messages"] == b["ai_messages"]
+    assert a["flows_table"].equals(b["flows_table"])
+    assert a["bottlenecks_table"].equals(b["bottlenecks_table"])
+
+@pytest.mark.parametrize("change, recomputed", [
+    ({"scrap_reduction_pct": 10}, "circularity"),
+    ({"yield_improve_pct": 5}, "mass_balance"),
+    ({"energy_intensity_improve_pct": 8}, "energy"),
+    ({"allocate_energy": True}, "energy_alloc"),
+])
+def test_node_cache_matches_a_full_recompute(model, change, recomputed):
+    nodes = LRUCache(64)
+    compute_balances(model, nodes=nodes)
+    changed = dict(model, scenarios=dict(model["scenarios"], **change))
+    cached = compute_balances(changed, nodes=nodes)
+    assert recomputed in cached["recomputed"]
+    assert "inputs" not in cached["recomputed"]
+    _same(cached, compute_balances(changed))
+
+def test_unchanged_model_recomputes_nothing(model):
+    nodes = LRUCache(64)
+    first = compute_balances(model, nodes=nodes)
+    again = compute_balances(model, nodes=nodes)
+    assert again["recomputed"] == []
+    _same(first, again)
+
+def test_block_change_reaches_the_flows(model):
+    nodes = LRUCache(64)
+    compute_balances(model, nodes=nodes)
+    blocks = [dict(b) for b in BLOCKS]
+    blocks[1]["yield_pct"] = 80
+    changed = dict(model, blocks=blocks)
+    cached = compute_balances(changed, nodes=nodes)
+    assert {"flows", "bottlenecks"} <= set(cached["recomputed"])
+    _same(cached, compute_balances(changed))
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mfm.products import code_keys, product_masses, resolve_master
+from mfm.schema import resolve_bundle
+
+def _production(codes):
+    df = pd.DataFrame({"date": ["2025-01-01"] * len(codes), "product": codes, "qty": [10.0] * len(codes)})
+    return resolve_bundle({"production_output": df}).production
+
+def test_code_keys_normalise_numeric_codes():
+    assert list(code_keys([1001, 1001.0, " 1001 ", "A-7", np.float64(42.0)])) == ["1001", "1001", "1001", "A-7", "42"]
+    assert list(code_keys([1.5])) == ["1.5"]
+
+def test_master_csv_with_blank_code_matches_integer_codes(tmp_path):
+    path = tmp_path / "product_master.csv"
+    path.write_text("Product Code,Unit Mass (kg)\n1001,2.5\n,9.0\n1002,4.0\n")
+    master = resolve_master(str(path))
+    assert list(master.codes) == ["1001", "1002"]
+    out = product_masses(_production([1001, 1002]), master)
+    assert out["known_kg"] == pytest.approx(65.0)
+    assert out["unknown_qty"] == 0.0
+
+def test_float_production_codes_match():
+    master = resolve_master({1001: 2.5, 1002: 4.0})
+    out = product_masses(_production([1001.0, np.nan, 1002.0]), master)
+    assert out["known_kg"] == pytest.approx(65.0)
+    assert out["unknown_qty"] == pytest.approx(10.0)
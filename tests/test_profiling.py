@@ -0,0 +1,20 @@
+import tracemalloc
+
+import pytest
+
+from mfm.model import compute_balances
+from mfm.profiling import StageProfiler
+
+def test_profiler_stops_tracing_when_profiled_code_raises():
+    assert not tracemalloc.is_tracing()
+    with pytest.raises(RuntimeError):
+        with StageProfiler() as prof:
+            prof.stage("boom")
+            raise RuntimeError("fails mid-profile")
+    assert not tracemalloc.is_tracing()
+
+def test_compute_balances_failure_leaves_tracing_off():
+    bad = {"data": {}, "blocks": None, "scenarios": {}, "boundary_start": "a", "boundary_end": "b"}
+    with pytest.raises(TypeError):
+        compute_balances(bad, profile=True)
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,56 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mfm.infer import infer_schema
+from mfm.ingest import stream_dataset
+from mfm.schema import resolve_bundle
+
+def _ingested(df, dataset_type):
+    """Stream `df` as an uploaded CSV with its inferred mapping, like the app and batch do."""
+    mapping = infer_schema(df)["mappings"][dataset_type]
+    return stream_dataset(io.BytesIO(df.to_csv(index=False).encode()), "upload.csv", dataset_type, mapping), mapping
+
+def _resolve(df, dataset_type):
+    agg, mapping = _ingested(df, dataset_type)
+    return resolve_bundle({dataset_type: agg}, {dataset_type: mapping})
+
+def test_mapped_energy_columns_without_keywords():
+    df = pd.DataFrame({"Month": ["2025-01", "2025-02"], "Elec (kWh)": [1000.0, 2000.0], "Gas (kWh)": [500.0, 600.0]})
+    energy = _resolve(df, "energy_site").energy
+    assert energy.elec_col == "Elec (kWh)"
+    assert energy.totals == pytest.approx((3000.0, 1100.0))
+
+def test_mapped_mass_and_unit_columns_without_keywords():
+    df = pd.DataFrame({"Date": ["2025-01-03", "2025-01-04"], "Item": ["Steel", "Alu"],
+                       "Net Qty": [2.0, 1.5], "UoM": ["t", "kg"]})
+    material = _resolve(df, "material_purchases").material
+    assert material.kg_col == "Net Qty"
+    assert material.total_kg == pytest.approx(2001.5)
+
+def test_mapped_waste_type_without_keyword():
+    df = pd.DataFrame({"Stream": ["Metal scrap", "Mixed", "Metal scrap"], "Weight": [100.0, 50.0, 25.0],
+                       "Route": ["Recycling", "Landfill", "Recycling"]})
+    waste = _resolve(df, "waste_summary").waste
+    assert waste.type_col == "Stream"
+    by_type = dict(zip(waste.type_labels, waste.kg_by_type))
+    assert by_type == {"Metal scrap": 125.0, "Mixed": 50.0}
+    assert waste.type_flags["metal_scrap"][list(waste.type_labels).index("Metal scrap")]
+
+def test_unmapped_datasets_still_match_keywords():
+    df = pd.DataFrame({"date": ["2025-01-01"], "product": ["A"], "qty_units": [10.0]})
+    production = resolve_bundle({"production_output": df}).production
+    assert production.qty_col == "qty_units"
+    assert np.array_equal(production.qty, [10.0])
+
+def test_production_headers_are_not_product_codes():
+    df = pd.DataFrame({"Production date": ["2025-01-01", "2025-01-02"], "Production qty": [10.0, 20.0],
+                       "SKU": ["A", "B"]})
+    production = resolve_bundle({"production_output": df}).production
+    assert production.product_col == "SKU"
+    assert production.qty_col == "Production qty"
+    assert list(production.product_labels) == ["A", "B"]
+    no_codes = resolve_bundle({"production_output": df.drop(columns="SKU")}).production
+    assert no_codes.product_col is None and no_codes.qty_by_product is None
@@ -0,0 +1,85 @@
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mfm import service
+from mfm.synthetic import make_synthetic_bundle
+
+BLOCKS = [{"name": "Cutting", "yield_pct": 95, "capacity_units_per_hr": 60, "available_hours": 480}]
+
+@pytest.fixture
+def threaded():
+    def make(**kwargs):
+        svc = service.ComputeService(workers=1, **kwargs)
+        svc.pool.shutdown()
+        svc.pool = ThreadPoolExecutor(max_workers=2)
+        return svc
+    return make
+
+def test_timed_out_work_keeps_its_slot_until_it_finishes(threaded, monkeypatch):
+    release = threading.Event()
+
+    def slow(request):
+        release.wait(5)
+        return {"site_name": request["site_name"]}
+
+    monkeypatch.setattr(service, "evaluate", slow)
+    svc = threaded(max_queue=1, timeout=0.05)
+    assert svc.balances({"site_name": "a"})[0] == 504
+    assert svc.stats()["abandoned"] == 1
+    # the abandoned computation is still running, so the queue is still full
+    assert svc.balances({"site_name": "b"})[0] == 503
+    release.set()
+    deadline = time.time() + 5
+    while svc.stats()["abandoned"] and time.time() < deadline:
+        time.sleep(0.01)
+    status, reply = svc.balances({"site_name": "c"})
+    assert status == 200 and reply["site_name"] == "c"
+
+def test_bundle_dir_replies_follow_file_changes(threaded, tmp_path):
+    for name, df in make_synthetic_bundle().items():
+        df.to_csv(tmp_path / f"{name}.csv", index=False)
+    svc = threaded()
+    request = {"bundle_dir": str(tmp_path), "process_blocks": BLOCKS}
+    status, first = svc.balances(request, key="same-body")
+    assert status == 200 and not first["cached"]
+    assert svc.balances(request, key="same-body")[1]["cached"]
+
+    waste = tmp_path / "waste_summary.csv"
+    waste.write_text(waste.read_text().replace("3200", "6400"))
+    os.utime(waste, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    status, second = svc.balances(request, key="same-body")
+    assert not second["cached"]
+    assert second["kpis"]["waste_out_kg"] == first["kpis"]["waste_out_kg"] + 3200
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(service, "MAX_BODY_BYTES", 1024)
+    srv = service.make_server(port=0, workers=1)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+    srv.service.close()
+
+def test_rejected_bodies_do_not_leak_into_the_next_request(server):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request("POST", "/nope", body=b"GET /stats HTTP/1.1\r\n\r\n", headers={"Content-Type": "application/json"})
+    reply = conn.getresponse()
+    assert reply.status == 404
+    reply.read()
+    conn.request("GET", "/health")
+    reply = conn.getresponse()
+    assert reply.status == 200 and json.loads(reply.read()) == {"status": "ok"}
+
+    conn.request("POST", "/balances", body=b"x" * 2048)
+    reply = conn.getresponse()
+    assert reply.status == 413
+    assert reply.getheader("Connection") == "close"
+    conn.close()
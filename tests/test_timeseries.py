@@ -0,0 +1,31 @@
+import pytest
+
+from mfm.model import build_flow_model, compute_balances, compute_timeseries
+from mfm.schema import resolve_bundle
+from mfm.synthetic import make_synthetic_bundle
+
+BLOCKS = [{"name": n, "user_label": n, "yield_pct": 92, "capacity_units_per_hr": 60.0, "available_hours": 160.0,
+           "downtime_pct": 10} for n in ("Intake", "Cutting", "Welding")]
+FACTORS = {"electricity_kgco2e_per_kwh": 0.2, "gas_kgco2e_per_kwh": 0.18}
+TOTALS = ["mat_in_kg", "prod_out_kg", "waste_out_kg", "energy_elec_kwh", "energy_gas_kwh", "co2e_total_kg"]
+
+@pytest.mark.parametrize("freq", ["M", "W", "Q"])
+@pytest.mark.parametrize("scenarios", [{}, {"scrap_reduction_pct": 10, "yield_improve_pct": 5,
+                                            "energy_intensity_improve_pct": 8}])
+def test_period_sums_match_the_balance(freq, scenarios):
+    bundle = resolve_bundle(make_synthetic_bundle())
+    model = build_flow_model("S", "Goods In", "Dispatch", BLOCKS, bundle, "Quarter", scenarios, 7.0, FACTORS)
+    ts = compute_timeseries(model, freq)["timeseries"]
+    totals = compute_balances(model)
+    assert len(ts) > 0
+    assert ts.index.freqstr.startswith(freq)
+    for k in TOTALS:
+        assert ts[k].sum() == pytest.approx(totals[k], rel=1e-9), k
+
+def test_no_dated_production_gives_an_empty_series():
+    bundle = make_synthetic_bundle()
+    bundle["production_output"] = bundle["production_output"].drop(columns=["Date"])
+    model = build_flow_model("S", "Goods In", "Dispatch", BLOCKS, bundle, "Quarter", {}, 7.0, FACTORS)
+    out = compute_timeseries(model)
+    assert out["timeseries"].empty
+    assert "time series unavailable" in out["assumptions"][-1]
@@ -0,0 +1,40 @@
+import pytest
+
+from mfm.model import build_flow_model, compute_balances
+from mfm.synthetic import make_synthetic_bundle
+from mfm.uncertainty import MC_KPIS, run_monte_carlo
+
+BLOCKS = [{"name": n, "user_label": n, "yield_pct": 92, "capacity_units_per_hr": 60.0, "available_hours": 160.0,
+           "downtime_pct": 10} for n in ("Intake", "Cutting", "Welding")]
+FACTORS = {"electricity_kgco2e_per_kwh": 0.2, "gas_kgco2e_per_kwh": 0.18}
+SPREAD = {
+    "yield_pct": {"dist": "normal", "sd": 2},
+    "downtime_pct": {"dist": "uniform", "rel": 0.2},
+    "unit_mass_kg_per_unit": {"dist": "triangular", "rel": 0.05},
+    "electricity_kgco2e_per_kwh": {"dist": "lognormal", "sigma": 0.1},
+}
+CHECKED = ["material_eff_pct", "unaccounted_kg", "co2e_total_kg", "prod_out_kg"]
+
+@pytest.fixture(scope="module")
+def model():
+    return build_flow_model("S", "Goods In", "Dispatch", BLOCKS, make_synthetic_bundle(), "Quarter", {}, 7.0, FACTORS)
+
+def test_bands_contain_the_deterministic_value(model):
+    results = compute_balances(model)
+    bands = run_monte_carlo(model, SPREAD, n=5000)["bands"]
+    assert list(bands.index) == MC_KPIS
+    assert (bands["p5"] <= bands["p50"]).all() and (bands["p50"] <= bands["p95"]).all()
+    for k in CHECKED:
+        assert bands.loc[k, "p5"] <= results[k] <= bands.loc[k, "p95"], k
+    assert bands.loc["prod_out_kg", "p95"] > bands.loc["prod_out_kg", "p5"]
+
+def test_no_uncertainty_collapses_to_the_deterministic_value(model):
+    results = compute_balances(model)
+    bands = run_monte_carlo(model, {}, n=100)["bands"]
+    for k in CHECKED:
+        assert bands.loc[k].to_numpy() == pytest.approx(results[k])
+
+def test_same_seed_same_bands(model):
+    a = run_monte_carlo(model, SPREAD, n=2000, seed=7)["bands"]
+    b = run_monte_carlo(model, SPREAD, n=2000, seed=7)["bands"]
+    assert a.equals(b)
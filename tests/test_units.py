@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mfm.infer import infer_schema
+from mfm.schema import resolve_bundle
+from mfm.units import GAS_KWH_PER_M3, find_unit_col, header_unit, normalise, split_counts
+
+@pytest.mark.parametrize("unit, kg", [("kg", 1.0), ("g", 0.001), ("t", 1000.0), ("Tonnes", 1000.0),
+                                      ("lbs", 0.45359237), ("metric ton", 1000.0)])
+def test_mass_units_to_kg(unit, kg):
+    values, notes = normalise(np.array([2.0]), "Qty", "mass", pd.Series([unit]), "UoM")
+    assert values == pytest.approx([2.0 * kg])
+    assert bool(notes) == (kg != 1.0)
+
+@pytest.mark.parametrize("unit, kind, kwh", [("kWh", "energy", 1.0), ("MWh", "energy", 1000.0), ("GJ", "energy", 1000.0 / 3.6),
+                                             ("therms", "gas", 29.3071), ("m³", "gas", GAS_KWH_PER_M3),
+                                             ("ft3", "gas", 0.0283168 * GAS_KWH_PER_M3)])
+def test_energy_units_to_kwh(unit, kind, kwh):
+    values, _ = normalise(np.array([3.0]), "Usage", kind, pd.Series([unit]), "Unit")
+    assert values == pytest.approx([3.0 * kwh])
+
+def test_header_hint_applies_to_rows_without_a_unit():
+    assert header_unit("Weight (t)", "mass") == "t"
+    assert header_unit("GasMWh", "gas") == "mwh"
+    values, notes = normalise(np.array([1.0, 1.0, 1.0]), "Weight (t)", "mass", pd.Series(["kg", None, "bags"]), "UoM")
+    assert values == pytest.approx([1.0, 1000.0, 1000.0])
+    assert "2 rows" in notes[-1]
+
+def test_split_counts_separates_mass_rows():
+    qty, kg, notes = split_counts(np.array([10.0, 2.0, 500.0, 4.0]), "Qty", pd.Series(["pcs", "t", "g", None]))
+    assert qty == pytest.approx([10.0, 0.0, 0.0, 4.0])
+    assert kg == pytest.approx([0.0, 2000.0, 0.5, 0.0])
+    assert len(notes) == 1
+
+def test_split_counts_keeps_pure_counts():
+    qty, kg, notes = split_counts(np.array([10.0, 5.0]), "Qty", pd.Series(["pcs", "each"]))
+    assert qty == pytest.approx([10.0, 5.0])
+    assert kg is None and notes == []
+
+def test_split_counts_header_hint():
+    qty, kg, _ = split_counts(np.array([1.5]), "Output (t)")
+    assert qty == pytest.approx([0.0]) and kg == pytest.approx([1500.0])
+
+def test_unit_price_is_not_a_unit_column():
+    df = pd.DataFrame({"Material": ["Steel", "Alu"] * 10, "Unit Price": ["£1.20", "£3.10"] * 10,
+                       "Weight": [2.0, 1.5] * 10, "UoM": ["t", "t"] * 10})
+    assert find_unit_col(df, ("Weight",)) == "UoM"
+    assert find_unit_col(df.rename(columns={"UoM": "Unit of Measure"}), ("Weight",)) == "Unit of Measure"
+    assert find_unit_col(df.drop(columns="UoM"), ("Weight",)) is None
+    mapping = infer_schema(df)["mappings"]["material_purchases"]
+    assert mapping["unit"] == "UoM"
+    material = resolve_bundle({"material_purchases": df}, {"material_purchases": mapping}).material
+    assert material.total_kg == pytest.approx(35000.0)